@@ -0,0 +1,343 @@
+import json
+import time
+import signal
+import asyncio
+import threading
+import argparse
+import contextlib
+from urllib.parse import urlsplit, parse_qsl, unquote
+from concurrent.futures import ThreadPoolExecutor
+from batch_commands import BatchSession, COMMANDS, MANAGERS, quiet
+import metrics
+
+# Локальный HTTP/JSON-сервер над менеджерами. Команды те же, что в пакетном режиме
+# (см. batch_commands.py):
+#   POST /commands        — одна команда JSON-объектом или список команд
+#   GET  /раздел/действие?имя=значение  — команда чтения, например /tasks/top?limit=5
+#   POST /раздел/действие — команда с параметрами в JSON-объекте
+#   GET  /commands, GET /health — список команд и состояние сервера
+# Чтения выполняются в пуле потоков по данным в памяти, цикл событий их не ждёт.
+# Изменения идут в очередь единственному писателю: он применяет всё накопившееся,
+# сохраняет одной записью на файл и только после этого отвечает клиентам.
+# Пока писатель меняет данные, чтения ждут, а одно долгое чтение не задерживает другие.
+HOST = '127.0.0.1'
+PORT = 8765
+# Больше изменений за одно сохранение писатель не берёт
+MAX_WRITE_BATCH = 1000
+MAX_BODY_SIZE = 1024 * 1024
+READ_THREADS = 4
+# export_changes не меняет данные, но пишет файл выгрузки и сдвигает отметку
+WRITE_ACTIONS = {'add', 'edit', 'delete', 'done', 'export_changes'}
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class ReadWriteLock:
+    # Чтений одновременно сколько угодно, изменение — одно и без чтений.
+    # Ждущий писатель не пропускает вперёд новые чтения, иначе поток чтений его не пустит
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writing_now = False
+        self.waiting_writers = 0
+
+    @contextlib.contextmanager
+    def reading(self):
+        with self.condition:
+            while self.writing_now or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def writing(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writing_now or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writing_now = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writing_now = False
+                self.condition.notify_all()
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def command_name(command):
+    return str(command.get('command') or '') if isinstance(command, dict) else ''
+
+def is_write(command):
+    name = command_name(command)
+    # Отчёт с file_name пишет файл, поэтому тоже идёт через писателя
+    return name.rsplit('.', 1)[-1] in WRITE_ACTIONS or (name == 'finance.report' and bool(command.get('file_name')))
+
+def writes_file_only(command):
+    return command_name(command).endswith('.export_changes') or command_name(command) == 'finance.report'
+
+async def read_request(reader):
+    # (метод, путь, версия, заголовки, тело) или None, если клиент закрыл соединение
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise HttpError(400, 'Запрос оборван.')
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(413, 'Слишком длинные заголовки.')
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise HttpError(400, 'Некорректная строка запроса.')
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        raise HttpError(400, 'Некорректный Content-Length.')
+    if length > MAX_BODY_SIZE:
+        raise HttpError(413, 'Слишком большое тело запроса.')
+    body = await reader.readexactly(length) if length else b''
+    return method, target, version, headers, body
+
+def response_bytes(status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+    head = (f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    return head.encode('latin-1') + body
+
+def parse_body(body):
+    try:
+        return json.loads(body) if body.strip() else {}
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise HttpError(400, 'Тело запроса — некорректный JSON.')
+
+def command_ref(command):
+    return {'ref': command['ref']} if isinstance(command, dict) and 'ref' in command else {}
+
+def response_for(result):
+    return (200 if result['ok'] else 400), result
+
+def failure(command, status, message):
+    return status, {**command_ref(command), 'ok': False, 'error': message}
+
+class AssistantServer:
+    def __init__(self):
+        self.session = BatchSession(hold=False)
+        self.queue = None
+        self.writer = None
+        # Загрузка, изменения и сохранение идут в одном отдельном потоке: цикл событий
+        # в это время обслуживает чтения, а соединение SQLite не переходит между потоками
+        self.storage = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage')
+        self.readers = ThreadPoolExecutor(max_workers=READ_THREADS, thread_name_prefix='reader')
+        # Чтения и применение изменений не идут одновременно; сохранение читателям не мешает
+        self.data_lock = ReadWriteLock()
+        self.stats = {'reads': 0, 'writes': 0, 'saves': 0}
+
+    async def start(self):
+        await asyncio.get_running_loop().run_in_executor(self.storage, self.load)
+        self.queue = asyncio.Queue()
+        self.writer = asyncio.create_task(self.write_loop())
+
+    def load(self):
+        with quiet():
+            for section in MANAGERS:
+                # Сохраняет только писатель: отложенная запись по таймеру шла бы из чужого потока
+                self.session.manager(section).set_write_behind(None, None)
+
+    def run(self, command):
+        # (HTTP-статус, результат); неожиданная ошибка команды не роняет сервер
+        try:
+            return response_for(self.session.execute(command))
+        except Exception as e:
+            return failure(command, 500, f'Внутренняя ошибка: {e}')
+
+    def guard(self, command):
+        # Выгрузка изменений и отчёт с file_name только пишут файлы (и отметку выгрузки,
+        # кэш отчётов, которых чтения не касаются) — они идут вместе с чтениями
+        if is_write(command) and not writes_file_only(command):
+            return self.data_lock.writing()
+        return self.data_lock.reading()
+
+    def read(self, command):
+        # В потоке чтения
+        with self.guard(command):
+            return self.run(command)
+
+    def apply(self, commands):
+        # В потоке хранения: все изменения группы — внутри batch() каждого менеджера,
+        # сохранение — один раз на файл при выходе из него
+        responses = []
+        try:
+            with contextlib.ExitStack() as batches:
+                for manager in self.session.managers.values():
+                    batches.enter_context(manager.batch())
+                for command in commands:
+                    # Блокировка — на каждую команду, чтобы долгая группа не держала чтения
+                    with self.guard(command):
+                        responses.append(self.run(command))
+        except Exception as e:
+            message = f'Ошибка сохранения: {e}'
+            responses = [failure(command, 500, message) for command in commands]
+        return responses
+
+    def submit(self, command):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((command, future))
+        return future
+
+    async def read_async(self, command):
+        self.stats['reads'] += 1
+        return await asyncio.get_running_loop().run_in_executor(self.readers, self.read, command)
+
+    async def execute(self, command):
+        return await (self.submit(command) if is_write(command) else self.read_async(command))
+
+    async def execute_many(self, commands):
+        # Порядок команд сохраняется: подряд идущие изменения уходят писателю вместе,
+        # а чтение ждёт ответа на все изменения перед ним
+        results, pending = [], []
+        for command in commands:
+            if is_write(command):
+                pending.append(self.submit(command))
+                continue
+            if pending:
+                results.extend(result for _, result in await asyncio.gather(*pending))
+                pending = []
+            results.append((await self.read_async(command))[1])
+        results.extend(result for _, result in await asyncio.gather(*pending))
+        return results
+
+    async def write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self.queue.get()]
+            while len(group) < MAX_WRITE_BATCH and not self.queue.empty():
+                group.append(self.queue.get_nowait())
+            commands = [command for command, _ in group]
+            try:
+                responses = await loop.run_in_executor(self.storage, self.apply, commands)
+            except Exception as e:
+                responses = [failure(command, 500, f'Внутренняя ошибка: {e}') for command in commands]
+            finally:
+                self.stats['writes'] += len(group)
+                self.stats['saves'] += 1
+                metrics.count('api_write_commands', len(group))
+            for (_, future), response in zip(group, responses):
+                if not future.done():
+                    future.set_result(response)
+                self.queue.task_done()
+
+    async def stop(self):
+        await self.queue.join()
+        self.writer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.writer
+        # close() заметок сохраняет индекс поиска и сжимает файл текстов
+        await asyncio.get_running_loop().run_in_executor(self.storage, self.close)
+        self.storage.shutdown()
+        self.readers.shutdown()
+
+    def close(self):
+        with self.data_lock.writing():
+            self.session.close()
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        path = unquote(url.path).strip('/')
+        if path == 'health' and method == 'GET':
+            return 200, {'ok': True, 'result': {**self.stats, 'queued': self.queue.qsize()}}
+        if path == 'commands' and method == 'GET':
+            return 200, {'ok': True, 'result': sorted(COMMANDS)}
+        if path in ('', 'commands'):
+            if method != 'POST':
+                raise HttpError(405, 'Команды передаются методом POST.')
+            payload = parse_body(body)
+            if isinstance(payload, list):
+                return 200, await self.execute_many(payload)
+            return await self.execute(payload)
+        name = path.replace('/', '.')
+        if name not in COMMANDS:
+            raise HttpError(404, f'Неизвестная команда: {name}')
+        if method == 'GET':
+            command = dict(parse_qsl(url.query))
+            if is_write({'command': name, **command}):
+                raise HttpError(405, 'Изменения передаются методом POST.')
+        elif method == 'POST':
+            command = parse_body(body)
+            if not isinstance(command, dict):
+                raise HttpError(400, 'Параметры передаются JSON-объектом.')
+        else:
+            raise HttpError(405, 'Поддерживаются только GET и POST.')
+        return await self.execute({**command, 'command': name})
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, target, version, headers, body = request
+                    started = time.perf_counter()
+                    try:
+                        status, payload = await self.route(method, target, body)
+                    except HttpError:
+                        raise
+                    except Exception as e:
+                        status, payload = 500, {'ok': False, 'error': f'Внутренняя ошибка: {e}'}
+                    metrics.observe('api_request_seconds', time.perf_counter() - started, method=method)
+                except HttpError as e:
+                    writer.write(response_bytes(e.status, {'ok': False, 'error': str(e)}, False))
+                    await writer.drain()
+                    break
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(response_bytes(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(host, port):
+    server = AssistantServer()
+    await server.start()
+    listener = await asyncio.start_server(server.handle, host, port)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(signum, stopping.set)
+    print(f'Сервер запущен: http://{host}:{port} (остановка — Ctrl+C)', flush=True)
+    await stopping.wait()
+    listener.close()
+    await server.stop()
+    print('Сервер остановлен, изменения сохранены.')
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный HTTP/JSON-сервер персонального помощника')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+if __name__ == '__main__':
+    main()
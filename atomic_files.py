@@ -0,0 +1,183 @@
+import os
+import stat
+import time
+import tempfile
+import threading
+from contextlib import contextmanager, suppress
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Файлы данных пишутся во временный файл рядом, затем fsync и os.replace: после сбоя
+# на диске остаётся либо старая, либо новая версия целиком. PA_FSYNC=0 отключает fsync —
+# быстрее, но при отключении питания последние изменения могут пропасть.
+FSYNC = os.environ.get('PA_FSYNC', '1') not in ('', '0')
+# Групповая фиксация: сколько миллисекунд поток, начинающий запись, ждёт запросы других
+# потоков, чтобы записать всё одним fsync. При 0 объединяются только запросы, пришедшие,
+# пока идёт предыдущая запись.
+GROUP_COMMIT_SECONDS = float(os.environ.get('PA_GROUP_COMMIT_MS', '0')) / 1000
+
+def current_umask():
+    # Узнать umask можно только заменив его, поэтому читаем один раз при импорте,
+    # пока другие потоки ещё не создают файлы
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# Права нового файла — как у open(): 0666 без битов umask
+NEW_FILE_MODE = 0o666 & ~current_umask()
+
+def fsync_file(f):
+    f.flush()
+    if FSYNC:
+        os.fsync(f.fileno())
+
+def fsync_directory(file_path):
+    # Новое имя файла переживёт сбой только после fsync каталога; на Windows так нельзя
+    if not FSYNC or os.name == 'nt':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def atomic_open(file_path, mode='w', encoding=None, newline=None):
+    # Как open() на запись, но файл подменяется только после успешного закрытия блока
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(file_path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, encoding=encoding, newline=newline) as f:
+            yield f
+            fsync_file(f)
+        # mkstemp создаёт файл с правами 0600 — сохраняем права старого файла,
+        # а новому даём обычные
+        try:
+            mode = stat.S_IMODE(os.stat(file_path).st_mode)
+        except FileNotFoundError:
+            mode = NEW_FILE_MODE
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(temp_path)
+        raise
+    fsync_directory(file_path)
+
+def lock_descriptor(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        # LK_LOCK сдаётся после десяти попыток за 10 секунд — ждём дальше
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                pass
+
+def unlock_descriptor(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+class FileLock:
+    # Рекомендательная блокировка файла <путь>.lock между процессами и потоками.
+    # Повторный захват тем же потоком не блокирует. Без fcntl и msvcrt остаётся
+    # только блокировка между потоками одного процесса.
+    def __init__(self, file_path):
+        self.lock_path = file_path + '.lock'
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if not self.depth:
+            try:
+                self.fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                lock_descriptor(self.fd)
+            except BaseException:
+                if self.fd is not None:
+                    os.close(self.fd)
+                    self.fd = None
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if not self.depth:
+            try:
+                unlock_descriptor(self.fd)
+            finally:
+                os.close(self.fd)
+                self.fd = None
+        self.thread_lock.release()
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def file_lock(file_path):
+    # Один объект блокировки на файл: путь абсолютный, чтобы смена каталога не путала файлы
+    path = os.path.abspath(file_path)
+    with _locks_guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = FileLock(path)
+        return lock
+
+class CommitGroup:
+    __slots__ = ('items', 'done', 'error')
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+
+class GroupCommit:
+    # Запросы на запись одного файла из разных потоков. Пока один поток пишет, остальные
+    # копят запросы, и следующий из них записывает их все одним вызовом write_func(items)
+    # с одним fsync. Между процессами запись разделяет file_lock() внутри write_func.
+    def __init__(self, write_func):
+        self.write_func = write_func
+        self.condition = threading.Condition()
+        self.group = CommitGroup()
+        self.writing = False
+
+    def submit(self, item):
+        # Возвращается, когда запись с этим запросом закончена (или выбрасывает её ошибку)
+        with self.condition:
+            group = self.group
+            group.items.append(item)
+            while self.writing and not group.done:
+                self.condition.wait()
+            if group.done:
+                if group.error is not None:
+                    raise group.error
+                return
+            self.writing = True
+        try:
+            if GROUP_COMMIT_SECONDS:
+                time.sleep(GROUP_COMMIT_SECONDS)
+            with self.condition:
+                self.group = CommitGroup()
+            self.write_func(group.items)
+        except BaseException as e:
+            group.error = e
+            raise
+        finally:
+            with self.condition:
+                group.done = True
+                self.writing = False
+                self.condition.notify_all()
@@ -0,0 +1,339 @@
+import io
+import sys
+import json
+import contextlib
+import threading
+from notes import NoteManager, Note
+from task import TaskManager
+from contact import ContactManager
+from finances import FinanceManager, parse_date
+from calculator import evaluate
+from pager import PAGE_SIZE, page_count
+from csv_export import CHECKPOINT_FILE
+
+# Неинтерактивный режим. Команда — JSON-объект с полем "command" ("раздел.действие")
+# и параметрами, например {"command": "tasks.done", "id": 5}; необязательное поле "ref"
+# возвращается в ответе без изменений, чтобы сопоставлять ответы с командами.
+# Команды читаются из файла или stdin по одной на строку или задаются в командной
+# строке. Каждый менеджер загружается один раз, а изменения всех команд сохраняются
+# одной записью в конце.
+USAGE = '''Использование:
+  python personal_assistant.py                           — интерактивное меню
+  python personal_assistant.py run [ФАЙЛ|-]              — команды JSON по одной на строку (по умолчанию stdin)
+  python personal_assistant.py РАЗДЕЛ.ДЕЙСТВИЕ [имя=значение ...]  — одна команда
+  python personal_assistant.py commands                  — список команд
+Результат каждой команды — строка JSON: {"ok": true, "result": ...} или {"ok": false, "error": ...}.'''
+
+MANAGERS = {'notes': NoteManager, 'tasks': TaskManager, 'contacts': ContactManager, 'finance': FinanceManager}
+
+class CommandError(ValueError):
+    pass
+
+def required(args, name):
+    if args.get(name) is None:
+        raise CommandError(f'Не указан параметр {name}.')
+    return args[name]
+
+def text(args, name, default=''):
+    value = args.get(name, default)
+    return value if value is None else str(value)
+
+def integer(args, name, default=None, minimum=None):
+    value = required(args, name) if default is None else args.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise CommandError(f'Параметр {name} должен быть целым числом.')
+    if minimum is not None and value < minimum:
+        raise CommandError(f'Параметр {name} должен быть не меньше {minimum}.')
+    return value
+
+def number(args, name):
+    try:
+        return float(str(required(args, name)).replace(',', '.'))
+    except ValueError:
+        raise CommandError(f'Параметр {name} должен быть числом.')
+
+def flag(args, name):
+    value = args.get(name, False)
+    return value.lower() in ('1', 'true', 'да') if isinstance(value, str) else bool(value)
+
+def date_text(args, name, default=None):
+    value = text(args, name, default)
+    if value is not None and parse_date(value) is None:
+        raise CommandError(f'Параметр {name}: некорректная дата, нужен формат ДД-ММ-ГГГГ.')
+    return value
+
+def record_dict(record):
+    if isinstance(record, tuple):
+        return list(record)
+    if isinstance(record, Note):
+        # Заметка: текст — всегда целиком, независимо от раскладки хранения
+        return {'id': record.id, 'title': record.title, 'content': record.content, 'timestamp': record.timestamp,
+                'version': record.version}
+    return record.to_dict()
+
+def page_result(page, args, size):
+    items, _, total = page
+    return {'items': [record_dict(item) for item in items], 'total': total, 'page': page_of(args),
+            'pages': page_count(total, size)}
+
+def existing(manager, getter, args):
+    record = getattr(manager, getter)(integer(args, 'id'))
+    if record is None:
+        raise CommandError('Запись не найдена.')
+    return record
+
+def only(records):
+    if not records:
+        raise CommandError('Запись не найдена.')
+    return record_dict(records[0])
+
+def notes_edit(manager, args):
+    note = existing(manager, 'get_note_by_id', args)
+    return only(manager.edit_many([(note.id, text(args, 'title', note.title), text(args, 'content', note.content))]))
+
+def tasks_edit(manager, args):
+    task = existing(manager, 'get_task_by_id', args)
+    return only(manager.edit_many([(task.id, text(args, 'title', task.title),
+                                    text(args, 'description', task.description),
+                                    text(args, 'priority', task.priority), date_text(args, 'due_date', task.due_date))]))
+
+def contacts_edit(manager, args):
+    contact = existing(manager, 'get_contact_by_id', args)
+    return only(manager.edit_many([(contact.id, text(args, 'name', contact.name), text(args, 'phone', contact.phone),
+                                    text(args, 'email', contact.email))]))
+
+def finance_edit(manager, args):
+    record = existing(manager, 'get_record_by_id', args)
+    amount = number(args, 'amount') if 'amount' in args else record.amount
+    return only(manager.edit_many([(record.id, amount, text(args, 'category', record.category),
+                                    date_text(args, 'date', record.date),
+                                    text(args, 'description', record.description))]))
+
+def finance_report(manager, args):
+    start_date, end_date = date_text(args, 'start_date'), date_text(args, 'end_date')
+    if start_date is None or end_date is None:
+        raise CommandError('Нужны параметры start_date и end_date.')
+    income, expenses = manager.aggregates.totals(parse_date(start_date), parse_date(end_date))
+    categories = manager.category_totals(start_date, end_date)
+    result = {'income': income, 'expenses': expenses, 'balance': round(income + expenses, 2),
+              'categories': {category: {'income': category_income, 'expenses': category_expenses}
+                             for category, (category_income, category_expenses) in categories.items()}}
+    if args.get('file_name'):
+        manager.generate_report(start_date, end_date, text(args, 'file_name'))
+        result['file_name'] = args['file_name']
+    return result
+
+def finance_analytics(manager, args):
+    rows = manager.analytics_report(text(args, 'report_type', 'category'), date_text(args, 'start_date'),
+                                    date_text(args, 'end_date'), integer(args, 'top_n', 10, minimum=1))
+    if rows is None:
+        raise CommandError('Отчёт не построен: проверьте тип отчёта и даты.')
+    return [record_dict(row) for row in rows]
+
+def export_changes(manager, args):
+    # Выгрузка изменений с прошлой отметки — для ночной синхронизации по расписанию
+    file_name = text(args, 'file_name', manager.CHANGES_FILE)
+    result = manager.export_changes_to_csv(file_name, text(args, 'checkpoint_file', CHECKPOINT_FILE))
+    if result is None:
+        raise CommandError('Выгрузка не выполнена: проверьте файл отметок.')
+    counts, full = result
+    return {'file_name': file_name, 'full': full, 'counts': counts}
+
+def size_of(args):
+    return integer(args, 'size', PAGE_SIZE, minimum=1)
+
+def page_of(args):
+    return integer(args, 'page', 0, minimum=0)
+
+def limit_of(args, default):
+    return integer(args, 'limit', default, minimum=1)
+
+# 'раздел.действие' -> функция(менеджер, параметры); раздел calc работает без менеджера
+COMMANDS = {
+    'notes.add': lambda manager, args: only(manager.add_many([(text(args, 'title'), text(args, 'content'))])),
+    'notes.edit': notes_edit,
+    'notes.delete': lambda manager, args: only(manager.delete_many([integer(args, 'id')])),
+    'notes.get': lambda manager, args: record_dict(existing(manager, 'get_note_by_id', args)),
+    'notes.search': lambda manager, args: [record_dict(note) for note in
+                                           manager.search_notes(text(args, 'query'), limit_of(args, 20))],
+    'notes.export_changes': export_changes,
+    'notes.list': lambda manager, args: page_result(manager.page_notes(
+        size_of(args), text(args, 'sort_by', 'id'), page_of(args), reverse=flag(args, 'reverse'),
+        start_date=date_text(args, 'start_date'), end_date=date_text(args, 'end_date')), args, size_of(args)),
+    'tasks.add': lambda manager, args: only(manager.add_many([(text(args, 'title'), text(args, 'description'),
+                                                               text(args, 'priority', 'Средний'),
+                                                               date_text(args, 'due_date'))])),
+    'tasks.edit': tasks_edit,
+    'tasks.done': lambda manager, args: only(manager.mark_many([integer(args, 'id')])),
+    'tasks.delete': lambda manager, args: only(manager.delete_many([integer(args, 'id')])),
+    'tasks.get': lambda manager, args: record_dict(existing(manager, 'get_task_by_id', args)),
+    'tasks.list': lambda manager, args: page_result(manager.page_tasks(
+        size_of(args), text(args, 'filter_by', None), text(args, 'priority', None), text(args, 'sort_by', 'id'),
+        page_of(args), reverse=flag(args, 'reverse')), args, size_of(args)),
+    'tasks.export_changes': export_changes,
+    'tasks.overdue': lambda manager, args: [record_dict(task) for task in manager.overdue_tasks()],
+    'tasks.due_within': lambda manager, args: [record_dict(task) for task in
+                                               manager.tasks_due_within(integer(args, 'days', 7, minimum=0))],
+    'tasks.top': lambda manager, args: [record_dict(task) for task in manager.top_tasks(limit_of(args, 10))],
+    'contacts.add': lambda manager, args: only(manager.add_many([(text(args, 'name'), text(args, 'phone'),
+                                                                  text(args, 'email'))])),
+    'contacts.edit': contacts_edit,
+    'contacts.delete': lambda manager, args: only(manager.delete_many([integer(args, 'id')])),
+    'contacts.get': lambda manager, args: record_dict(existing(manager, 'get_contact_by_id', args)),
+    'contacts.search': lambda manager, args: [record_dict(contact) for contact in
+                                              manager.search_contacts(text(args, 'query'), limit_of(args, 20))],
+    'contacts.export_changes': export_changes,
+    'contacts.list': lambda manager, args: page_result(manager.page_contacts(
+        size_of(args), page_of(args), reverse=flag(args, 'reverse')), args, size_of(args)),
+    'finance.add': lambda manager, args: only(manager.add_many([(number(args, 'amount'), text(args, 'category'),
+                                                                 date_text(args, 'date'),
+                                                                 text(args, 'description'))])),
+    'finance.edit': finance_edit,
+    'finance.delete': lambda manager, args: only(manager.delete_many([integer(args, 'id')])),
+    'finance.get': lambda manager, args: record_dict(existing(manager, 'get_record_by_id', args)),
+    'finance.list': lambda manager, args: page_result(manager.page_records(
+        size_of(args), text(args, 'category', None), date_text(args, 'start_date'), date_text(args, 'end_date'),
+        text(args, 'sort_by', 'id'), page_of(args), reverse=flag(args, 'reverse')), args, size_of(args)),
+    'finance.report': finance_report,
+    'finance.export_changes': export_changes,
+    'finance.analytics': finance_analytics,
+    'calc.evaluate': lambda manager, args: evaluate(text(args, 'expression'), args.get('variables') or {}),
+}
+
+class ThreadOutput:
+    # Замена sys.stdout: в потоке внутри quiet() вывод отбрасывается, остальные потоки
+    # печатают как обычно. contextlib.redirect_stdout меняет вывод сразу для всех потоков.
+    local = threading.local()
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def target(self):
+        return getattr(self.local, 'target', None) or self.stream
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+_output_guard = threading.Lock()
+
+@contextlib.contextmanager
+def quiet():
+    # Сообщения менеджеров для человека не нужны, когда ответом служит результат
+    with _output_guard:
+        if not isinstance(sys.stdout, ThreadOutput):
+            sys.stdout = ThreadOutput(sys.stdout)
+    previous = getattr(ThreadOutput.local, 'target', None)
+    ThreadOutput.local.target = io.StringIO()
+    try:
+        yield
+    finally:
+        ThreadOutput.local.target = previous
+
+class BatchSession:
+    # Менеджеры загружаются при первой команде своего раздела и при hold=True до close()
+    # остаются внутри batch(): изменения копятся в памяти и записываются один раз.
+    # С hold=False сохранением управляет владелец сессии (см. api_server.py).
+    def __init__(self, hold=True):
+        self.managers = {}
+        self.hold = hold
+        self.batches = contextlib.ExitStack()
+
+    def manager(self, section):
+        manager = self.managers.get(section)
+        if manager is None:
+            manager = self.managers[section] = MANAGERS[section]()
+            if self.hold:
+                self.batches.enter_context(manager.batch())
+        return manager
+
+    def execute(self, command):
+        # Результат команды в виде словаря; ошибка одной команды не останавливает остальные
+        result = {'ref': command['ref']} if isinstance(command, dict) and 'ref' in command else {}
+        try:
+            if not isinstance(command, dict):
+                raise CommandError('Команда должна быть JSON-объектом.')
+            name = command.get('command')
+            handler = COMMANDS.get(name)
+            if handler is None:
+                raise CommandError(f'Неизвестная команда: {name}')
+            args = {key: value for key, value in command.items() if key not in ('command', 'ref')}
+            section = name.split('.', 1)[0]
+            with quiet():
+                value = handler(self.manager(section) if section in MANAGERS else None, args)
+            result.update(ok=True, result=value)
+        except (ValueError, KeyError, TypeError, ArithmeticError, OSError) as e:
+            # OSError — например, выгрузка в несуществующий каталог
+            result.update(ok=False, error=str(e))
+        return result
+
+    def close(self):
+        with quiet():
+            self.batches.close()
+            if 'notes' in self.managers:
+                # Сохраняет индекс поиска заметок и сжимает файлы текстов
+                self.managers['notes'].close()
+
+def read_commands(lines):
+    # Команды по одной на строку; на месте некорректной строки — CommandError
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield CommandError(f'Строка {line_number}: некорректный JSON ({e.msg}).')
+
+def parse_assignments(items):
+    args = {}
+    for item in items:
+        if '=' not in item:
+            raise CommandError(f'Параметр должен иметь вид имя=значение: {item}')
+        name, value = item.split('=', 1)
+        args[name] = value
+    return args
+
+def run_commands(commands, output=None):
+    # Выполняет команды одной сессией и печатает результаты по одному JSON на строку;
+    # возвращает число неудачных команд
+    output = output or sys.stdout
+    session = BatchSession()
+    failed = 0
+    try:
+        for command in commands:
+            if isinstance(command, CommandError):
+                result = {'ok': False, 'error': str(command)}
+            else:
+                result = session.execute(command)
+            failed += not result['ok']
+            output.write(json.dumps(result, ensure_ascii=False, default=str) + '\n')
+    finally:
+        session.close()
+    return failed
+
+def run_cli(argv):
+    if not argv or argv[0] in ('-h', '--help', 'help'):
+        print(USAGE)
+        return 0
+    if argv[0] == 'commands':
+        print('\n'.join(sorted(COMMANDS)))
+        return 0
+    if argv[0] == 'run':
+        source = argv[1] if len(argv) > 1 else '-'
+        if source == '-':
+            return 1 if run_commands(read_commands(sys.stdin)) else 0
+        with open(source, 'r', encoding='utf-8') as f:
+            return 1 if run_commands(read_commands(f)) else 0
+    try:
+        command = {'command': argv[0], **parse_assignments(argv[1:])}
+    except CommandError as e:
+        print(e, file=sys.stderr)
+        return 2
+    return 1 if run_commands([command]) else 0
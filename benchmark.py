@@ -0,0 +1,417 @@
+import os
+import gc
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+import io
+import datetime
+import platform
+import statistics
+import subprocess
+import tracemalloc
+
+from finances import FinanceRecord, FinanceManager, parse_date
+from task import Task, TaskManager
+from notes import NoteManager
+from contact import ContactManager
+from finance_columns import FinanceColumns
+from binary_snapshot import read_file, write_file
+from load_save_functon import STORAGE_MODE, load_data, save_data
+from pager import PAGE_SIZE
+import sqlite_storage
+
+CATEGORIES = ['Продукты', 'Транспорт', 'Жильё', 'Зарплата', 'Развлечения', 'Здоровье', 'Связь', 'Подарки']
+PRIORITIES = ['Низкий', 'Средний', 'Высокий']
+WORDS = ['отчёт', 'встреча', 'проект', 'бюджет', 'план', 'звонок', 'клиент', 'договор', 'отпуск', 'ремонт',
+         'покупка', 'идея', 'сервер', 'релиз', 'обучение', 'здоровье', 'поездка', 'счёт', 'задача', 'семья']
+FIRST_NAMES = ['Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена', 'Дмитрий', 'Наталья', 'Алексей']
+LAST_NAMES = ['Иванов', 'Петрова', 'Смирнов', 'Кузнецова', 'Попов', 'Соколова', 'Лебедев', 'Новикова']
+# Размеры данных набора замеров по умолчанию; 1000000 можно задать через --sizes
+SUITE_SIZES = [1000, 100000]
+# Сколько записей добавляется, удаляется и изменяется за одну операцию набора
+SUITE_CHANGES = 100
+# Изменения медианы меньше этого времени в секундах при сравнении не считаются
+SUITE_NOISE_SECONDS = 0.0005
+
+def random_date(rng):
+    return f'{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.randint(2015, 2024)}'
+
+def write_finance_csv(file_name, rows, seed=1):
+    rng = random.Random(seed)
+    with open(file_name, mode='w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['ID', 'Сумма', 'Категория', 'Дата', 'Описание'])
+        for i in range(rows):
+            amount = round(rng.uniform(-5000, 5000), 2)
+            writer.writerow([i + 1, amount, rng.choice(CATEGORIES), random_date(rng), f'Операция {i}'])
+
+def import_before(file_name):
+    # Импорт в прежнем виде: список записей и max(id) заново для каждой строки
+    records = []
+    with open(file_name, mode='r', encoding='utf-8') as csv_file:
+        reader = csv.DictReader(csv_file)
+        for row in reader:
+            record_id = max([record.id for record in records], default=0) + 1
+            records.append(FinanceRecord(record_id, float(row.get('Сумма', '0')), row.get('Категория', ''),
+                                         row.get('Дата', ''), row.get('Описание', '')))
+    return records
+
+def import_after(file_name, workers=None):
+    manager = FinanceManager()
+    manager.import_records_from_csv(file_name, workers)
+    return manager.records
+
+def timed(func, *args):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    return time.perf_counter() - started, result
+
+@contextlib.contextmanager
+def work_directory():
+    # Менеджеры пишут файлы в текущий каталог, поэтому замеры идут во временном.
+    # Соединения SQLite закрываются, чтобы база открылась заново уже в новом каталоге
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        sqlite_storage.close_connections()
+        os.chdir(work_dir)
+        try:
+            yield work_dir
+        finally:
+            sqlite_storage.close_connections()
+            os.chdir(previous_dir)
+
+def bench_import(rows, before_rows, workers=None):
+    with work_directory() as work_dir:
+        file_name = os.path.join(work_dir, 'bench_finance.csv')
+        if before_rows:
+            write_finance_csv(file_name, before_rows)
+            seconds, records = timed(import_before, file_name)
+            print(f'До:    {len(records)} строк за {seconds:.2f} с')
+        write_finance_csv(file_name, rows)
+        seconds, records = timed(import_after, file_name)
+        print(f'После: {len(records)} строк за {seconds:.2f} с (включая сохранение finance.json)')
+        if workers:
+            with work_directory():
+                seconds, records = timed(import_after, file_name, workers)
+            print(f'После, {workers} процессов: {len(records)} строк за {seconds:.2f} с')
+
+def make_finance_records(rows, seed=1):
+    rng = random.Random(seed)
+    return [FinanceRecord(i + 1, round(rng.uniform(-5000, 5000), 2), rng.choice(CATEGORIES), random_date(rng),
+                          f'Операция {i}') for i in range(rows)]
+
+def totals_by_category_loop(records, start, end):
+    # Те же суммы обычным циклом по записям, как в generate_report
+    totals = {}
+    for record in records:
+        if record.date_value is not None and start <= record.date_value <= end:
+            income, expenses = totals.get(record.category, (0, 0))
+            if record.amount > 0:
+                income += record.amount
+            else:
+                expenses += record.amount
+            totals[record.category] = (income, expenses)
+    return totals
+
+def bench_analytics(rows, repeats):
+    records = make_finance_records(rows)
+    start, end = datetime.date(2018, 1, 1), datetime.date(2021, 12, 31)
+    seconds = min(timed(totals_by_category_loop, records, start, end)[0] for _ in range(repeats))
+    print(f'Цикл по {rows} записям, суммы по категориям: {seconds * 1000:.1f} мс')
+    seconds, columns = timed(FinanceColumns, records)
+    print(f'Построение столбцов: {seconds * 1000:.1f} мс')
+    reports = [
+        ('суммы по категориям', columns.totals_by_category),
+        ('суммы по месяцам', columns.totals_by_month),
+        ('баланс нарастающим итогом', columns.running_balance),
+        ('10 крупнейших расходов', columns.top_expenses),
+    ]
+    for title, report in reports:
+        seconds = min(timed(report, start, end)[0] for _ in range(repeats))
+        print(f'NumPy, {title}: {seconds * 1000:.1f} мс')
+
+class PlainRecord:
+    # Запись в прежнем виде: обычный класс с __dict__ и без интернирования строк
+    def __init__(self, data, parse_dates=False):
+        for key, value in data.items():
+            setattr(self, key, value)
+        if parse_dates:
+            self.date_value = parse_date.__wrapped__(data['date'])
+
+def make_finance_data(rows, seed=1):
+    rng = random.Random(seed)
+    return [{'id': i + 1, 'amount': round(rng.uniform(-5000, 5000), 2), 'category': rng.choice(CATEGORIES),
+             'date': random_date(rng), 'description': f'Операция {i}'} for i in range(rows)]
+
+def make_task_data(rows, seed=1):
+    rng = random.Random(seed)
+    return [{'id': i + 1, 'title': f'Задача {i}', 'description': f'Описание {i}', 'done': rng.random() < 0.5,
+             'priority': rng.choice(PRIORITIES), 'due_date': random_date(rng)} for i in range(rows)]
+
+def make_note_data(rows, seed=1):
+    rng = random.Random(seed)
+    return [{'id': i + 1, 'title': f'Заметка {i} {rng.choice(WORDS)}', 'content': ' '.join(rng.choices(WORDS, k=20)),
+             'timestamp': f'{random_date(rng)} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00'}
+            for i in range(rows)]
+
+def make_contact_data(rows, seed=1):
+    rng = random.Random(seed)
+    return [{'id': i + 1, 'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}',
+             'phone': f'+7{rng.randint(9000000000, 9999999999)}', 'email': f'user{i}@example.com'}
+            for i in range(rows)]
+
+def make_memory_data(rows, seed=1):
+    # Словари, как после json.load: у каждой записи свои экземпляры строк
+    return json.dumps(make_finance_data(rows, seed)), json.dumps(make_task_data(rows, seed))
+
+def retained_bytes(build, text):
+    # Сколько памяти остаётся занято записями после того, как исходные словари освобождены
+    gc.collect()
+    tracemalloc.start()
+    records = build(json.loads(text))
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(records)
+
+def bench_memory(rows):
+    finance_text, tasks_text = make_memory_data(rows)
+    cases = [
+        ('FinanceRecord', finance_text, lambda data: [PlainRecord(item, parse_dates=True) for item in data],
+         lambda data: [FinanceRecord.from_dict(item) for item in data]),
+        ('Task', tasks_text, lambda data: [PlainRecord(item) for item in data],
+         lambda data: [Task.from_dict(item) for item in data]),
+    ]
+    for title, text, before, after in cases:
+        before_bytes = retained_bytes(before, text)
+        after_bytes = retained_bytes(after, text)
+        print(f'{title}: до {before_bytes:.0f} байт на запись, после {after_bytes:.0f} '
+              f'({after_bytes / before_bytes:.0%})')
+
+def bench_snapshot(rows, repeats):
+    finance_text, tasks_text = make_memory_data(rows)
+    with work_directory():
+        for file_name, text in (('finance.json', finance_text), ('tasks.json', tasks_text)):
+            data = json.loads(text)
+            results = {}
+            for snapshot_format in ('json', 'binary'):
+                seconds = timed(write_file, file_name, data, snapshot_format)[0]
+                size = os.path.getsize(file_name)
+                load_seconds = min(timed(read_file, file_name)[0] for _ in range(repeats))
+                results[snapshot_format] = (size, load_seconds)
+                print(f'{file_name}, {snapshot_format}: {size / 1024 / 1024:.1f} МБ, запись {seconds:.2f} с, '
+                      f'чтение {load_seconds:.2f} с')
+            (json_size, json_load), (binary_size, binary_load) = results['json'], results['binary']
+            print(f'{file_name}: файл меньше в {json_size / binary_size:.1f} раза, '
+                  f'чтение быстрее в {json_load / binary_load:.1f} раза')
+
+# Файл данных, менеджер, генератор данных и методы экспорта/импорта для каждого раздела
+SUITE_SECTIONS = {
+    'notes': ('notes.json', NoteManager, make_note_data, 'export_notes_to_csv', 'import_notes_from_csv'),
+    'tasks': ('tasks.json', TaskManager, make_task_data, 'export_tasks_to_csv', 'import_tasks_from_csv'),
+    'contacts': ('contacts.json', ContactManager, make_contact_data, 'export_contacts_to_csv',
+                 'import_contacts_from_csv'),
+    'finance': ('finance.json', FinanceManager, make_finance_data, 'export_records_to_csv',
+                'import_records_from_csv'),
+}
+
+def measure(func, repeats, warmup):
+    # Прогрев без учёта, затем repeats замеров; результат операции сразу отбрасывается
+    for _ in range(warmup):
+        timed(func)
+    samples = [timed(func)[0] for _ in range(repeats)]
+    return {'min': min(samples), 'median': statistics.median(samples), 'mean': statistics.mean(samples),
+            'max': max(samples), 'repeats': repeats}
+
+def import_fresh(manager_class, method_name, csv_path):
+    # Импорт в пустой каталог, чтобы каждый повтор начинался с одинакового состояния
+    with work_directory():
+        getattr(manager_class(), method_name)(csv_path)
+
+def record_edits(name, records):
+    # Правки, записывающие те же значения: данные от повтора к повтору не меняются
+    if name == 'notes':
+        return [(note.id, note.title, note.content) for note in records]
+    if name == 'tasks':
+        return [(task.id, task.title, task.description, task.priority, task.due_date) for task in records]
+    if name == 'contacts':
+        return [(contact.id, contact.name, contact.phone, contact.email) for contact in records]
+    return [(record.id, record.amount, record.category, record.date, record.description) for record in records]
+
+def new_records(name, count):
+    if name == 'notes':
+        return [('Новая заметка', 'текст заметки')] * count
+    if name == 'tasks':
+        return [('Новая задача', 'описание', 'Средний', '01-01-2030')] * count
+    if name == 'contacts':
+        return [('Новый контакт', '+79000000000', 'new@example.com')] * count
+    return [(100.0, 'Продукты', '01-01-2030', 'новая операция')] * count
+
+def add_and_delete(manager, rows):
+    added = manager.add_many(rows)
+    manager.delete_many([record.id for record in added])
+
+def suite_operations(size, sections):
+    # (имя, функция) для всех операций набора; данные уже записаны в текущий каталог
+    rng = random.Random(size)
+    middle_page = size // 2 // PAGE_SIZE
+    operations = []
+    for name in sections:
+        file_name, manager_class, _, export_method, import_method = SUITE_SECTIONS[name]
+        data = load_data(file_name, [])
+        operations.append((f'storage.load.{name}', lambda file_name=file_name: load_data(file_name, [])))
+        operations.append((f'storage.save.{name}', lambda file_name=file_name, data=data: save_data(file_name, data)))
+        del data
+        manager = manager_class()
+        records = manager.notes if name == 'notes' else manager.tasks if name == 'tasks' else \
+            manager.contacts if name == 'contacts' else manager.records
+        sample = [records.get(record_id) for record_id in rng.sample(range(1, size + 1), min(SUITE_CHANGES, size))]
+        csv_path = os.path.abspath(f'suite_{name}.csv')
+        with contextlib.redirect_stdout(io.StringIO()):
+            getattr(manager, export_method)(csv_path)
+        operations += [
+            (f'{name}.load', manager_class),
+            (f'{name}.add_delete', lambda manager=manager, rows=new_records(name, len(sample)):
+                add_and_delete(manager, rows)),
+            (f'{name}.edit', lambda manager=manager, edits=record_edits(name, sample): manager.edit_many(edits)),
+            (f'{name}.export', lambda manager=manager, method=export_method:
+                getattr(manager, method)(f'export_{name}.csv')),
+            (f'{name}.import', lambda manager_class=manager_class, method=import_method, csv_path=csv_path:
+                import_fresh(manager_class, method, csv_path)),
+        ]
+        if name == 'notes':
+            operations += [
+                ('notes.search', lambda manager=manager: manager.search_notes('проект бюджет')),
+                ('notes.page', lambda manager=manager: manager.page_notes(PAGE_SIZE, 'timestamp', middle_page)),
+            ]
+        elif name == 'tasks':
+            operations += [
+                ('tasks.overdue', lambda manager=manager: manager.overdue_tasks(datetime.date(2020, 1, 1))),
+                ('tasks.top', lambda manager=manager: manager.top_tasks(10)),
+                ('tasks.page', lambda manager=manager: manager.page_tasks(PAGE_SIZE, 'not_done', number=middle_page // 2)),
+            ]
+        elif name == 'contacts':
+            operations.append(('contacts.search', lambda manager=manager: manager.search_contacts('Иван')))
+        else:
+            def report(manager=manager):
+                manager.report_cache.clear()
+                manager.generate_report('01-01-2018', '31-12-2021', 'report.csv')
+            operations += [
+                ('finance.report', report),
+                ('finance.analytics', lambda manager=manager:
+                    manager.analytics_report('category', '01-01-2018', '31-12-2021')),
+                ('finance.page', lambda manager=manager: manager.page_records(PAGE_SIZE, 'Продукты', number=middle_page // 8)),
+            ]
+    return operations
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(sizes, repeats, warmup, output_file, sections):
+    # Синтетические данные всех разделов для каждого размера, замеры с прогревом и повторами,
+    # результаты — в JSON-файл для сравнения между версиями (команда compare)
+    results = []
+    for size in sizes:
+        with work_directory():
+            for name in sections:
+                file_name, _, make_data, _, _ = SUITE_SECTIONS[name]
+                save_data(file_name, make_data(size), {'next_id': size + 1})
+            for operation, func in suite_operations(size, sections):
+                result = {'operation': operation, 'size': size, **measure(func, repeats, warmup)}
+                results.append(result)
+                print(f'{operation} [{size}]: медиана {result["median"] * 1000:.2f} мс, '
+                      f'мин. {result["min"] * 1000:.2f} мс')
+    meta = {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'revision': git_revision(),
+            'storage_mode': STORAGE_MODE, 'python': platform.python_version(), 'platform': platform.platform(),
+            'sizes': sizes, 'repeats': repeats, 'warmup': warmup}
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f'Результаты записаны в файл {output_file}')
+
+def compare_results(old_file, new_file, threshold):
+    # Сравнение медиан двух запусков; возвращает число замедлений больше threshold
+    with open(old_file, encoding='utf-8') as f:
+        old = {(result['operation'], result['size']): result for result in json.load(f)['results']}
+    with open(new_file, encoding='utf-8') as f:
+        new = json.load(f)['results']
+    regressions = 0
+    for result in new:
+        previous = old.get((result['operation'], result['size']))
+        if previous is None:
+            continue
+        before, after = previous['median'], result['median']
+        ratio = after / before if before else float('inf')
+        mark = ''
+        if abs(after - before) >= SUITE_NOISE_SECONDS:
+            if ratio > 1 + threshold:
+                mark = 'ЗАМЕДЛЕНИЕ'
+                regressions += 1
+            elif ratio < 1 - threshold:
+                mark = 'ускорение'
+        print(f'{result["operation"]:<24} {result["size"]:>8} {before * 1000:>10.2f} мс {after * 1000:>10.2f} мс '
+              f'{ratio:>6.2f}x {mark}')
+    print(f'Замедлений больше {threshold:.0%}: {regressions}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры производительности персонального помощника')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='импорт финансовых записей из CSV')
+    import_parser.add_argument('--rows', type=int, default=100000)
+    import_parser.add_argument('--before-rows', type=int, default=None,
+                               help='сколько строк импортировать старым способом (по умолчанию столько же, 0 — пропустить)')
+    import_parser.add_argument('--workers', type=int, default=None,
+                               help='дополнительно замерить параллельный разбор в N процессах')
+    analytics_parser = subparsers.add_parser('analytics', help='аналитика по финансовым записям: цикл против NumPy')
+    analytics_parser.add_argument('--rows', type=int, default=1000000)
+    analytics_parser.add_argument('--repeats', type=int, default=5)
+    memory_parser = subparsers.add_parser('memory', help='память на одну запись: обычный класс против __slots__')
+    memory_parser.add_argument('--rows', type=int, default=200000)
+    snapshot_parser = subparsers.add_parser('snapshot', help='снимок данных: JSON против двоичного формата')
+    snapshot_parser.add_argument('--rows', type=int, default=300000)
+    snapshot_parser.add_argument('--repeats', type=int, default=3)
+    suite_parser = subparsers.add_parser('suite', help='набор замеров всех разделов и хранилища с записью в JSON')
+    suite_parser.add_argument('--sizes', default=','.join(map(str, SUITE_SIZES)),
+                              help='размеры данных через запятую, например 1000,100000,1000000')
+    suite_parser.add_argument('--repeats', type=int, default=5)
+    suite_parser.add_argument('--warmup', type=int, default=1)
+    suite_parser.add_argument('--sections', default=','.join(SUITE_SECTIONS),
+                              help='разделы через запятую: ' + ', '.join(SUITE_SECTIONS))
+    suite_parser.add_argument('--output', default='benchmark_results.json')
+    compare_parser = subparsers.add_parser('compare', help='сравнить два файла результатов suite')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help='допустимое замедление медианы, доля (по умолчанию 0.2)')
+    args = parser.parse_args()
+    if args.command == 'import':
+        bench_import(args.rows, args.rows if args.before_rows is None else args.before_rows, args.workers)
+    elif args.command == 'analytics':
+        bench_analytics(args.rows, args.repeats)
+    elif args.command == 'memory':
+        bench_memory(args.rows)
+    elif args.command == 'snapshot':
+        bench_snapshot(args.rows, args.repeats)
+    elif args.command == 'suite':
+        sections = [name for name in args.sections.split(',') if name]
+        unknown = [name for name in sections if name not in SUITE_SECTIONS]
+        if unknown:
+            parser.error(f'неизвестные разделы: {", ".join(unknown)}')
+        sizes = [int(size) for size in args.sizes.split(',') if size]
+        run_suite(sizes, args.repeats, args.warmup, args.output, sections)
+    elif args.command == 'compare':
+        # Ненулевой код выхода при замедлениях — для проверки в CI
+        sys.exit(1 if compare_results(args.old, args.new, args.threshold) else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import sys
+import json
+import struct
+from array import array
+from itertools import repeat
+from atomic_files import atomic_open
+
+# Двоичный снимок: MAGIC, версия формата, длина заголовка, заголовок в JSON
+# (число записей, описание столбцов и служебные данные файла), затем столбцы подряд.
+# Столбцы: 'int' — int64, 'float' — float64, 'bool' — по байту,
+# 'str' — строки UTF-8 через '\0', 'cat' — словарь значений в заголовке и коды,
+# 'json' — всё остальное (списки, смешанные типы) одним JSON.
+# У столбцов int/float/bool/str с пропусками перед данными идёт маска None по байту на запись.
+MAGIC = b'PASNAP'
+VERSION = 1
+PREFIX = struct.Struct('<6sBI')
+# Строки превращаются в словарь, если различных значений не больше этой доли записей
+CATEGORY_RATIO = 0.25
+
+def is_snapshot(blob):
+    return blob[:len(MAGIC)] == MAGIC
+
+def column_type(values):
+    present = [value for value in values if value is not None]
+    kinds = {type(value) for value in present}
+    if not kinds:
+        return 'json'
+    if kinds == {bool}:
+        return 'bool'
+    if kinds == {int} and all(-2 ** 63 <= value < 2 ** 63 for value in present):
+        return 'int'
+    if kinds == {float}:
+        return 'float'
+    if kinds == {str}:
+        if len(set(values)) <= max(1, len(values) * CATEGORY_RATIO):
+            return 'cat'
+        if not any('\0' in value for value in present):
+            return 'str'
+    return 'json'
+
+def encode_column(name, values):
+    kind = column_type(values)
+    column = {'name': name, 'type': kind}
+    parts = []
+    if kind in ('int', 'float', 'bool', 'str') and None in values:
+        column['nulls'] = True
+        parts.append(bytes(value is None for value in values))
+    if kind == 'int':
+        parts.append(array('q', (value or 0 for value in values)).tobytes())
+    elif kind == 'float':
+        parts.append(array('d', (value or 0.0 for value in values)).tobytes())
+    elif kind == 'bool':
+        parts.append(bytes(bool(value) for value in values))
+    elif kind == 'str':
+        parts.append('\0'.join(value or '' for value in values).encode('utf-8'))
+    elif kind == 'cat':
+        column['values'] = list(dict.fromkeys(values))
+        codes = {value: code for code, value in enumerate(column['values'])}
+        column['code'] = 'H' if len(codes) <= 0xFFFF else 'I'
+        parts.append(array(column['code'], (codes[value] for value in values)).tobytes())
+    else:
+        parts.append(json.dumps(values, ensure_ascii=False).encode('utf-8'))
+    column['size'] = sum(len(part) for part in parts)
+    return column, parts
+
+def encode(data, meta=None):
+    # Столбцами пишутся только списки записей с одинаковым набором ключей,
+    # остальное — одним JSON внутри снимка
+    names = list(data[0]) if data else []
+    columnar = all(len(record) == len(names) and all(name in record for name in names) for record in data)
+    if columnar:
+        encoded = [encode_column(name, [record[name] for record in data]) for name in names]
+    else:
+        encoded = [encode_column(None, data)]
+    header = {'count': len(data), 'columnar': columnar, 'columns': [column for column, _ in encoded]}
+    if meta is not None:
+        header['meta'] = meta
+    header = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    chunks = [PREFIX.pack(MAGIC, VERSION, len(header)), header]
+    for _, parts in encoded:
+        chunks.extend(parts)
+    return b''.join(chunks)
+
+def unpack(code, view):
+    values = array(code)
+    values.frombytes(view)
+    return values
+
+def decode_column(column, view, count):
+    kind = column['type']
+    nulls = None
+    if column.get('nulls'):
+        nulls = view[:count]
+        view = view[count:]
+    if kind == 'int':
+        values = unpack('q', view).tolist()
+    elif kind == 'float':
+        values = unpack('d', view).tolist()
+    elif kind == 'bool':
+        values = [byte == 1 for byte in view]
+    elif kind == 'str':
+        values = str(view, 'utf-8').split('\0') if count else []
+    elif kind == 'cat':
+        # Одинаковые значения — один и тот же объект строки
+        values = list(map([sys.intern(value) if isinstance(value, str) else value
+                           for value in column['values']].__getitem__, unpack(column['code'], view)))
+    else:
+        values = json.loads(str(view, 'utf-8'))
+    if nulls is not None:
+        values = [None if is_null else value for value, is_null in zip(values, nulls)]
+    return values
+
+def decode(blob):
+    return decode_snapshot(blob)[0]
+
+def decode_snapshot(blob):
+    # (записи, служебные данные или None)
+    magic, version, header_size = PREFIX.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError('Файл не является двоичным снимком.')
+    if version > VERSION:
+        raise ValueError(f'Двоичный снимок версии {version} не поддерживается (поддерживается до {VERSION}).')
+    view = memoryview(blob)
+    position = PREFIX.size + header_size
+    header = json.loads(str(view[PREFIX.size:position], 'utf-8'))
+    columns = []
+    for column in header['columns']:
+        columns.append(decode_column(column, view[position:position + column['size']], header['count']))
+        position += column['size']
+    if not header['columnar']:
+        return columns[0], header.get('meta')
+    # Сборка словарей — самая дорогая часть чтения; map быстрее генератора списка
+    names = [column['name'] for column in header['columns']]
+    return list(map(dict, map(zip, repeat(names), zip(*columns)))), header.get('meta')
+
+def read_snapshot(file_path):
+    # (записи, служебные данные или None). Формат определяется по первым байтам:
+    # двоичный снимок или JSON — {"meta": ..., "records": [...]} либо старый список записей
+    with open(file_path, 'rb') as f:
+        blob = f.read()
+    if is_snapshot(blob):
+        return decode_snapshot(blob)
+    data = json.loads(blob)
+    if isinstance(data, dict):
+        return data['records'], data.get('meta')
+    return data, None
+
+def read_file(file_path):
+    return read_snapshot(file_path)[0]
+
+def write_file(file_path, data, snapshot_format, meta=None):
+    # Через временный файл: при сбое посреди записи старый снимок остаётся целым.
+    # Служебные данные пишутся в тот же файл, без отдельной записи и fsync.
+    if snapshot_format == 'binary':
+        with atomic_open(file_path, 'wb') as f:
+            f.write(encode(data, meta))
+    else:
+        with atomic_open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data if meta is None else {'meta': meta, 'records': data}, f, ensure_ascii=False, indent=4)
+
+def file_format(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            return 'binary' if is_snapshot(f.read(len(MAGIC))) else 'json'
+    except OSError:
+        return None
+
+def convert_files(file_paths, snapshot_format):
+    # Перевод файлов данных между JSON и двоичным снимком; журнал остаётся в силе
+    for file_path in file_paths:
+        data, meta = read_snapshot(file_path)
+        write_file(file_path, data, snapshot_format, meta)
+        print(f'{file_path}: {len(data)} записей, формат {snapshot_format}')
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('binary', 'json'):
+        print('Использование: python binary_snapshot.py binary|json ФАЙЛ...')
+        sys.exit(1)
+    convert_files(sys.argv[2:], sys.argv[1])
@@ -1,12 +1,270 @@
-def calculator_menu():
+import os
+import re
+import ast
+import csv
+import math
+import operator
+from functools import lru_cache
+
+# Разрешённые в выражениях операции, функции и константы; всё остальное — ошибка
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+COMPARE_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+FUNCTIONS = {
+    'abs': abs, 'round': round, 'min': min, 'max': max,
+    'sqrt': math.sqrt, 'exp': math.exp, 'log': math.log, 'log10': math.log10,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'floor': math.floor, 'ceil': math.ceil,
+}
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+# Наибольший размер целого результата в битах, чтобы (9 ** 10000) ** 10000 не считалось
+# минутами. Такое число ещё и печатается: str() целых длиннее 4300 цифр запрещён
+MAX_INTEGER_BITS = 14000
+# Длиннее выражения не разбираются: парсер на них тратит слишком много памяти
+MAX_EXPRESSION_LENGTH = 2000
+# Сколько скомпилированных выражений держать в кэше
+EXPRESSION_CACHE_SIZE = 256
+ASSIGNMENT = re.compile(r'\s*([A-Za-z_]\w*)\s*=(?!=)\s*(.+)')
+
+class ExpressionError(ValueError):
+    pass
+
+def check_integer(value):
+    if type(value) is int and value.bit_length() > MAX_INTEGER_BITS:
+        raise ExpressionError('Слишком большое число.')
+    return value
+
+def safe_pow(base, exponent):
+    # Размер целой степени оценивается до вычисления; с дробными числами
+    # переполнение и так наступает быстро (OverflowError)
+    if type(base) is int and type(exponent) is int and exponent > 0 and abs(base) > 1:
+        if (abs(base).bit_length() - 1) * exponent > MAX_INTEGER_BITS:
+            raise ExpressionError('Слишком большое число.')
+    return operator.pow(base, exponent)
+
+def compile_node(node):
+    # Узел дерева -> функция от словаря переменных
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        value = node.value
+        return lambda variables: value
+    if isinstance(node, ast.Name):
+        name = node.id
+
+        def lookup(variables):
+            if name in variables:
+                return variables[name]
+            if name in CONSTANTS:
+                return CONSTANTS[name]
+            raise ExpressionError(f'Неизвестная переменная: {name}')
+        return lookup
+    if isinstance(node, ast.BinOp) and (type(node.op) in BINARY_OPERATORS or isinstance(node.op, ast.Pow)):
+        function = safe_pow if isinstance(node.op, ast.Pow) else BINARY_OPERATORS[type(node.op)]
+        left, right = compile_node(node.left), compile_node(node.right)
+        return lambda variables: check_integer(function(left(variables), right(variables)))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        function = UNARY_OPERATORS[type(node.op)]
+        operand = compile_node(node.operand)
+        return lambda variables: function(operand(variables))
+    if isinstance(node, ast.Compare) and all(type(op) in COMPARE_OPERATORS for op in node.ops):
+        functions = [COMPARE_OPERATORS[type(op)] for op in node.ops]
+        operands = [compile_operand(item) for item in [node.left] + node.comparators]
+
+        def compare(variables):
+            values = [operand(variables) for operand in operands]
+            return all(function(a, b) for function, a, b in zip(functions, values, values[1:]))
+        return compare
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        function = FUNCTIONS.get(node.func.id)
+        if function is None:
+            raise ExpressionError(f'Неизвестная функция: {node.func.id}')
+        arguments = [compile_node(argument) for argument in node.args]
+        return lambda variables: function(*[argument(variables) for argument in arguments])
+    raise ExpressionError(f'Недопустимая конструкция в выражении: {type(node).__name__}')
+
+def compile_operand(node):
+    # Строки допустимы только как операнды сравнения, например category == "Еда"
+    if isinstance(node, ast.Constant) and type(node.value) is str:
+        value = node.value
+        return lambda variables: value
+    return compile_node(node)
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(expression):
+    # Разбор и проверка выполняются один раз на текст выражения
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError('Слишком длинное выражение.')
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError:
+        raise ExpressionError('Синтаксическая ошибка в выражении.')
+    # compile_node тоже рекурсивна, а '-' * 1500 + '1' парсер ещё принимает
+    try:
+        return compile_node(tree.body)
+    except (RecursionError, MemoryError):
+        raise ExpressionError('Слишком сложное выражение.')
+
+# Ошибки вычисления, которые относятся к выражению или данным, а не к программе
+EVALUATION_ERRORS = (ArithmeticError, TypeError, ValueError, RecursionError, MemoryError)
+
+def error_text(error):
+    if isinstance(error, RecursionError):
+        return 'Слишком сложное выражение.'
+    if isinstance(error, MemoryError):
+        return 'Не хватило памяти для вычисления.'
+    return str(error)
+
+def evaluate(expression, variables=None):
+    try:
+        return compile_expression(expression)(variables or {})
+    except EVALUATION_ERRORS as e:
+        if isinstance(e, ExpressionError):
+            raise
+        raise ExpressionError(error_text(e))
+
+def parse_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value.replace(',', '.'))
+        except ValueError:
+            return value
+
+def evaluate_row(function, variables):
+    # (результат, ошибка) для скомпилированного выражения
+    try:
+        return function(variables), None
+    except EVALUATION_ERRORS as e:
+        return None, error_text(e)
+
+def evaluate_rows(expression, rows):
+    # Одно скомпилированное выражение по множеству наборов переменных без
+    # промежуточных списков: (переменные, результат, ошибка) для каждого набора
+    function = compile_expression(expression)
+    for variables in rows:
+        yield (variables,) + evaluate_row(function, variables)
+
+def result_text(result, error):
+    return result if error is None else f'Ошибка: {error}'
+
+def evaluate_csv(expression, file_name, output_file):
+    # Переменные — столбцы CSV-файла; результат дописывается столбцом «Результат»
+    with open(file_name, mode='r', encoding='utf-8', newline='') as source, \
+            open(output_file, mode='w', encoding='utf-8', newline='') as target:
+        function = compile_expression(expression)
+        reader = csv.DictReader(source)
+        writer = csv.writer(target)
+        fieldnames = list(reader.fieldnames or [])
+        writer.writerow(fieldnames + ['Результат'])
+        count = errors = 0
+        for row in reader:
+            # DictReader ставит None вместо недостающих значений, а лишние кладёт по ключу None
+            if None in row or None in row.values():
+                values = [row.get(name) or '' for name in fieldnames]
+                result, error = None, f'число значений в строке не совпадает с заголовком ({len(fieldnames)})'
+            else:
+                values = list(row.values())
+                result, error = evaluate_row(function, {name: parse_number(value) for name, value in row.items()})
+            writer.writerow(values + [result_text(result, error)])
+            count += 1
+            errors += error is not None
+    return count, errors
+
+def finance_variables(record):
+    return {'id': record.id, 'amount': record.amount, 'category': record.category, 'date': record.date,
+            'description': record.description}
+
+def evaluate_finance(expression, records, output_file=None, preview=10):
+    # Выражение по всем финансовым записям, например 'amount * 1.2'
+    rows = (finance_variables(record) for record in records)
+    count = errors = 0
+    total = 0
+    target = open(output_file, mode='w', encoding='utf-8', newline='') if output_file else None
+    try:
+        writer = csv.writer(target) if target else None
+        if writer:
+            writer.writerow(['ID', 'Результат'])
+        for variables, result, error in evaluate_rows(expression, rows):
+            count += 1
+            if error is not None:
+                errors += 1
+            elif isinstance(result, (int, float)):
+                total += result
+            if writer:
+                writer.writerow([variables['id'], result_text(result, error)])
+            elif count <= preview:
+                print(f'{variables["id"]}: {result_text(result, error)}')
+    finally:
+        if target:
+            target.close()
+    return count, errors, total
+
+def batch_menu(get_finance_manager=None):
+    expression = input('Введите выражение (переменные — столбцы файла или amount, id, category, date): ')
+    try:
+        compile_expression(expression)
+    except ExpressionError as e:
+        print(f'Ошибка: {e}')
+        return
+    source = input('Источник данных: 1 — CSV-файл, 2 — финансовые записи: ')
+    if source == '1':
+        file_name = input('Введите имя CSV-файла: ')
+        if not os.path.exists(file_name):
+            print('Файл не найден.')
+            return
+        output_file = input('Имя файла для результатов (Enter — results.csv): ').strip() or 'results.csv'
+        try:
+            count, errors = evaluate_csv(expression, file_name, output_file)
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            print(f'Ошибка: {e}')
+            return
+        print(f'Вычислено строк: {count}, с ошибками: {errors}. Результаты в файле {output_file}')
+    elif source == '2':
+        if get_finance_manager is None:
+            from finances import FinanceManager
+            manager = FinanceManager()
+        else:
+            manager = get_finance_manager()
+        output_file = input('Имя файла для результатов (Enter — показать первые 10): ').strip() or None
+        count, errors, total = evaluate_finance(expression, manager.records, output_file)
+        print(f'Вычислено записей: {count}, с ошибками: {errors}, сумма результатов: {round(total, 2)}')
+        if output_file:
+            print(f'Результаты в файле {output_file}')
+    else:
+        print('Некорректный выбор.')
+
+def calculator_menu(get_finance_manager=None):
     print('\nКалькулятор')
+    print(f'Функции: {", ".join(FUNCTIONS)}; константы: {", ".join(CONSTANTS)}')
+    variables = {}
     while True:
-        expression = input('Введите выражение для вычисления или "назад" для возврата: ')
+        expression = input('Введите выражение, "имя = выражение" для переменной, "пакет" для пакетного '
+                           'вычисления или "назад" для возврата: ')
         if expression.lower() == "назад":
             break
+        if expression.lower() == 'пакет':
+            batch_menu(get_finance_manager)
+            continue
+        assignment = ASSIGNMENT.fullmatch(expression)
         try:
-            import ast
-            result = eval(expression, {'__builtins__': None}, {})
-            print(f'Результат: {result}')
-        except Exception as e:
-            print(f'Ошибка: {e}')
\ No newline at end of file
+            if assignment:
+                name, expression = assignment.groups()
+                variables[name] = evaluate(expression, variables)
+                print(f'{name} = {variables[name]}')
+            else:
+                print(f'Результат: {evaluate(expression, variables)}')
+        except ExpressionError as e:
+            print(f'Ошибка: {e}')
@@ -1,106 +1,195 @@
-from load_save_functions import *
-import csv
+from load_save_functon import *
+import metrics
+from record_collection import RecordCollection, ManagerMixin
+from contact_search import ContactSearchIndex
+from csv_import import import_csv, errors_path
+from csv_export import export_csv
+from pager import PAGE_SIZE
 
 CONTACTS_FILE = 'contacts.json'
+CONTACT_EXPORT_COLUMNS = {
+    'ID': lambda contact: contact.id,
+    'Имя': lambda contact: contact.name,
+    'Телефон': lambda contact: contact.phone,
+    'E-mail': lambda contact: contact.email,
+}
+
+def contact_from_csv_row(row):
+    name = row.get('Имя', '').strip()
+    if not name:
+        raise ValueError('не указано имя')
+    return name, row.get('Телефон', ''), row.get('E-mail', '')
 
 class Contact:
+    __slots__ = ('id', 'name', 'phone', 'email', 'version')
+
     def __init__(self, contact_id, name, phone, email):
         self.id = contact_id
         self.name = name
         self.phone = phone
         self.email = email
+        self.version = 0
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'phone': self.phone, 'email': self.email, 'version': self.version}
+
+    @classmethod
+    def from_dict(cls, data):
+        contact = cls(data['id'], data['name'], data['phone'], data['email'])
+        contact.version = data.get('version') or 0
+        return contact
+
+@metrics.instrument
+class ContactManager(ManagerMixin):
+    DATA_FILE = CONTACTS_FILE
+    COLLECTION = 'contacts'
+    EXPORT_COLUMNS = CONTACT_EXPORT_COLUMNS
+    CHANGES_FILE = 'contacts_changes.csv'
 
-class ContactManager:
     def __init__(self):
-        self.contacts = []
+        self.contacts = RecordCollection()
+        self.changes = ChangeBuffer(self.save_contacts)
         self.load_contacts()
 
     def load_contacts(self):
         data = load_data(CONTACTS_FILE, [])
-        self.contacts = [Contact(**contact) for contact in data]
+        contacts = (Contact.from_dict(contact) for contact in data)
+        self.contacts = RecordCollection(contacts, load_meta(CONTACTS_FILE))
+        # Индекс строится при первом поиске и дальше поддерживается при изменениях
+        self.search_index = None
 
-    def save_contacts(self):
-        data = [contact.__dict__ for contact in self.contacts]
-        save_data(CONTACTS_FILE, data)
+    def save_contacts(self, changes=None):
+        meta = self.contacts.meta()
+        if not (changes and append_changes(CONTACTS_FILE, changes, meta)):
+            data = [contact.to_dict() for contact in self.contacts]
+            save_data(CONTACTS_FILE, data, meta)
 
     def add_contact(self, name, phone, email):
-        contact_id = max([contact.id for contact in self.contacts], default=0) + 1
-        new_contact = Contact(contact_id, name, phone, email)
-        self.contacts.append(new_contact)
-        self.save_contacts()
+        with self.batch():
+            self._add_contact(name, phone, email)
         print('Контакт успешно добавлен!')
 
-    def search_contacts(self, query):
-        results = [contact for contact in self.contacts if query.lower() in contact.name.lower() or query in contact.phone]
+    def add_many(self, contacts):
+        with self.batch():
+            added = [self._add_contact(*contact) for contact in contacts]
+        print(f'Добавлено контактов: {len(added)}')
+        return added
+
+    def _add_contact(self, name, phone, email):
+        contact_id = self.contacts.allocate_id()
+        new_contact = Contact(contact_id, name, phone, email)
+        self.contacts.add(new_contact)
+        if self.search_index is not None:
+            self.search_index.add(new_contact)
+        self.changes.add([('put', new_contact.to_dict())])
+        return new_contact
+
+    def search_contacts(self, query, limit=20):
+        if self.search_index is None:
+            self.search_index = ContactSearchIndex.build(self.contacts)
+        found_ids, total = self.search_index.search(query, limit)
+        results = [self.contacts.get(contact_id) for contact_id in found_ids]
         if results:
             for contact in results:
                 print(f"{contact.id}. {contact.name} (Телефон: {contact.phone}, E-mail: {contact.email})")
+            if total > len(results):
+                print(f'Показаны первые {len(results)} из {total}. Уточните запрос.')
         else:
             print('Контакты не найдены.')
+        return results
 
     def edit_contact(self, contact_id, name, phone, email):
+        with self.batch():
+            contact = self._edit_contact(contact_id, name, phone, email)
+        if contact:
+            print('Контакт успешно обновлён!')
+        else:
+            print('Контакт не найден.')
+
+    def edit_many(self, edits):
+        with self.batch():
+            edited = [contact for contact in (self._edit_contact(*edit) for edit in edits) if contact]
+        print(f'Обновлено контактов: {len(edited)}')
+        return edited
+
+    def _edit_contact(self, contact_id, name, phone, email):
         contact = self.get_contact_by_id(contact_id)
         if contact:
             contact.name = name
             contact.phone = phone
             contact.email = email
-            self.save_contacts()
-            print('Контакт успешно обновлён!')
-        else:
-            print('Контакт не найден.')
+            if self.search_index is not None:
+                self.search_index.add(contact)
+            self.contacts.touch(contact)
+            self.changes.add([('put', contact.to_dict())])
+        return contact
 
     def delete_contact(self, contact_id):
-        contact = self.get_contact_by_id(contact_id)
+        with self.batch():
+            contact = self._delete_contact(contact_id)
         if contact:
-            self.contacts.remove(contact)
-            self.save_contacts()
             print('Контакт успешно удалён!')
         else:
             print('Контакт не найден.')
 
+    def delete_many(self, contact_ids):
+        with self.batch():
+            deleted = [contact for contact in (self._delete_contact(contact_id) for contact_id in contact_ids) if contact]
+        print(f'Удалено контактов: {len(deleted)}')
+        return deleted
+
+    def _delete_contact(self, contact_id):
+        contact = self.get_contact_by_id(contact_id)
+        if contact:
+            self.contacts.remove(contact.id)
+            if self.search_index is not None:
+                self.search_index.remove(contact.id)
+            self.changes.add([('delete', contact.id)])
+        return contact
+
     def get_contact_by_id(self, contact_id):
-        for contact in self.contacts:
-            if contact.id == contact_id:
-                return contact
-        return None
+        return self.contacts.get(contact_id)
 
-    def export_contacts_to_csv(self):
+    def page_contacts(self, size=PAGE_SIZE, number=0, after=None, reverse=False):
+        # Страница контактов в порядке id: (контакты, курсор следующей страницы или None, всего)
+        ids, cursor, total = self.contacts.page(size, after, number * size, reverse)
+        return [self.contacts.get(contact_id) for contact_id in ids], cursor, total
+
+    def export_contacts_to_csv(self, file_name='contacts_export.csv', columns=None):
         if not self.contacts:
             print('Список контактов пуст.')
             return
-        file_name = 'contacts_export.csv'
-        with open(file_name, mode='w', encoding='utf-8', newline='') as csv_file:
-            fieldnames = ['ID', 'Имя', 'Телефон', 'E-mail']
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-            writer.writeheader()
-            for contact in self.contacts:
-                writer.writerow({
-                    'ID': contact.id,
-                    'Имя': contact.name,
-                    'Телефон': contact.phone,
-                    'E-mail': contact.email
-                })
-        print(f'Контакты успешно экспортированы в файл {file_name}')
-
-    def import_contacts_from_csv(self):
-        file_name = input('Введите имя CSV-файла для импорта: ')
+        try:
+            count = export_csv(file_name, CONTACT_EXPORT_COLUMNS, self.contacts, columns)
+        except ValueError as e:
+            print(e)
+            return
+        print(f'Контакты успешно экспортированы в файл {file_name} ({count} шт.)')
+
+    def import_contacts_from_csv(self, file_name=None, workers=None):
+        if file_name is None:
+            file_name = input('Введите имя CSV-файла для импорта: ')
         if not os.path.exists(file_name):
             print('Файл не найден.')
             return
-        with open(file_name, mode='r', encoding='utf-8') as csv_file:
-            reader = csv.DictReader(csv_file)
-            for row in reader:
-                contact_id = max([contact.id for contact in self.contacts], default=0) + 1
-                name = row.get('Имя', '')
-                phone = row.get('Телефон', '')
-                email = row.get('E-mail', '')
-                new_contact = Contact(contact_id, name, phone, email)
-                self.contacts.append(new_contact)
-            self.save_contacts()
-        print('Контакты успешно импортированы из CSV-файла.')
-
-def contacts_menu():
-    manager = ContactManager()
+        imported, errors = import_csv(file_name, contact_from_csv_row, self._import_batch, self.contacts,
+                                      workers=workers)
+        print(f'Контакты успешно импортированы из CSV-файла: {imported}, строк с ошибками: {errors}.')
+        if errors:
+            print(f'Ошибки записаны в файл {errors_path(file_name)}')
+
+    def _import_batch(self, rows):
+        with self.batch():
+            for name, phone, email in rows:
+                new_contact = Contact(self.contacts.allocate_id(), name, phone, email)
+                self.contacts.add(new_contact)
+                if self.search_index is not None:
+                    self.search_index.add(new_contact)
+                self.changes.add([('put', new_contact.to_dict())])
+
+def contacts_menu(manager=None):
+    if manager is None:
+        manager = ContactManager()
     while True:
         print('\nУправление контактами:')
         print('1. Добавить новый контакт')
@@ -117,7 +206,7 @@ def contacts_menu():
             email = input('Введите e-mail: ')
             manager.add_contact(name, phone, email)
         elif choice == '2':
-            query = input('Введите имя или номер телефона для поиска: ')
+            query = input('Введите имя, номер телефона или e-mail для поиска: ')
             manager.search_contacts(query)
         elif choice == '3':
             try:
@@ -135,10 +224,11 @@ def contacts_menu():
             except ValueError:
                 print('Некорректный ID.')
         elif choice == '5':
-            manager.export_contacts_to_csv()
+            manager.export_menu('contacts_export.csv', manager.export_contacts_to_csv)
         elif choice == '6':
             manager.import_contacts_from_csv()
         elif choice == '7':
+            manager.flush()
             break
         else:
             print('Некорректный выбор. Попробуйте снова.')
\ No newline at end of file
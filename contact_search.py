@@ -0,0 +1,88 @@
+import heapq
+from array import array
+
+NGRAM = 3
+# Запрос из одних этих символов считается номером телефона
+PHONE_CHARS = set('0123456789+()- ')
+
+def normalize_text(text):
+    return (text or '').lower().replace('ё', 'е')
+
+def phone_digits(text):
+    return ''.join(char for char in (text or '') if char.isdigit())
+
+def ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+class ContactSearchIndex:
+    # Триграммы имени и e-mail и отдельно триграммы цифр телефона.
+    # Списки id только пополняются: после изменения или удаления контакта
+    # старые вхождения отсеиваются проверкой по текущему тексту и вычищаются
+    # перестроением, когда их становится больше, чем живых.
+    def __init__(self):
+        self.text_grams = {}
+        self.digit_grams = {}
+        self.keys = {}
+        self.stale = 0
+
+    def add(self, contact):
+        text = normalize_text(contact.name) + '\n' + normalize_text(contact.email)
+        digits = phone_digits(contact.phone)
+        if contact.id in self.keys:
+            self.stale += 1
+        self.keys[contact.id] = (contact.name.casefold(), text, digits)
+        for gram in ngrams(text):
+            self.text_grams.setdefault(gram, array('I')).append(contact.id)
+        for gram in ngrams(digits):
+            self.digit_grams.setdefault(gram, array('I')).append(contact.id)
+        self.compact_if_needed()
+
+    def remove(self, contact_id):
+        if self.keys.pop(contact_id, None) is not None:
+            self.stale += 1
+            self.compact_if_needed()
+
+    def compact_if_needed(self):
+        if self.stale > max(1000, len(self.keys)):
+            self.text_grams = {}
+            self.digit_grams = {}
+            for contact_id, (_, text, digits) in self.keys.items():
+                for gram in ngrams(text):
+                    self.text_grams.setdefault(gram, array('I')).append(contact_id)
+                for gram in ngrams(digits):
+                    self.digit_grams.setdefault(gram, array('I')).append(contact_id)
+            self.stale = 0
+
+    def candidates(self, grams_index, query):
+        # Берём самый короткий список среди триграмм запроса, остальное проверяем подстрокой
+        grams = ngrams(query)
+        if not grams:
+            return self.keys
+        postings = [grams_index.get(gram) for gram in grams]
+        if any(posting is None for posting in postings):
+            return ()
+        return set(min(postings, key=len))
+
+    def search(self, query, limit=20):
+        text = normalize_text(query).strip()
+        digits = phone_digits(query)
+        found = set()
+        if text:
+            for contact_id in self.candidates(self.text_grams, text):
+                key = self.keys.get(contact_id)
+                if key and text in key[1]:
+                    found.add(contact_id)
+        if digits and set(query.strip()) <= PHONE_CHARS:
+            for contact_id in self.candidates(self.digit_grams, digits):
+                key = self.keys.get(contact_id)
+                if key and digits in key[2]:
+                    found.add(contact_id)
+        top = heapq.nsmallest(limit, found, key=lambda contact_id: (self.keys[contact_id][0], contact_id))
+        return top, len(found)
+
+    @classmethod
+    def build(cls, contacts):
+        index = cls()
+        for contact in contacts:
+            index.add(contact)
+        return index
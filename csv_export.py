@@ -0,0 +1,92 @@
+import os
+import csv
+import json
+import gzip
+import lzma
+import metrics
+from atomic_files import atomic_open
+
+# Файл отметок выгрузки изменений: для каждого файла данных — версия и next_id на
+# момент последней выгрузки. Отдельный файл отметок — отдельный получатель изменений.
+CHECKPOINT_FILE = 'export_checkpoint.json'
+CHANGE_COLUMN = 'Изменение'
+
+def open_export_file(file_name):
+    # Сжатие выбирается по расширению: .gz — gzip, .xz — xz, иначе обычный CSV.
+    # Строки сжимаются по мере записи, несжатая копия на диск не попадает.
+    if file_name.endswith('.gz'):
+        return gzip.open(file_name, 'wt', compresslevel=6, encoding='utf-8', newline='')
+    if file_name.endswith('.xz'):
+        return lzma.open(file_name, 'wt', encoding='utf-8', newline='')
+    return open(file_name, mode='w', encoding='utf-8', newline='')
+
+def select_columns(columns, selected=None):
+    # columns — словарь «заголовок -> значение из записи» в порядке вывода
+    if not selected:
+        return columns
+    unknown = [name for name in selected if name not in columns]
+    if unknown:
+        raise ValueError(f'Неизвестные столбцы: {", ".join(unknown)}. Доступны: {", ".join(columns)}')
+    return {name: columns[name] for name in selected}
+
+@metrics.timed('export_csv')
+def export_csv(file_name, columns, records, selected=None):
+    # records может быть любым итератором: строки пишутся по одной
+    columns = select_columns(columns, selected)
+    getters = list(columns.values())
+    count = 0
+    with open_export_file(file_name) as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(columns)
+        for record in records:
+            writer.writerow([getter(record) for getter in getters])
+            count += 1
+    metrics.count('csv_rows', count, operation='export')
+    return count
+
+def load_checkpoints(checkpoint_file):
+    if not os.path.exists(checkpoint_file):
+        return {}
+    with open(checkpoint_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_checkpoint(checkpoint_file, key, checkpoint):
+    checkpoints = load_checkpoints(checkpoint_file)
+    checkpoints[key] = checkpoint
+    with atomic_open(checkpoint_file, 'w', encoding='utf-8') as f:
+        json.dump(checkpoints, f, ensure_ascii=False, indent=4)
+
+@metrics.timed('export_changes')
+def export_changes(file_name, columns, collection, checkpoint_file, key, selected=None):
+    # Выгрузка изменений collection с прошлой отметки key в checkpoint_file. Первый столбец —
+    # «добавлена», «изменена» или «удалена» (у удалённых заполнен только ID). Без отметки или
+    # если удаления с неё уже забыты, выгружаются все записи с пометкой «все»: получатель
+    # заменяет ими свои данные. Отметка сдвигается только после успешной записи файла.
+    # Возвращает (число строк по видам изменений, полная ли выгрузка).
+    columns = select_columns(columns, selected)
+    if 'ID' not in columns:
+        raise ValueError('Для выгрузки изменений нужен столбец ID.')
+    getters = list(columns.values())
+    checkpoint = load_checkpoints(checkpoint_file).get(key)
+    changes = collection.changed_since(checkpoint['version']) if checkpoint else None
+    full = changes is None
+    records, deleted = (collection, []) if full else changes
+    counts = {}
+    with open_export_file(file_name) as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow([CHANGE_COLUMN] + list(columns))
+        for record in records:
+            change = 'все' if full else 'добавлена' if record.id >= checkpoint['next_id'] else 'изменена'
+            writer.writerow([change] + [getter(record) for getter in getters])
+            counts[change] = counts.get(change, 0) + 1
+        for record_id in deleted:
+            writer.writerow(['удалена'] + [record_id if name == 'ID' else '' for name in columns])
+            counts['удалена'] = counts.get('удалена', 0) + 1
+    save_checkpoint(checkpoint_file, key, {'version': collection.version, 'next_id': collection.next_id})
+    metrics.count('csv_rows', sum(counts.values()), operation='export_changes')
+    return counts, full
+
+def changes_text(counts, full):
+    if full:
+        return f'полная выгрузка, записей: {counts.get("все", 0)}'
+    return ', '.join(f'{change}: {counts.get(change, 0)}' for change in ('добавлена', 'изменена', 'удалена'))
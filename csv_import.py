@@ -0,0 +1,212 @@
+import os
+import csv
+import json
+import contextlib
+import multiprocessing
+from collections import deque
+from load_save_functon import STORAGE_MODE
+import metrics
+
+# Строк в одной порции: после каждой порции изменения сохраняются и
+# запоминается место в файле, с которого можно продолжить после сбоя
+IMPORT_BATCH_SIZE = 1000
+PROGRESS_EVERY = 100000
+# Параллельный разбор: число процессов (0 или 1 — разбирать в основном процессе)
+# и примерный размер куска файла, который достаётся одному процессу
+IMPORT_WORKERS = int(os.environ.get('PA_IMPORT_WORKERS', '0'))
+PARALLEL_CHUNK_SIZE = 4 * 1024 * 1024
+
+class CountingLines:
+    # Строки файла для csv.reader с подсчётом прочитанных байтов.
+    # csv.reader не читает строки впрок, поэтому после каждой записи
+    # offset указывает ровно на начало следующей.
+    def __init__(self, raw_file):
+        self.raw_file = raw_file
+        self.offset = raw_file.tell()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.raw_file.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode('utf-8')
+
+def read_header(raw_file):
+    raw_file.seek(0)
+    lines = CountingLines(raw_file)
+    header = next(csv.reader(lines), [])
+    if header:
+        header[0] = header[0].lstrip('\ufeff')
+    return header, lines.offset
+
+def iter_csv_rows(file_name, start_offset=None, end_offset=None):
+    # Отдаёт (строка как dict, смещение после неё) начиная с start_offset
+    # (по умолчанию — сразу после заголовка) и до end_offset
+    with open(file_name, 'rb') as raw_file:
+        header, header_end = read_header(raw_file)
+        start_offset = header_end if start_offset is None else start_offset
+        if end_offset is not None and start_offset >= end_offset:
+            return
+        raw_file.seek(start_offset)
+        lines = CountingLines(raw_file)
+        for values in csv.reader(lines):
+            if values:
+                yield dict(zip(header, values)), lines.offset
+            if end_offset is not None and lines.offset >= end_offset:
+                break
+
+def header_end(file_name):
+    with open(file_name, 'rb') as raw_file:
+        return read_header(raw_file)[1]
+
+def split_ranges(file_name, start_offset, chunk_size=None):
+    # Делит файл с start_offset на куски по границам строк. Перевод строки —
+    # граница строки, только если до него чётное число кавычек (внутри
+    # кавычек он часть значения), поэтому кавычки считаются от start_offset.
+    chunk_size = chunk_size or PARALLEL_CHUNK_SIZE
+    size = os.path.getsize(file_name)
+    bounds = [start_offset]
+    with open(file_name, 'rb') as raw_file:
+        raw_file.seek(start_offset)
+        position = start_offset
+        quotes = 0
+        while bounds[-1] + chunk_size < size:
+            block = raw_file.read(bounds[-1] + chunk_size - position)
+            quotes += block.count(b'"')
+            position += len(block)
+            while True:
+                line = raw_file.readline()
+                quotes += line.count(b'"')
+                position += len(line)
+                if not line or quotes % 2 == 0:
+                    break
+            if position >= size:
+                break
+            bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def convert_rows(rows, convert_row):
+    # (значение, None, смещение) для корректной строки, (None, ошибка, смещение) — для остальных
+    for row, offset in rows:
+        try:
+            yield convert_row(row), None, offset
+        except ValueError as e:
+            yield None, str(e), offset
+
+def convert_range(file_name, start, end, convert_row):
+    # Выполняется в рабочем процессе
+    return list(convert_rows(iter_csv_rows(file_name, start, end), convert_row))
+
+def parallel_convert_rows(file_name, start_offset, convert_row, workers):
+    # Куски разбираются в пуле процессов, а результаты отдаются строго в порядке
+    # файла; в работе не больше двух кусков на процесс, чтобы не копить память
+    if start_offset is None:
+        start_offset = header_end(file_name)
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for start, end in split_ranges(file_name, start_offset):
+            pending.append(pool.apply_async(convert_range, (file_name, start, end, convert_row)))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+def state_path(file_name):
+    return file_name + '.import_state'
+
+def errors_path(file_name):
+    return file_name + '.errors.log'
+
+def file_stamp(file_name):
+    stat = os.stat(file_name)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def load_import_state(file_name, collection):
+    # Состояние прерванного импорта того же (не изменившегося) файла.
+    # Если порция была записана, а отметка о ней — нет, по next_id видно,
+    # что записи уже добавлены, и порция не повторяется.
+    if not os.path.exists(state_path(file_name)):
+        return None
+    with open(state_path(file_name), 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('stamp') != file_stamp(file_name):
+        return None
+    pending = state.pop('pending', None)
+    if pending and collection.next_id >= pending['next_id']:
+        state.update(pending)
+    return state
+
+def save_import_state(file_name, state):
+    with open(state_path(file_name), 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+@metrics.timed('import_csv')
+def import_csv(file_name, convert_row, import_batch, collection, batch_size=None, workers=None):
+    # convert_row(row) превращает строку CSV в аргументы записи или бросает
+    # ValueError; import_batch(rows) добавляет и сохраняет порцию записей.
+    # В памяти одновременно не больше одной порции. При workers > 1 строки
+    # разбираются параллельно (convert_row должна быть функцией уровня модуля),
+    # а id всё равно выдаются по порядку строк в файле.
+    # С метриками время сохранения порций видно отдельно от разбора файла.
+    import_batch = metrics.timed('import_csv.batch')(import_batch)
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    workers = IMPORT_WORKERS if workers is None else workers
+    state = load_import_state(file_name, collection)
+    if state:
+        print(f'Продолжение прерванного импорта со строки {state["rows"] + 1}.')
+    else:
+        state = {'stamp': file_stamp(file_name), 'offset': None, 'rows': 0, 'imported': 0, 'errors': 0, 'log_size': 0}
+    with open(errors_path(file_name), 'a' if state['rows'] else 'w', encoding='utf-8') as error_log:
+        # Ошибки из строк после последней сохранённой порции будут записаны заново
+        error_log.truncate(state['log_size'])
+        error_log.seek(state['log_size'])
+        batch = []
+        progress = dict(state)
+
+        def commit():
+            # Сначала отмечаем порцию как начатую, потом сохраняем записи, потом подтверждаем
+            error_log.flush()
+            pending = {key: progress[key] for key in ('offset', 'rows', 'imported', 'errors')}
+            pending['log_size'] = error_log.tell()
+            pending['next_id'] = collection.next_id + len(batch)
+            save_import_state(file_name, dict(state, pending=pending))
+            import_batch(batch)
+            state.update(pending)
+            del state['next_id']
+            save_import_state(file_name, state)
+            batch.clear()
+
+        if workers > 1:
+            rows = parallel_convert_rows(file_name, state['offset'], convert_row, workers)
+        else:
+            rows = convert_rows(iter_csv_rows(file_name, state['offset']), convert_row)
+        for value, error, offset in rows:
+            progress['rows'] += 1
+            progress['offset'] = offset
+            if error is None:
+                batch.append(value)
+                progress['imported'] += 1
+            else:
+                progress['errors'] += 1
+                error_log.write(f'Строка {progress["rows"]}: {error}\n')
+            # В режиме json каждая порция переписывает весь файл, поэтому порция растёт
+            # вместе с числом записей — иначе импорт большого файла становится квадратичным
+            if len(batch) >= batch_size and (STORAGE_MODE != 'json' or len(batch) >= len(collection)):
+                commit()
+            if progress['rows'] % PROGRESS_EVERY == 0:
+                print(f'Обработано строк: {progress["rows"]}, импортировано: {progress["imported"]}, '
+                      f'ошибок: {progress["errors"]}')
+        if batch:
+            commit()
+    # Файла состояния нет, если не сохранилось ни одной порции: пустой файл или все строки с ошибками
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(state_path(file_name))
+    metrics.count('csv_rows', progress['imported'], operation='import')
+    metrics.count('csv_rows', progress['errors'], operation='import_error')
+    if not progress['errors']:
+        os.remove(errors_path(file_name))
+    return progress['imported'], progress['errors']
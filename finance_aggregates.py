@@ -0,0 +1,140 @@
+from bisect import bisect_left, bisect_right
+
+class FenwickTree:
+    # Дерево Фенвика: прибавление к элементу и сумма префикса за O(log n)
+    def __init__(self, values):
+        self.tree = [0.0] + list(values)
+        size = len(self.tree)
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, position, value):
+        i = position + 1
+        while i < len(self.tree):
+            self.tree[i] += value
+            i += i & -i
+
+    def prefix_sum(self, position):
+        # Сумма элементов [0, position)
+        total = 0.0
+        i = min(position, len(self.tree) - 1)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, start, end):
+        # Сумма элементов [start, end]
+        return self.prefix_sum(end + 1) - self.prefix_sum(start)
+
+class FinanceAggregates:
+    # Доходы и расходы по дням (всего и по каждой категории) в деревьях Фенвика.
+    # Позиции в дереве — отсортированный список дней self.days: дни с записями,
+    # промежутки между ними не длиннее GAP_DAYS и по PADDING_DAYS с краёв, чтобы
+    # новые записи рядом с уже существующими не требовали перестройки. Даты
+    # далеко друг от друга (например, 0024 и 9999 годы) не раздувают деревья.
+    # Если дня нет в списке, деревья перестраиваются.
+    PADDING_DAYS = 366
+    GAP_DAYS = 31
+
+    def __init__(self, records=()):
+        self.daily = {}
+        self.days = []
+        self.income = self.expenses = None
+        self.categories = {}
+        for record in records:
+            if record.date_value is not None:
+                self.add_daily(record.category, record.date_value.toordinal(), record.amount, record.amount > 0)
+        self.rebuild()
+
+    def add_daily(self, category, day, amount, is_income):
+        days = self.daily.setdefault(category, {})
+        income, expenses = days.get(day, (0.0, 0.0))
+        if is_income:
+            income += amount
+        else:
+            expenses += amount
+        days[day] = (income, expenses)
+
+    def tree_days(self):
+        all_days = sorted({day for days in self.daily.values() for day in days})
+        result = []
+        for i, day in enumerate(all_days):
+            if not i:
+                result.extend(range(day - self.PADDING_DAYS, day))
+            elif day - all_days[i - 1] <= self.GAP_DAYS:
+                result.extend(range(all_days[i - 1] + 1, day))
+            result.append(day)
+        if all_days:
+            result.extend(range(all_days[-1] + 1, all_days[-1] + self.PADDING_DAYS + 1))
+        return result
+
+    def rebuild(self):
+        self.days = self.tree_days()
+        positions = {day: i for i, day in enumerate(self.days)}
+        size = len(self.days)
+        total_income = [0.0] * size
+        total_expenses = [0.0] * size
+        self.categories = {}
+        for category, days in self.daily.items():
+            income = [0.0] * size
+            expenses = [0.0] * size
+            for day, (day_income, day_expenses) in days.items():
+                position = positions[day]
+                income[position] = day_income
+                expenses[position] = day_expenses
+                total_income[position] += day_income
+                total_expenses[position] += day_expenses
+            self.categories[category] = (FenwickTree(income), FenwickTree(expenses))
+        self.income = FenwickTree(total_income)
+        self.expenses = FenwickTree(total_expenses)
+
+    def update(self, record, sign):
+        if record.date_value is None:
+            return
+        day = record.date_value.toordinal()
+        is_income = record.amount > 0
+        amount = sign * record.amount
+        self.add_daily(record.category, day, amount, is_income)
+        position = bisect_left(self.days, day)
+        if position == len(self.days) or self.days[position] != day:
+            self.rebuild()
+            return
+        if record.category not in self.categories:
+            size = len(self.days)
+            self.categories[record.category] = (FenwickTree([0.0] * size), FenwickTree([0.0] * size))
+        tree = 0 if is_income else 1
+        (self.income, self.expenses)[tree].add(position, amount)
+        self.categories[record.category][tree].add(position, amount)
+
+    def add(self, record):
+        self.update(record, 1)
+
+    def remove(self, record):
+        self.update(record, -1)
+
+    def positions(self, start, end):
+        # Дней между позициями в списке нет, а значит, нет и записей
+        first = bisect_left(self.days, start.toordinal())
+        last = bisect_right(self.days, end.toordinal()) - 1
+        return first, last
+
+    def totals(self, start, end):
+        first, last = self.positions(start, end)
+        if first > last:
+            return 0.0, 0.0
+        return round(self.income.range_sum(first, last), 2), round(self.expenses.range_sum(first, last), 2)
+
+    def category_totals(self, start, end):
+        first, last = self.positions(start, end)
+        if first > last:
+            return {}
+        totals = {}
+        for category, (income, expenses) in self.categories.items():
+            category_income = round(income.range_sum(first, last), 2)
+            category_expenses = round(expenses.range_sum(first, last), 2)
+            if category_income or category_expenses:
+                totals[category] = (category_income, category_expenses)
+        return totals
@@ -0,0 +1,82 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class FinanceColumns:
+    # Финансовые записи по столбцам, отсортированные по дате:
+    # сумма — float64, дата — datetime64[D], категория — целочисленный код.
+    # Записи без корректной даты в столбцы не попадают.
+    def __init__(self, records):
+        if np is None:
+            raise ImportError('Для аналитики нужен пакет numpy (pip install numpy).')
+        records = [record for record in records if record.date_value is not None]
+        self.category_names = []
+        codes = {}
+        category_codes = []
+        for record in records:
+            code = codes.get(record.category)
+            if code is None:
+                code = codes[record.category] = len(self.category_names)
+                self.category_names.append(record.category)
+            category_codes.append(code)
+        count = len(records)
+        ids = np.fromiter((record.id for record in records), dtype=np.int64, count=count)
+        amounts = np.fromiter((record.amount for record in records), dtype=np.float64, count=count)
+        dates = np.fromiter((record.date_value.toordinal() for record in records), dtype=np.int64, count=count)
+        # toordinal() считает от 01-01-0001, а datetime64 — от 01-01-1970
+        dates = (dates - 719163).astype('datetime64[D]')
+        order = np.argsort(dates, kind='stable')
+        self.ids = ids[order]
+        self.amounts = amounts[order]
+        self.dates = dates[order]
+        self.categories = np.array(category_codes, dtype=np.int32)[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def period(self, start, end):
+        # start и end — datetime.date; возвращает срез [from, to) отсортированных столбцов
+        low = np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left')
+        high = np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right')
+        return slice(low, high)
+
+    def totals_by_category(self, start, end):
+        part = self.period(start, end)
+        amounts = self.amounts[part]
+        categories = self.categories[part]
+        size = len(self.category_names)
+        income = np.bincount(categories, weights=np.where(amounts > 0, amounts, 0), minlength=size)
+        expenses = np.bincount(categories, weights=np.where(amounts < 0, amounts, 0), minlength=size)
+        used = np.bincount(categories, minlength=size) > 0
+        return [(self.category_names[code], float(income[code]), float(expenses[code]))
+                for code in np.flatnonzero(used)]
+
+    def totals_by_month(self, start, end):
+        part = self.period(start, end)
+        amounts = self.amounts[part]
+        months, positions = np.unique(self.dates[part].astype('datetime64[M]'), return_inverse=True)
+        income = np.bincount(positions, weights=np.where(amounts > 0, amounts, 0), minlength=len(months))
+        expenses = np.bincount(positions, weights=np.where(amounts < 0, amounts, 0), minlength=len(months))
+        return [(str(month), float(income[i]), float(expenses[i])) for i, month in enumerate(months)]
+
+    def running_balance(self, start, end):
+        # Баланс на конец каждого дня периода, в котором были операции,
+        # с учётом всех операций до начала периода
+        part = self.period(start, end)
+        balance = self.amounts[:part.start].sum() + np.cumsum(self.amounts[part])
+        dates = self.dates[part]
+        if not len(dates):
+            return []
+        last_of_day = np.flatnonzero(np.append(dates[1:] != dates[:-1], True))
+        return [(str(dates[i]), float(balance[i])) for i in last_of_day]
+
+    def top_expenses(self, start, end, n=10):
+        part = self.period(start, end)
+        amounts = self.amounts[part]
+        n = min(n, int(np.count_nonzero(amounts < 0)))
+        if n <= 0:
+            return []
+        smallest = np.argpartition(amounts, n - 1)[:n]
+        smallest = smallest[np.argsort(amounts[smallest], kind='stable')]
+        return [int(record_id) for record_id in self.ids[part][smallest]]
@@ -1,45 +1,216 @@
-from load_save_functions import *
+from load_save_functon import *
+import metrics
+from record_collection import RecordCollection, ManagerMixin, SortedIndex, intern_value, parse_date
+from finance_columns import FinanceColumns
+from finance_aggregates import FinanceAggregates
+from csv_import import import_csv, errors_path
+from csv_export import export_csv
+from pager import PAGE_SIZE, page_count, browse_pages
 import datetime
-import csv
 
 FINANCE_FILE = 'finance.json'
+# Сколько последних отчётов generate_report держать готовыми
+REPORT_CACHE_SIZE = 64
+FINANCE_EXPORT_COLUMNS = {
+    'ID': lambda record: record.id,
+    'Сумма': lambda record: record.amount,
+    'Категория': lambda record: record.category,
+    'Дата': lambda record: record.date,
+    'Описание': lambda record: record.description,
+}
+REPORT_COLUMNS = {name: FINANCE_EXPORT_COLUMNS[name] for name in ('ID', 'Дата', 'Сумма', 'Категория', 'Описание')}
+ANALYTICS_REPORTS = {
+    '1': ('category', 'Доходы и расходы по категориям'),
+    '2': ('month', 'Доходы и расходы по месяцам'),
+    '3': ('balance', 'Баланс нарастающим итогом'),
+    '4': ('top', 'Крупнейшие расходы'),
+}
+
+def finance_from_csv_row(row):
+    amount = row.get('Сумма', '0').strip().replace(',', '.')
+    try:
+        amount = float(amount)
+    except ValueError:
+        raise ValueError(f'некорректная сумма {amount!r}')
+    date = row.get('Дата') or datetime.datetime.now().strftime('%d-%m-%Y')
+    if parse_date(date) is None:
+        raise ValueError(f'некорректная дата {date!r}')
+    return amount, row.get('Категория', ''), date, row.get('Описание', '')
+
+def category_key(record):
+    # Ключ индекса категорий: внутри категории записи идут по дате
+    return record.category or '', record.date_value or datetime.date.min
+
+def format_record(record):
+    return f'{record.id}. {record.date} | {record.amount} | {record.category} | {record.description}'
 
 class FinanceRecord:
+    # Категория и дата повторяются у множества записей: строки интернируются,
+    # а объекты date берутся из кэша parse_date
+    __slots__ = ('id', 'amount', 'category', 'date', 'date_value', 'description', 'version')
+
     def __init__(self, record_id, amount, category, date, description):
         self.id = record_id
         self.amount = amount
-        self.category = category
-        self.date = date
+        self.category = intern_value(category)
+        self.date = intern_value(date)
+        self.date_value = parse_date(date)
         self.description = description
+        self.version = 0
+
+    def to_dict(self):
+        return {'id': self.id, 'amount': self.amount, 'category': self.category, 'date': self.date,
+                'description': self.description, 'version': self.version}
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls(data['id'], data['amount'], data['category'], data['date'], data['description'])
+        record.version = data.get('version') or 0
+        return record
+
+@metrics.instrument
+class FinanceManager(ManagerMixin):
+    DATA_FILE = FINANCE_FILE
+    COLLECTION = 'records'
+    EXPORT_COLUMNS = FINANCE_EXPORT_COLUMNS
+    CHANGES_FILE = 'finance_changes.csv'
 
-class FinanceManager:
     def __init__(self):
-        self.records = []
+        self.records = RecordCollection()
+        self.changes = ChangeBuffer(self.save_records)
         self.load_records()
 
     def load_records(self):
         data = load_data(FINANCE_FILE, [])
-        self.records = [FinanceRecord(**record) for record in data]
+        records = (FinanceRecord.from_dict(record) for record in data)
+        self.records = RecordCollection(records, load_meta(FINANCE_FILE))
+        self.date_index = SortedIndex(lambda record: record.date_value, self.records)
+        self.category_index = SortedIndex(category_key, self.records)
+        self.aggregates = FinanceAggregates(self.records)
+        # (начальная дата, конечная дата) -> (начало, конец, строки отчёта, файл отчёта)
+        self.report_cache = {}
+        # Столбцы для аналитики строятся по запросу и сбрасываются при любом изменении
+        self.columns = None
 
-    def save_records(self):
-        data = [record.__dict__ for record in self.records]
-        save_data(FINANCE_FILE, data)
+    def save_records(self, changes=None):
+        meta = self.records.meta()
+        if not (changes and append_changes(FINANCE_FILE, changes, meta)):
+            data = [record.to_dict() for record in self.records]
+            save_data(FINANCE_FILE, data, meta)
 
     def add_record(self, amount, category, date, description):
-        record_id = max([record.id for record in self.records], default=0) + 1
-        new_record = FinanceRecord(record_id, amount, category, date, description)
-        self.records.append(new_record)
-        self.save_records()
+        with self.batch():
+            self._add_record(amount, category, date, description)
         print('Запись успешно добавлена!')
 
-    def list_records(self):
+    def add_many(self, records):
+        with self.batch():
+            added = [self._add_record(*record) for record in records]
+        print(f'Добавлено записей: {len(added)}')
+        return added
+
+    def _add_record(self, amount, category, date, description):
+        record_id = self.records.allocate_id()
+        new_record = FinanceRecord(record_id, amount, category, date, description)
+        self.records.add(new_record)
+        self._index_record(new_record)
+        self.changes.add([('put', new_record.to_dict())])
+        return new_record
+
+    def edit_record(self, record_id, amount, category, date, description):
+        with self.batch():
+            record = self._edit_record(record_id, amount, category, date, description)
+        if record:
+            print('Запись успешно обновлена!')
+        else:
+            print('Запись не найдена.')
+
+    def edit_many(self, edits):
+        with self.batch():
+            edited = [record for record in (self._edit_record(*edit) for edit in edits) if record]
+        print(f'Обновлено записей: {len(edited)}')
+        return edited
+
+    def _edit_record(self, record_id, amount, category, date, description):
+        record = self.get_record_by_id(record_id)
+        if record:
+            self._unindex_record(record)
+            record.amount = amount
+            record.category = intern_value(category)
+            record.date = intern_value(date)
+            record.date_value = parse_date(date)
+            record.description = description
+            self._index_record(record)
+            self.records.touch(record)
+            self.changes.add([('put', record.to_dict())])
+        return record
+
+    def _index_record(self, record):
+        self.date_index.add(record)
+        self.category_index.add(record)
+        self.aggregates.add(record)
+        self.invalidate_reports(record.date_value)
+        self.columns = None
+
+    def _unindex_record(self, record):
+        self.date_index.remove(record)
+        self.category_index.remove(record)
+        self.aggregates.remove(record)
+        self.invalidate_reports(record.date_value)
+        self.columns = None
+
+    def invalidate_reports(self, date_value):
+        # Сбрасываем только отчёты, в период которых попадает изменённая запись
+        if date_value is None or not self.report_cache:
+            return
+        for key, (start, end, _, _) in list(self.report_cache.items()):
+            if start <= date_value <= end:
+                del self.report_cache[key]
+
+    def list_records(self, page=0, page_size=PAGE_SIZE, category=None, start_date=None, end_date=None,
+                     sort_by='id'):
+        # Печатает одну страницу и возвращает число страниц
         if not self.records:
             print('Финансовых записей нет.')
-            return
-        for record in self.records:
-            print(f'{record.id}. {record.date} | {record.amount} | {record.category} | {record.description}')
+            return 0
+        try:
+            records, _, total = self.page_records(page_size, category, start_date, end_date, sort_by, page)
+        except ValueError as e:
+            print(e)
+            return 0
+        if not total:
+            print('Записи не найдены.')
+            return 0
+        for record in records:
+            print(format_record(record))
+        pages = page_count(total, page_size)
+        print(f'Страница {page + 1} из {pages} (всего записей: {total})')
+        return pages
+
+    def page_records(self, size=PAGE_SIZE, category=None, start_date=None, end_date=None, sort_by='id', number=0,
+                     after=None, reverse=False):
+        # Страница записей из подходящего индекса за время, пропорциональное размеру страницы.
+        # Даты — 'ДД-ММ-ГГГГ'; с фильтром по категории или периоду записи идут по дате.
+        # Страница задаётся номером number или курсором after из предыдущего вызова.
+        # Возвращает (записи, курсор следующей страницы или None, всего записей под фильтром)
+        start = parse_date(start_date) if start_date else None
+        end = parse_date(end_date) if end_date else None
+        if (start_date and start is None) or (end_date and end is None):
+            raise ValueError('Некорректный формат даты.')
+        if sort_by not in ('id', 'date'):
+            raise ValueError(f'Неизвестная сортировка: {sort_by}')
+        offset = number * size
+        if category is not None:
+            low = (category, start or datetime.date.min)
+            high = (category, end or datetime.date.max)
+            ids, cursor, total = self.category_index.page(size, low, high, after, offset, reverse)
+        elif start or end or sort_by == 'date':
+            ids, cursor, total = self.date_index.page(size, start, end, after, offset, reverse)
+        else:
+            ids, cursor, total = self.records.page(size, after, offset, reverse)
+        return [self.records.get(record_id) for record_id in ids], cursor, total
 
-    def generate_report(self, start_date, end_date):
+    def generate_report(self, start_date, end_date, file_name=None):
         try:
             start_date_obj = datetime.datetime.strptime(start_date, '%d-%m-%Y')
             end_date_obj = datetime.datetime.strptime(end_date, '%d-%m-%Y')
@@ -47,94 +218,163 @@ class FinanceManager:
             print('Некорректный формат даты.')
             return
 
-        filtered_records = [record for record in self.records if start_date_obj <= datetime.datetime.strptime(record.date, '%d-%m-%Y') <= end_date_obj]
-        income = sum(record.amount for record in filtered_records if record.amount > 0)
-        expenses = sum(record.amount for record in filtered_records if record.amount < 0)
-        balance = income + expenses
-        print(f'Финансовый отчёт за период с {start_date} по {end_date}:')
-        print(f'- Общий доход: {income}')
-        print(f'- Общие расходы: {abs(expenses)}')
-        print(f'- Баланс: {balance}')
-
-        # Сохранение отчёта в CSV-файл
-        report_file = f'report_{start_date}_{end_date}.csv'
-        with open(report_file, mode='w', encoding='utf-8', newline='') as csv_file:
-            fieldnames = ['ID', 'Дата', 'Сумма', 'Категория', 'Описание']
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in filtered_records:
-                writer.writerow({
-                    'ID': record.id,
-                    'Дата': record.date,
-                    'Сумма': record.amount,
-                    'Категория': record.category,
-                    'Описание': record.description
-                })
+        # Файл отчёта можно задать, в том числе сжатый (.gz, .xz)
+        report_file = file_name or f'report_{start_date}_{end_date}.csv'
+        cached = self.report_cache.get((start_date, end_date))
+        if cached is None or cached[3] != report_file or not os.path.exists(report_file):
+            start, end = start_date_obj.date(), end_date_obj.date()
+            # Итоги — из накопленных сумм по дням, без просмотра записей
+            income, expenses = self.aggregates.totals(start, end)
+            balance = round(income + expenses, 2)
+            lines = [
+                f'Финансовый отчёт за период с {start_date} по {end_date}:',
+                f'- Общий доход: {income}',
+                f'- Общие расходы: {abs(expenses)}',
+                f'- Баланс: {balance}',
+            ]
+            # Сохранение отчёта в CSV-файл; записи за период — срез индекса по дате
+            record_ids = self.date_index.range(start, end)
+            export_csv(report_file, REPORT_COLUMNS, (self.records.get(record_id) for record_id in record_ids))
+            if len(self.report_cache) >= REPORT_CACHE_SIZE:
+                del self.report_cache[next(iter(self.report_cache))]
+            cached = self.report_cache[(start_date, end_date)] = (start, end, lines, report_file)
+        for line in cached[2]:
+            print(line)
         print(f'Подробная информация сохранена в файле {report_file}')
 
+    def category_totals(self, start_date, end_date):
+        start, end = parse_date(start_date), parse_date(end_date)
+        if start is None or end is None:
+            print('Некорректный формат даты.')
+            return None
+        return self.aggregates.category_totals(start, end)
+
+    def get_columns(self):
+        if self.columns is None:
+            self.columns = FinanceColumns(self.records)
+        return self.columns
+
+    def analytics_report(self, report_type, start_date, end_date, top_n=10):
+        if report_type not in [name for name, _ in ANALYTICS_REPORTS.values()]:
+            print('Неизвестный тип отчёта.')
+            return None
+        start, end = parse_date(start_date), parse_date(end_date)
+        if start is None or end is None:
+            print('Некорректный формат даты.')
+            return None
+        try:
+            columns = self.get_columns()
+        except ImportError as e:
+            print(e)
+            return None
+        print(f'Отчёт за период с {start_date} по {end_date}:')
+        if report_type == 'category':
+            rows = columns.totals_by_category(start, end)
+            for category, income, expenses in rows:
+                print(f'- {category}: доход {income:.2f}, расходы {abs(expenses):.2f}')
+        elif report_type == 'month':
+            rows = columns.totals_by_month(start, end)
+            for month, income, expenses in rows:
+                print(f'- {month}: доход {income:.2f}, расходы {abs(expenses):.2f}, баланс {income + expenses:.2f}')
+        elif report_type == 'balance':
+            rows = columns.running_balance(start, end)
+            for date, balance in rows:
+                print(f'- {date}: {balance:.2f}')
+        else:
+            rows = [self.records.get(record_id) for record_id in columns.top_expenses(start, end, top_n)]
+            for record in rows:
+                print(f'{record.id}. {record.date} | {record.amount} | {record.category} | {record.description}')
+        if not rows:
+            print('За этот период записей нет.')
+        return rows
+
     def delete_record(self, record_id):
-        record = self.get_record_by_id(record_id)
+        with self.batch():
+            record = self._delete_record(record_id)
         if record:
-            self.records.remove(record)
-            self.save_records()
             print('Запись успешно удалена!')
         else:
             print('Запись не найдена.')
 
+    def delete_many(self, record_ids):
+        with self.batch():
+            deleted = [record for record in (self._delete_record(record_id) for record_id in record_ids) if record]
+        print(f'Удалено записей: {len(deleted)}')
+        return deleted
+
+    def _delete_record(self, record_id):
+        record = self.get_record_by_id(record_id)
+        if record:
+            self.records.remove(record.id)
+            self._unindex_record(record)
+            self.changes.add([('delete', record.id)])
+        return record
+
     def get_record_by_id(self, record_id):
-        for record in self.records:
-            if record.id == record_id:
-                return record
-        return None
+        return self.records.get(record_id)
 
-    def export_records_to_csv(self):
+    def export_records_to_csv(self, file_name='finance_export.csv', columns=None, start_date=None, end_date=None,
+                              category=None):
+        # С периодом записи берутся из индекса по дате (в порядке дат), без — все записи
         if not self.records:
             print('Финансовых записей нет.')
             return
-        file_name = 'finance_export.csv'
-        with open(file_name, mode='w', encoding='utf-8', newline='') as csv_file:
-            fieldnames = ['ID', 'Сумма', 'Категория', 'Дата', 'Описание']
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in self.records:
-                writer.writerow({
-                    'ID': record.id,
-                    'Сумма': record.amount,
-                    'Категория': record.category,
-                    'Дата': record.date,
-                    'Описание': record.description
-                })
-        print(f'Финансовые записи успешно экспортированы в файл {file_name}')
-
-    def import_records_from_csv(self):
-        file_name = input('Введите имя CSV-файла для импорта: ')
+        records = iter(self.records)
+        if start_date or end_date:
+            start, end = parse_date(start_date or '01-01-0001'), parse_date(end_date or '31-12-9999')
+            if start is None or end is None:
+                print('Некорректный формат даты.')
+                return
+            records = (self.records.get(record_id) for record_id in self.date_index.range(start, end))
+        if category is not None:
+            records = (record for record in records if record.category == category)
+        try:
+            count = export_csv(file_name, FINANCE_EXPORT_COLUMNS, records, columns)
+        except ValueError as e:
+            print(e)
+            return
+        print(f'Финансовые записи успешно экспортированы в файл {file_name} ({count} шт.)')
+
+    def import_records_from_csv(self, file_name=None, workers=None):
+        if file_name is None:
+            file_name = input('Введите имя CSV-файла для импорта: ')
         if not os.path.exists(file_name):
             print('Файл не найден.')
             return
-        with open(file_name, mode='r', encoding='utf-8') as csv_file:
-            reader = csv.DictReader(csv_file)
-            for row in reader:
-                record_id = max([record.id for record in self.records], default=0) + 1
-                amount = float(row.get('Сумма', '0'))
-                category = row.get('Категория', '')
-                date = row.get('Дата', datetime.datetime.now().strftime('%d-%m-%Y'))
-                description = row.get('Описание', '')
-                new_record = FinanceRecord(record_id, amount, category, date, description)
-                self.records.append(new_record)
-            self.save_records()
-        print('Финансовые записи успешно импортированы из CSV-файла.')
-
-def finance_menu():
-    manager = FinanceManager()
+        imported, errors = import_csv(file_name, finance_from_csv_row, self._import_batch, self.records,
+                                      workers=workers)
+        print(f'Финансовые записи успешно импортированы из CSV-файла: {imported}, строк с ошибками: {errors}.')
+        if errors:
+            print(f'Ошибки записаны в файл {errors_path(file_name)}')
+
+    def _import_batch(self, rows):
+        new_records = []
+        with self.batch():
+            for amount, category, date, description in rows:
+                new_record = FinanceRecord(self.records.allocate_id(), amount, category, date, description)
+                self.records.add(new_record)
+                new_records.append(new_record)
+                self.changes.add([('put', new_record.to_dict())])
+        self.date_index.add_many(new_records)
+        self.category_index.add_many(new_records)
+        for record in new_records:
+            self.aggregates.add(record)
+            self.invalidate_reports(record.date_value)
+        self.columns = None
+
+def finance_menu(manager=None):
+    if manager is None:
+        manager = FinanceManager()
     while True:
         print('\nУправление финансовыми записями:')
         print('1. Добавить новую запись')
-        print('2. Просмотреть все записи')
+        print('2. Просмотреть записи')
         print('3. Генерация отчёта')
         print('4. Удалить запись')
         print('5. Экспорт финансовых записей в CSV')
         print('6. Импорт финансовых записей из CSV')
-        print('7. Назад')
+        print('7. Аналитика')
+        print('8. Назад')
         choice = input('Выберите действие: ')
         if choice == '1':
             try:
@@ -146,7 +386,11 @@ def finance_menu():
             except ValueError:
                 print('Некорректный ввод суммы.')
         elif choice == '2':
-            manager.list_records()
+            category = input('Категория (Enter — все): ') or None
+            start_date = input('Начальная дата ДД-ММ-ГГГГ (Enter — без ограничения): ') or None
+            end_date = input('Конечная дата ДД-ММ-ГГГГ (Enter — без ограничения): ') or None
+            browse_pages(lambda number: manager.list_records(number, category=category, start_date=start_date,
+                                                             end_date=end_date))
         elif choice == '3':
             start_date = input('Введите начальную дату (ДД-ММ-ГГГГ): ')
             end_date = input('Введите конечную дату (ДД-ММ-ГГГГ): ')
@@ -158,10 +402,21 @@ def finance_menu():
             except ValueError:
                 print('Некорректный ID.')
         elif choice == '5':
-            manager.export_records_to_csv()
+            manager.export_menu('finance_export.csv', manager.export_records_to_csv)
         elif choice == '6':
             manager.import_records_from_csv()
         elif choice == '7':
+            for key, (_, title) in ANALYTICS_REPORTS.items():
+                print(f'{key}. {title}')
+            report = ANALYTICS_REPORTS.get(input('Выберите отчёт: '))
+            if report is None:
+                print('Некорректный выбор.')
+                continue
+            start_date = input('Введите начальную дату (ДД-ММ-ГГГГ): ')
+            end_date = input('Введите конечную дату (ДД-ММ-ГГГГ): ')
+            manager.analytics_report(report[0], start_date, end_date)
+        elif choice == '8':
+            manager.flush()
             break
         else:
             print('Некорректный выбор. Попробуйте снова.')
\ No newline at end of file
@@ -1,13 +1,300 @@
 import os
 import json
+import atexit
+import threading
+from contextlib import contextmanager
+from sqlite_storage import sqlite_load, sqlite_save, sqlite_apply, sqlite_load_meta, sqlite_signature
+from binary_snapshot import read_snapshot, write_file, file_format
+from atomic_files import file_lock, fsync_file, fsync_directory, GroupCommit
+import metrics
+
+# Режим хранения: 'json' — полная перезапись файла при каждом изменении,
+# 'journal' — изменения дописываются в журнал рядом с файлом данных,
+# 'sqlite' — записи хранятся в таблицах базы SQLite (см. sqlite_storage.py).
+# Менять файл данных может только один процесс: id и версии выдаются из счётчиков
+# в памяти, и чужие изменения с теми же id затёрли бы друг друга. Блокировка файла
+# защищает запись от порчи, а в режимах json и journal запись в файл, изменённый
+# другим процессом после загрузки, отклоняется с DataChangedError.
+STORAGE_MODE = os.environ.get('PA_STORAGE_MODE', 'json')
+# Журнал сворачивается в новый снимок, когда становится больше снимка
+# (но не раньше, чем вырастет до этого размера в байтах).
+JOURNAL_MIN_COMPACT_SIZE = 1024 * 1024
+# Отложенная запись: сбрасывать изменения после N изменённых записей
+# и/или через заданное число секунд. По умолчанию сохраняем сразу.
+WRITE_BEHIND_CHANGES = int(os.environ.get('PA_WRITE_BEHIND_CHANGES', '0')) or None
+WRITE_BEHIND_SECONDS = float(os.environ.get('PA_WRITE_BEHIND_SECONDS', '0')) or None
+# Формат снимка по файлам: 'json' или 'binary' (см. binary_snapshot.py), например
+# PA_SNAPSHOT_FORMAT='finance.json=binary,notes.json=json'; '*=binary' — для всех файлов.
+# Для файла без настройки сохраняется тот формат, в котором он уже записан.
+SNAPSHOT_FORMATS = dict(item.split('=', 1) for item in os.environ.get('PA_SNAPSHOT_FORMAT', '').split(',') if '=' in item)
+
+def journal_path(file_path):
+    return file_path + '.journal'
+
+# Служебные данные файла (счётчик next_id, версия, удаления) хранятся вместе с записями:
+# в заголовке снимка, строками 'meta' в журнале и в таблице meta базы SQLite.
+# load_data запоминает их, load_meta отдаёт менеджеру.
+_loaded_meta = {}
+# Абсолютный путь -> data_signature() файла после последней загрузки или записи этим процессом
+_known_signatures = {}
+
+class DataChangedError(RuntimeError):
+    pass
+
+def check_unchanged(file_path):
+    # Вызывать под file_lock перед записью
+    expected = _known_signatures.get(os.path.abspath(file_path))
+    if expected is not None and data_signature(file_path) != expected:
+        raise DataChangedError(f'Файл {file_path} изменён другим процессом. Одновременно менять данные может '
+                               'только один процесс: перезапустите программу, чтобы загрузить изменения.')
+
+def remember_signature(file_path):
+    _known_signatures[os.path.abspath(file_path)] = data_signature(file_path)
 
 def load_data(file_path, default_data):
-    if not os.path.exists(file_path):
-        save_data(file_path, default_data)
-        return default_data
-    with open(file_path, 'r', encoding='utf-8') as f:
+    with metrics.file_operation('load', file_path):
+        if STORAGE_MODE == 'sqlite':
+            return sqlite_load(file_path)
+        # Под блокировкой: другой процесс не подменит снимок между чтением его и журнала
+        with file_lock(file_path):
+            if not os.path.exists(file_path) and not os.path.exists(journal_path(file_path)):
+                write_snapshot(file_path, default_data)
+            data, _loaded_meta[file_path] = read_data(file_path, default_data)
+            remember_signature(file_path)
+            return data
+
+def read_data(file_path, default_data):
+    # (записи, служебные данные): снимок, затем журнал поверх него
+    if os.path.exists(file_path):
+        data, meta = read_snapshot(file_path)
+    else:
+        data, meta = default_data, None
+    if meta is None:
+        meta = read_meta_file(file_path)
+    return replay_journal(file_path, data, meta), meta
+
+def save_data(file_path, data, meta=None):
+    with metrics.file_operation('save', file_path):
+        if STORAGE_MODE == 'sqlite':
+            sqlite_save(file_path, data, meta=meta)
+            return
+        committer(file_path, 'snapshot').submit((data, meta))
+
+def write_snapshot(file_path, data, meta=None):
+    with file_lock(file_path):
+        check_unchanged(file_path)
+        write_file(file_path, data, snapshot_format(file_path), meta)
+        # Снимок записан — журнал и файл .meta прежних версий больше не нужны
+        if os.path.exists(journal_path(file_path)):
+            os.remove(journal_path(file_path))
+        if meta is not None and os.path.exists(meta_path(file_path)):
+            os.remove(meta_path(file_path))
+        remember_signature(file_path)
+
+def write_journal(file_path, texts):
+    path = journal_path(file_path)
+    with file_lock(file_path):
+        check_unchanged(file_path)
+        created = not os.path.exists(path)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(''.join(texts))
+            fsync_file(f)
+        if created:
+            fsync_directory(path)
+        remember_signature(file_path)
+
+# (файл, вид записи) -> GroupCommit: одновременные сохранения одного файла из разных
+# потоков записываются вместе. Каждый снимок полный, поэтому из группы пишется последний,
+# а строки журнала — все подряд одним дописыванием.
+_committers = {}
+_committers_guard = threading.Lock()
+
+def committer(file_path, kind):
+    path = os.path.abspath(file_path)
+    with _committers_guard:
+        group_commit = _committers.get((path, kind))
+        if group_commit is None:
+            if kind == 'snapshot':
+                group_commit = GroupCommit(lambda items: write_snapshot(path, *items[-1]))
+            else:
+                group_commit = GroupCommit(lambda items: write_journal(path, items))
+            _committers[(path, kind)] = group_commit
+        return group_commit
+
+def snapshot_format(file_path):
+    name = os.path.basename(file_path)
+    return SNAPSHOT_FORMATS.get(name) or SNAPSHOT_FORMATS.get('*') or file_format(file_path) or 'json'
+
+def replay_journal(file_path, data, meta=None):
+    # Служебные данные из строк 'meta' и версии удалений переносятся в meta
+    path = journal_path(file_path)
+    if not os.path.exists(path):
+        return data
+    records = {record['id']: record for record in data}
+    deleted = dict(meta.get('deleted', ())) if meta is not None else {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Недописанная строка после сбоя — дальше ничего нет
+                break
+            if entry['op'] == 'put':
+                records[entry['record']['id']] = entry['record']
+            elif entry['op'] == 'delete':
+                records.pop(entry['id'], None)
+                if entry.get('version') is not None:
+                    deleted[entry['id']] = entry['version']
+            elif entry['op'] == 'meta' and meta is not None:
+                meta.update(entry['meta'])
+    if meta is not None and (deleted or 'deleted' in meta):
+        # Удаления старше deleted_before уже вытеснены из списка
+        oldest = meta.get('deleted_before') or 0
+        meta['deleted'] = sorted(([record_id, version] for record_id, version in deleted.items() if version > oldest),
+                                 key=lambda item: item[1])
+    return list(records.values())
+
+def journal_needs_compaction(file_path):
+    path = journal_path(file_path)
+    if not os.path.exists(path):
+        return False
+    snapshot_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    return os.path.getsize(path) > max(JOURNAL_MIN_COMPACT_SIZE, snapshot_size)
+
+def append_changes(file_path, changes, meta=None):
+    # changes — список пар ('put', запись) или ('delete', id), meta — служебные данные
+    # после этих изменений. Возвращает False, если нужно сохранить файл целиком:
+    # режим 'json' или журнал пора свернуть в новый снимок.
+    if STORAGE_MODE == 'sqlite':
+        with metrics.file_operation('append', file_path):
+            sqlite_apply(file_path, changes, meta)
+        metrics.count('storage_changes', len(changes), file=os.path.basename(file_path))
+        return True
+    if STORAGE_MODE != 'journal' or journal_needs_compaction(file_path):
+        return False
+    with metrics.file_operation('append', file_path):
+        lines = []
+        deleted = dict(meta.get('deleted', ())) if meta is not None else {}
+        for op, value in changes:
+            if op == 'put':
+                entry = {'op': 'put', 'record': value}
+            else:
+                entry = {'op': 'delete', 'id': value, 'version': deleted.get(value)}
+            lines.append(json.dumps(entry, ensure_ascii=False) + '\n')
+        if meta is not None:
+            # Список удалений восстанавливается из строк 'delete', поэтому здесь его нет
+            entry = {'op': 'meta', 'meta': {key: value for key, value in meta.items() if key != 'deleted'}}
+            lines.append(json.dumps(entry, ensure_ascii=False) + '\n')
+        text = ''.join(lines)
+        committer(file_path, 'journal').submit(text)
+    metrics.count('storage_changes', len(changes), file=os.path.basename(file_path))
+    if metrics.ENABLED:
+        metrics.count('storage_bytes', len(text.encode('utf-8')), operation='append', file=os.path.basename(file_path))
+    return True
+
+def compact_data(file_path, default_data):
+    data = load_data(file_path, default_data)
+    save_data(file_path, data, load_meta(file_path))
+
+def data_signature(file_path):
+    # Размер и время изменения файлов, в которых лежат данные: если они
+    # отличаются от запомненных, данные менялись. В SQLite все таблицы в одном
+    # файле, поэтому там сравнивается состояние таблицы этого файла.
+    if STORAGE_MODE == 'sqlite':
+        return sqlite_signature(file_path)
+    signature = []
+    for path in (file_path, journal_path(file_path)):
+        try:
+            stat = os.stat(path)
+            signature.append([stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            signature.append(None)
+    return signature
+
+def meta_path(file_path):
+    # Отдельный файл служебных данных прежних версий; читается, пока снимок не перезаписан
+    return file_path + '.meta'
+
+def read_meta_file(file_path):
+    if not os.path.exists(meta_path(file_path)):
+        return {}
+    with open(meta_path(file_path), 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def save_data(file_path, data):
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
\ No newline at end of file
+def load_meta(file_path):
+    # Вызывать после load_data того же файла
+    if STORAGE_MODE == 'sqlite':
+        return sqlite_load_meta(file_path)
+    return dict(_loaded_meta.get(file_path) or {})
+
+class ChangeBuffer:
+    # Копит изменения менеджера и передаёт их в save_func одним вызовом.
+    # Повторные изменения одной записи схлопываются в последнее.
+    def __init__(self, save_func, max_dirty=WRITE_BEHIND_CHANGES, interval=WRITE_BEHIND_SECONDS):
+        self.save_func = save_func
+        self.pending = {}
+        self.batch_depth = 0
+        self.timer = None
+        self.lock = threading.RLock()
+        self.max_dirty = None
+        self.interval = None
+        self.set_write_behind(max_dirty, interval)
+
+    def set_write_behind(self, max_dirty=None, interval=None):
+        with self.lock:
+            if (max_dirty or interval) and not (self.max_dirty or self.interval):
+                atexit.register(self.flush)
+            self.max_dirty = max_dirty
+            self.interval = interval
+            if not (max_dirty or interval):
+                self.flush()
+
+    def add(self, changes):
+        with self.lock:
+            for op, value in changes:
+                record_id = value['id'] if op == 'put' else value
+                self.pending[record_id] = (op, value)
+            if self.batch_depth:
+                return
+            if not (self.max_dirty or self.interval):
+                self.flush()
+            elif self.max_dirty and len(self.pending) >= self.max_dirty:
+                self.flush()
+            elif self.interval and self.timer is None:
+                self.timer = threading.Timer(self.interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, {}
+            try:
+                self.save_func(list(pending.values()))
+            except BaseException:
+                # Несохранённые изменения остаются в буфере до следующего сброса
+                pending.update(self.pending)
+                self.pending = pending
+                raise
+
+    @contextmanager
+    def batch(self):
+        # Изменения внутри блока записываются один раз при выходе из него.
+        # При исключении уже сделанные в памяти изменения всё равно сохраняются,
+        # чтобы файл не расходился с тем, что видит менеджер.
+        # Менеджеры меняют записи только внутри batch(), а блокировка держится весь
+        # блок: сброс по таймеру из другого потока не застанет данные на полпути.
+        with self.lock:
+            self.batch_depth += 1
+            try:
+                yield
+            finally:
+                self.batch_depth -= 1
+                if not self.batch_depth:
+                    self.flush()
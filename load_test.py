@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+# Нагрузочный тест api_server.py: несколько соединений keep-alive параллельно шлют
+# смесь чтений и изменений; в конце — запросов в секунду и задержки (p50, p95, p99).
+# С --start сервер запускается на свободном порту во временном каталоге и заполняется данными.
+PREFILL = 500
+
+def read_command(rng, size):
+    return rng.choice([
+        lambda: ('GET', f'/tasks/get?id={rng.randint(1, size)}', None),
+        lambda: ('GET', '/tasks/top?limit=10', None),
+        lambda: ('GET', '/notes/search?query=%D0%B1%D1%8E%D0%B4%D0%B6%D0%B5%D1%82&limit=10', None),
+        lambda: ('GET', '/contacts/search?query=%D0%98%D0%B2%D0%B0%D0%BD&limit=10', None),
+        lambda: ('GET', '/finance/report?start_date=01-01-2024&end_date=31-12-2024', None),
+        lambda: ('GET', f'/finance/list?size=20&page={rng.randint(0, size // 20)}', None),
+    ])()
+
+def write_command(rng, size):
+    return rng.choice([
+        lambda: ('POST', '/tasks/add', {'title': f'Задача {rng.random()}', 'priority': 'Высокий',
+                                        'due_date': f'{rng.randint(1, 28):02d}-06-2024'}),
+        lambda: ('POST', '/tasks/done', {'id': rng.randint(1, size)}),
+        lambda: ('POST', '/notes/add', {'title': 'Заметка', 'content': 'обсудить бюджет и сроки'}),
+        lambda: ('POST', '/finance/add', {'amount': rng.randint(-500, 500), 'category': 'Еда',
+                                          'date': f'{rng.randint(1, 28):02d}-03-2024'}),
+    ])()
+
+def prefill_commands(size):
+    commands = []
+    for i in range(size):
+        commands.append({'command': 'tasks.add', 'title': f'Задача {i}', 'priority': 'Средний',
+                         'due_date': f'{i % 28 + 1:02d}-05-2024'})
+        commands.append({'command': 'notes.add', 'title': f'Заметка {i}', 'content': f'бюджет проекта {i}'})
+        commands.append({'command': 'contacts.add', 'name': f'Иван {i}', 'phone': f'+7900{i:07d}'})
+        commands.append({'command': 'finance.add', 'amount': i % 1000 - 500, 'category': 'Еда',
+                         'date': f'{i % 28 + 1:02d}-03-2024'})
+    return commands
+
+async def send(reader, writer, host, method, path, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+    writer.write((f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                  f'Content-Length: {len(body)}\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    length = next(int(line.split(':', 1)[1]) for line in lines if line.lower().startswith('content-length:'))
+    return status, await reader.readexactly(length)
+
+async def client(host, port, plan, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while plan:
+            kind, method, path, payload = plan.pop()
+            started = time.perf_counter()
+            status, _ = await send(reader, writer, host, method, path, payload)
+            latencies.append((kind, time.perf_counter() - started, status == 200))
+    finally:
+        writer.close()
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+def summary(latencies, elapsed):
+    result = {'requests': len(latencies), 'seconds': round(elapsed, 3),
+              'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else None}
+    for kind in ('all', 'read', 'write'):
+        values = sorted(seconds for item_kind, seconds, _ in latencies if kind in ('all', item_kind))
+        result[kind] = {'count': len(values), 'errors': sum(1 for item_kind, _, ok in latencies
+                                                            if not ok and kind in ('all', item_kind))}
+        for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0)):
+            value = percentile(values, fraction)
+            result[kind][name + '_ms'] = round(value * 1000, 3) if value is not None else None
+    return result
+
+async def run_load(host, port, requests, connections, write_ratio, size, seed):
+    rng = random.Random(seed)
+    plan = []
+    for _ in range(requests):
+        if rng.random() < write_ratio:
+            plan.append(('write',) + write_command(rng, size))
+        else:
+            plan.append(('read',) + read_command(rng, size))
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(client(host, port, plan, latencies) for _ in range(connections)))
+    return summary(latencies, time.perf_counter() - started)
+
+async def prefill(host, port, size):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, body = await send(reader, writer, host, 'POST', '/commands', prefill_commands(size))
+        if status != 200 or not all(result['ok'] for result in json.loads(body)):
+            raise RuntimeError('Не удалось заполнить сервер данными.')
+    finally:
+        writer.close()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(directory, port):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_server.py')
+    process = subprocess.Popen([sys.executable, script, '--port', str(port)], cwd=directory,
+                               stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('Сервер не запустился.')
+
+def print_summary(result):
+    print(f'Запросов: {result["requests"]} за {result["seconds"]} с — {result["requests_per_second"]} в секунду')
+    for kind, title in (('all', 'Все'), ('read', 'Чтения'), ('write', 'Изменения')):
+        item = result[kind]
+        print(f'{title}: {item["count"]} (ошибок {item["errors"]}), p50 {item["p50_ms"]} мс, '
+              f'p95 {item["p95_ms"]} мс, p99 {item["p99_ms"]} мс, max {item["max_ms"]} мс')
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест HTTP/JSON-сервера персонального помощника')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--start', action='store_true',
+                        help='запустить сервер во временном каталоге и заполнить его данными')
+    parser.add_argument('--prefill', type=int, default=PREFILL, help='записей каждого раздела при --start')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='доля изменений среди запросов')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=None, help='записать результат в JSON-файл')
+    args = parser.parse_args()
+    process = None
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            if args.start:
+                args.port = free_port()
+                process = start_server(directory, args.port)
+                asyncio.run(prefill(args.host, args.port, args.prefill))
+            size = args.prefill if args.start else 100
+            result = asyncio.run(run_load(args.host, args.port, args.requests, args.connections,
+                                          args.write_ratio, size, args.seed))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+    print_summary(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import atexit
+import signal
+import inspect
+import datetime
+from bisect import bisect_left
+from functools import wraps
+from contextlib import contextmanager, nullcontext
+
+# Сбор метрик включается переменной PA_METRICS=1. Без неё timed() и instrument()
+# возвращают функции и классы как есть, а остальные вызовы сразу выходят.
+ENABLED = os.environ.get('PA_METRICS', '') not in ('', '0')
+# Куда сохранять метрики при выходе и по запросу: .prom или .txt — текстовый формат
+# Prometheus, иначе JSON. По сигналу SIGUSR1 метрики сохраняются без остановки программы.
+METRICS_FILE = os.environ.get('PA_METRICS_FILE', 'metrics.json')
+# Верхние границы корзин гистограммы задержек в секундах
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+NULL_CONTEXT = nullcontext()
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    def cumulative(self):
+        # Пары (граница, число наблюдений не больше неё), последняя граница — '+Inf'
+        result, running = [], 0
+        for bound, count in zip(BUCKETS + ('+Inf',), self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.total, 'min': self.min, 'max': self.max,
+                'mean': self.total / self.count if self.count else None,
+                'buckets': {str(bound): count for bound, count in self.cumulative()}}
+
+# (имя, метки) -> Histogram или число; метки — кортеж пар (имя, значение)
+histograms = {}
+counters = {}
+started_at = datetime.datetime.now().isoformat(timespec='seconds')
+
+def metric_key(metric, labels):
+    return metric, tuple(sorted(labels.items()))
+
+def observe(metric, seconds, **labels):
+    if not ENABLED:
+        return
+    key = metric_key(metric, labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = Histogram()
+    histogram.observe(seconds)
+
+def count(metric, value=1, **labels):
+    if not ENABLED:
+        return
+    key = metric_key(metric, labels)
+    counters[key] = counters.get(key, 0) + value
+
+def timed(name):
+    # Декоратор: время каждого вызова попадает в гистограмму call_seconds{name=...}
+    def decorator(func):
+        if not ENABLED:
+            return func
+        key = metric_key('call_seconds', {'name': name})
+        perf_counter = time.perf_counter
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # Ключ посчитан заранее: на вызов — только замер и поиск в словаре
+                histogram = histograms.get(key) or histograms.setdefault(key, Histogram())
+                histogram.observe(perf_counter() - started)
+        return wrapper
+    return decorator
+
+def instrument(cls):
+    # Декоратор класса: замеряются все публичные методы, включая CRUD, поиск, отчёты, импорт и экспорт
+    if not ENABLED:
+        return cls
+    for attribute, value in list(vars(cls).items()):
+        if inspect.isfunction(value) and not attribute.startswith('_'):
+            setattr(cls, attribute, timed(f'{cls.__name__}.{attribute}')(value))
+    return cls
+
+@contextmanager
+def measure_file(operation, file_path):
+    labels = {'operation': operation, 'file': os.path.basename(file_path)}
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('storage_seconds', time.perf_counter() - started, **labels)
+        if operation != 'append' and os.path.exists(file_path):
+            count('storage_bytes', os.path.getsize(file_path), **labels)
+
+def file_operation(operation, file_path):
+    # Время операции с файлом данных и размер файла после неё (для дописывания в журнал
+    # объём считается отдельно через count)
+    if not ENABLED:
+        return NULL_CONTEXT
+    return measure_file(operation, file_path)
+
+def snapshot():
+    return {
+        'started': started_at,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'histograms': [{'name': name, 'labels': dict(labels), **histogram.to_dict()}
+                       for (name, labels), histogram in sorted(histograms.items())],
+        'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                     for (name, labels), value in sorted(counters.items())],
+    }
+
+def label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def prometheus_text():
+    lines = []
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f'# TYPE pa_{name} histogram')
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, total in histogram.cumulative():
+                lines.append(f'pa_{name}_bucket{label_text(labels, [("le", bound)])} {total}')
+            lines.append(f'pa_{name}_sum{label_text(labels)} {histogram.total}')
+            lines.append(f'pa_{name}_count{label_text(labels)} {histogram.count}')
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f'# TYPE pa_{name}_total counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'pa_{name}_total{label_text(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+def dump(file_path=None):
+    file_path = file_path or METRICS_FILE
+    with open(file_path, 'w', encoding='utf-8') as f:
+        if file_path.endswith(('.prom', '.txt')):
+            f.write(prometheus_text())
+        else:
+            json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+    return file_path
+
+if ENABLED:
+    # Путь — абсолютный, чтобы смена текущего каталога не уводила файл метрик
+    METRICS_FILE = os.path.abspath(METRICS_FILE)
+    atexit.register(dump)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: dump())
@@ -0,0 +1,102 @@
+import os
+import mmap
+from atomic_files import fsync_file, fsync_directory
+
+# Файлы текстов сжимаются, когда вырастают больше этого размера в байтах
+# и больше чем вдвое превышают объём живых текстов
+BODIES_MIN_COMPACT_SIZE = 16 * 1024 * 1024
+
+class NoteBodyStore:
+    # Тексты заметок подряд в файлах <base_path>.<N>; у заметки в памяти только
+    # (N, смещение, длина), сам текст читается через mmap при обращении.
+    # Файл только дописывается. При сжатии живые тексты переписываются в файл N+1,
+    # а старый удаляется после того, как заметки сохранены с новыми местами.
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.maps = {}
+        self.writer = None
+        self.created = False
+        self.number = max(self.existing_numbers(), default=1)
+
+    def path(self, number):
+        return f'{self.base_path}.{number}'
+
+    def existing_numbers(self):
+        directory = os.path.dirname(self.base_path) or '.'
+        prefix = os.path.basename(self.base_path) + '.'
+        return [int(name[len(prefix):]) for name in os.listdir(directory)
+                if name.startswith(prefix) and name[len(prefix):].isdigit()]
+
+    def append(self, text):
+        if self.writer is None:
+            self.created = not os.path.exists(self.path(self.number))
+            self.writer = open(self.path(self.number), 'ab')
+        data = text.encode('utf-8')
+        offset = self.writer.tell()
+        self.writer.write(data)
+        self.writer.flush()
+        return (self.number, offset, len(data))
+
+    def sync(self):
+        # Тексты должны оказаться на диске раньше, чем заметки со ссылками на них
+        if self.writer is not None:
+            fsync_file(self.writer)
+            if self.created:
+                fsync_directory(self.path(self.number))
+                self.created = False
+
+    def read_bytes(self, body):
+        number, offset, length = body
+        if not length:
+            return b''
+        mapped = self.maps.get(number)
+        if mapped is None or offset + length > len(mapped):
+            # Файл дописан после того, как был отображён, — отображаем заново.
+            # Старое отображение не закрываем: из него может читать другой поток,
+            # оно закроется само, когда на него не останется ссылок
+            with open(self.path(number), 'rb') as f:
+                mapped = self.maps[number] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped[offset:offset + length]
+
+    def read(self, body):
+        return self.read_bytes(body).decode('utf-8')
+
+    def needs_compaction(self, notes):
+        live = sum(note.body[2] for note in notes if note.body is not None)
+        total = sum(os.path.getsize(self.path(number)) for number in self.existing_numbers())
+        return total > BODIES_MIN_COMPACT_SIZE and total > 2 * live
+
+    def compact(self, notes):
+        # После сжатия заметки нужно сохранить целиком и вызвать remove_unused()
+        number = self.number + 1
+        with open(self.path(number), 'wb') as f:
+            for note in notes:
+                if note.body is not None:
+                    data = self.read_bytes(note.body)
+                    note.body = (number, f.tell(), len(data))
+                    f.write(data)
+            fsync_file(f)
+        fsync_directory(self.path(number))
+        self.close_writer()
+        self.number = number
+
+    def remove_unused(self, notes):
+        # Удаляет файлы, на которые не ссылается ни одна заметка: старые после
+        # сжатия, недописанные после сбоя и все файлы, если тексты хранятся в notes.json
+        used = {note.body[0] for note in notes if note.body is not None}
+        if used and self.number not in used:
+            self.close_writer()
+            self.number = max(used)
+        for number in self.existing_numbers():
+            if number not in used:
+                if number == self.number:
+                    self.close_writer()
+                mapped = self.maps.pop(number, None)
+                if mapped is not None:
+                    mapped.close()
+                os.remove(self.path(number))
+
+    def close_writer(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import math
+from functools import lru_cache
+from bisect import bisect_left, insort
+from atomic_files import atomic_open
+
+TOKEN_RE = re.compile(r'\w+')
+# Слова из заголовка весят больше, чем из текста
+TITLE_WEIGHT = 3
+# Сколько разных слов может подставиться вместо одного префикса запроса
+MAX_PREFIX_TERMS = 50
+# Простейший стемминг: отрезаем частые окончания русских и английских слов
+ENDINGS = sorted([
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее',
+    'ые', 'ие', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ть', 'ся', 'сь', 'а', 'я', 'о', 'е', 'ы',
+    'и', 'у', 'ю', 'ь',
+    'ing', 'ed', 'es', 's',
+], key=len, reverse=True)
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+@lru_cache(maxsize=200000)
+def stem(word):
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+def tokenize(text):
+    return [stem(word) for word in TOKEN_RE.findall(normalize(text or ''))]
+
+def term_weights(note):
+    weights = {}
+    for term in tokenize(note.title):
+        weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+    for term in tokenize(note.content):
+        weights[term] = weights.get(term, 0) + 1
+    return weights
+
+class NoteSearchIndex:
+    def __init__(self):
+        self.postings = {}
+        self.doc_count = 0
+        self.terms = []
+        self.dirty = False
+
+    def add(self, note):
+        for term, weight in term_weights(note).items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                if self.terms is not None:
+                    insort(self.terms, term)
+            self.postings[term][note.id] = weight
+        self.doc_count += 1
+        self.dirty = True
+
+    def remove(self, note):
+        # Слова заметки берём из её текущего текста, поэтому вызывать до изменения заметки
+        for term in term_weights(note):
+            postings = self.postings.get(term)
+            if postings is None or postings.pop(note.id, None) is None:
+                continue
+            if not postings:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+        self.doc_count -= 1
+        self.dirty = True
+
+    def expand(self, term):
+        # Сам термин и все слова индекса, которые с него начинаются
+        start = bisect_left(self.terms, term)
+        end = start
+        while end < len(self.terms) and end - start < MAX_PREFIX_TERMS and self.terms[end].startswith(term):
+            end += 1
+        return self.terms[start:end]
+
+    def search(self, query, limit=20):
+        # Заметка должна содержать все слова запроса (целиком или как префикс),
+        # порядок — по сумме tf-idf
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        total = self.doc_count or 1
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for match in self.expand(term):
+                postings = self.postings[match]
+                idf = math.log(1 + total / len(postings))
+                for note_id, weight in postings.items():
+                    score = weight * idf
+                    if score > term_scores.get(note_id, 0):
+                        term_scores[note_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {note_id: score + term_scores[note_id] for note_id, score in scores.items()
+                          if note_id in term_scores}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def save(self, file_path, signature):
+        # Для каждого слова — два параллельных списка: id заметок и веса
+        postings = {term: [list(notes), list(notes.values())] for term, notes in self.postings.items()}
+        data = {'signature': signature, 'doc_count': self.doc_count, 'postings': postings}
+        with atomic_open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, file_path, signature):
+        # Индекс с диска годится, только если файл заметок не менялся после его записи
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except ValueError:
+            return None
+        if data.get('signature') != signature:
+            return None
+        index = cls()
+        index.doc_count = data['doc_count']
+        for term, (note_ids, weights) in data['postings'].items():
+            index.postings[term] = dict(zip(note_ids, weights))
+        index.terms = sorted(index.postings)
+        return index
+
+    @classmethod
+    def build(cls, notes):
+        # Список слов сортируем один раз в конце, а не вставкой на каждое новое слово
+        index = cls()
+        index.terms = None
+        for note in notes:
+            index.add(note)
+        index.terms = sorted(index.postings)
+        return index
@@ -1,43 +1,219 @@
-from load_save_functions import *
+from load_save_functon import *
+import metrics
+from record_collection import RecordCollection, ManagerMixin, SortedIndex
+from note_search import NoteSearchIndex
+from note_bodies import NoteBodyStore
+from csv_import import import_csv, errors_path
+from csv_export import export_csv
+from pager import PAGE_SIZE, page_count, browse_pages
 import datetime
-import csv
 
 NOTES_FILE = 'notes.json'
+NOTES_INDEX_FILE = NOTES_FILE + '.index'
+NOTES_BODIES_FILE = NOTES_FILE + '.bodies'
+# Раскладка хранения: 'inline' — тексты заметок внутри notes.json, 'split' — в
+# notes.json только заголовки и места текстов, сами тексты в notes.json.bodies.N
+# и читаются по требованию. В режиме sqlite тексты всегда хранятся в базе.
+NOTES_LAYOUT = os.environ.get('PA_NOTES_LAYOUT', 'inline')
+NOTE_EXPORT_COLUMNS = {
+    'ID': lambda note: note.id,
+    'Заголовок': lambda note: note.title,
+    'Содержимое': lambda note: note.content,
+    'Дата': lambda note: note.timestamp,
+}
+
+def note_from_csv_row(row):
+    timestamp = row.get('Дата') or datetime.datetime.now().strftime('%d-%m-%Y %H:%M:%S')
+    return row.get('Заголовок', ''), row.get('Содержимое', ''), timestamp
+
+def timestamp_key(note):
+    # 'ДД-ММ-ГГГГ ЧЧ:ММ:СС' -> 'ГГГГ-ММ-ДД ЧЧ:ММ:СС': такие строки сортируются как время.
+    # Заметки с некорректной датой получают '' и идут первыми
+    timestamp = note.timestamp
+    if not isinstance(timestamp, str) or len(timestamp) < 10:
+        return ''
+    return f'{timestamp[6:10]}-{timestamp[3:5]}-{timestamp[:2]}{timestamp[10:]}'
+
+def date_key(value):
+    # 'ДД-ММ-ГГГГ' -> 'ГГГГ-ММ-ДД' для границ периода; ValueError при некорректной дате
+    return datetime.datetime.strptime(value, '%d-%m-%Y').strftime('%Y-%m-%d')
 
 class Note:
-    def __init__(self, note_id, title, content, timestamp):
+    # __slots__ вместо __dict__ у каждого экземпляра: заметно меньше памяти на запись.
+    # Текст хранится либо в text, либо в файле текстов (body — его место в store).
+    __slots__ = ('id', 'title', 'text', 'timestamp', 'body', 'store', 'version')
+
+    def __init__(self, note_id, title, content, timestamp, body=None, store=None):
         self.id = note_id
         self.title = title
-        self.content = content
+        self.text = content
         self.timestamp = timestamp
+        self.body = body
+        self.store = store
+        self.version = 0
+
+    @property
+    def content(self):
+        if self.body is not None:
+            return self.store.read(self.body)
+        return self.text
+
+    @content.setter
+    def content(self, value):
+        self.text = value
+        self.body = None
+
+    def store_content(self, store):
+        # Переносит текст в файл текстов: в памяти остаётся только его место
+        self.body = store.append(self.content)
+        self.store = store
+        self.text = None
+
+    def to_dict(self):
+        if self.body is not None:
+            return {'id': self.id, 'title': self.title, 'body': list(self.body), 'timestamp': self.timestamp,
+                    'version': self.version}
+        return {'id': self.id, 'title': self.title, 'content': self.text, 'timestamp': self.timestamp,
+                'version': self.version}
+
+    @classmethod
+    def from_dict(cls, data, store=None):
+        if 'body' in data:
+            note = cls(data['id'], data['title'], None, data['timestamp'], tuple(data['body']), store)
+        else:
+            note = cls(data['id'], data['title'], data['content'], data['timestamp'])
+        note.version = data.get('version') or 0
+        return note
+
+@metrics.instrument
+class NoteManager(ManagerMixin):
+    DATA_FILE = NOTES_FILE
+    COLLECTION = 'notes'
+    EXPORT_COLUMNS = NOTE_EXPORT_COLUMNS
+    CHANGES_FILE = 'notes_changes.csv'
 
-class NoteManager:
     def __init__(self):
-        self.notes = []
+        self.notes = RecordCollection()
+        self.changes = ChangeBuffer(self.save_notes)
         self.load_notes()
 
     def load_notes(self):
+        self.split_layout = NOTES_LAYOUT == 'split' and STORAGE_MODE != 'sqlite'
+        self.bodies = NoteBodyStore(NOTES_BODIES_FILE)
         data = load_data(NOTES_FILE, [])
-        self.notes = [Note(**note) for note in data]
+        notes = (Note.from_dict(note, self.bodies) for note in data)
+        self.notes = RecordCollection(notes, load_meta(NOTES_FILE))
+        self.timestamp_index = SortedIndex(timestamp_key, self.notes)
+        # Заметки, сохранённые в другой раскладке, переводятся в текущую
+        converted = [note for note in self.notes if (note.body is None) == self.split_layout]
+        for note in converted:
+            self.place_content(note, note.content)
+        if converted:
+            self.save_notes()
+        self.bodies.remove_unused(self.notes)
+        self.search_index = NoteSearchIndex.load(NOTES_INDEX_FILE, data_signature(NOTES_FILE))
+        if self.search_index is None:
+            self.search_index = NoteSearchIndex.build(self.notes)
 
-    def save_notes(self):
-        data = [note.__dict__ for note in self.notes]
-        save_data(NOTES_FILE, data)
+    def save_notes(self, changes=None):
+        if self.split_layout:
+            self.bodies.sync()
+        meta = self.notes.meta()
+        if not (changes and append_changes(NOTES_FILE, changes, meta)):
+            data = [note.to_dict() for note in self.notes]
+            save_data(NOTES_FILE, data, meta)
+
+    def place_content(self, note, content):
+        note.content = content
+        if self.split_layout:
+            note.store_content(self.bodies)
+
+    def close(self):
+        with self.changes.lock:
+            self.flush()
+            if self.split_layout and self.bodies.needs_compaction(self.notes):
+                # Места всех текстов меняются, поэтому заметки сохраняются целиком
+                self.bodies.compact(self.notes)
+                self.save_notes()
+                self.bodies.remove_unused(self.notes)
+                self.search_index.dirty = True
+            if self.search_index.dirty:
+                self.search_index.save(NOTES_INDEX_FILE, data_signature(NOTES_FILE))
 
     def add_note(self, title, content):
-        note_id = max([note.id for note in self.notes], default=0) + 1
-        timestamp = datetime.datetime.now().strftime('%d-%m-%Y %H:%M:%S')
-        new_note = Note(note_id, title, content, timestamp)
-        self.notes.append(new_note)
-        self.save_notes()
+        with self.batch():
+            self._add_note(title, content)
         print('Заметка успешно добавлена!')
 
-    def list_notes(self):
+    def add_many(self, notes):
+        with self.batch():
+            added = [self._add_note(title, content) for title, content in notes]
+        print(f'Добавлено заметок: {len(added)}')
+        return added
+
+    def _add_note(self, title, content):
+        note_id = self.notes.allocate_id()
+        timestamp = datetime.datetime.now().strftime('%d-%m-%Y %H:%M:%S')
+        new_note = Note(note_id, title, None, timestamp)
+        self.place_content(new_note, content)
+        self.notes.add(new_note)
+        self.timestamp_index.add(new_note)
+        self.search_index.add(new_note)
+        self.changes.add([('put', new_note.to_dict())])
+        return new_note
+
+    def list_notes(self, page=0, page_size=PAGE_SIZE, sort_by='id', reverse=False, start_date=None, end_date=None):
+        # Печатает одну страницу и возвращает число страниц
         if not self.notes:
             print('Список заметок пуст.')
-            return
-        for note in self.notes:
+            return 0
+        try:
+            notes, _, total = self.page_notes(page_size, sort_by, page, reverse=reverse, start_date=start_date,
+                                              end_date=end_date)
+        except ValueError as e:
+            print(e)
+            return 0
+        if not total:
+            print('Заметки не найдены.')
+            return 0
+        for note in notes:
             print(f'{note.id}. {note.title} (дата: {note.timestamp})')
+        pages = page_count(total, page_size)
+        print(f'Страница {page + 1} из {pages} (всего заметок: {total})')
+        return pages
+
+    def timestamp_bounds(self, start_date=None, end_date=None):
+        try:
+            low = date_key(start_date) if start_date else None
+            high = date_key(end_date) + '\uffff' if end_date else None
+        except ValueError:
+            raise ValueError('Некорректный формат даты.')
+        return low, high
+
+    def page_notes(self, size=PAGE_SIZE, sort_by='id', number=0, after=None, reverse=False, start_date=None,
+                   end_date=None):
+        # Страница заметок за время, пропорциональное размеру страницы: sort_by — 'id' или
+        # 'timestamp' (по дате создания/изменения; с периодом start_date–end_date всегда так).
+        # Страница задаётся номером number или курсором after из предыдущего вызова.
+        # Возвращает (заметки, курсор следующей страницы или None, всего заметок под фильтром)
+        if sort_by not in ('id', 'timestamp'):
+            raise ValueError(f'Неизвестная сортировка: {sort_by}')
+        offset = number * size
+        if start_date or end_date or sort_by == 'timestamp':
+            low, high = self.timestamp_bounds(start_date, end_date)
+            ids, cursor, total = self.timestamp_index.page(size, low, high, after, offset, reverse)
+        else:
+            ids, cursor, total = self.notes.page(size, after, offset, reverse)
+        return [self.notes.get(note_id) for note_id in ids], cursor, total
+
+    def search_notes(self, query, limit=20):
+        results = [(self.notes.get(note_id), score) for note_id, score in self.search_index.search(query, limit)]
+        if results:
+            for note, score in results:
+                print(f'{note.id}. {note.title} (дата: {note.timestamp}, релевантность: {score:.2f})')
+        else:
+            print('Заметки не найдены.')
+        return [note for note, _ in results]
 
     def view_note(self, note_id):
         note = self.get_note_by_id(note_id)
@@ -49,68 +225,106 @@ class NoteManager:
             print('Заметка не найдена.')
 
     def edit_note(self, note_id, new_title, new_content):
-        note = self.get_note_by_id(note_id)
+        with self.batch():
+            note = self._edit_note(note_id, new_title, new_content)
         if note:
-            note.title = new_title
-            note.content = new_content
-            note.timestamp = datetime.datetime.now().strftime('%d-%m-%Y %H:%M:%S')
-            self.save_notes()
             print('Заметка успешно обновлена!')
         else:
             print('Заметка не найдена.')
 
-    def delete_note(self, note_id):
+    def edit_many(self, edits):
+        with self.batch():
+            edited = [note for note in (self._edit_note(*edit) for edit in edits) if note]
+        print(f'Обновлено заметок: {len(edited)}')
+        return edited
+
+    def _edit_note(self, note_id, new_title, new_content):
         note = self.get_note_by_id(note_id)
         if note:
-            self.notes.remove(note)
-            self.save_notes()
+            self.search_index.remove(note)
+            self.timestamp_index.remove(note)
+            note.title = new_title
+            self.place_content(note, new_content)
+            note.timestamp = datetime.datetime.now().strftime('%d-%m-%Y %H:%M:%S')
+            self.timestamp_index.add(note)
+            self.search_index.add(note)
+            self.notes.touch(note)
+            self.changes.add([('put', note.to_dict())])
+        return note
+
+    def delete_note(self, note_id):
+        with self.batch():
+            note = self._delete_note(note_id)
+        if note:
             print('Заметка успешно удалена!')
         else:
             print('Заметка не найдена.')
 
+    def delete_many(self, note_ids):
+        with self.batch():
+            deleted = [note for note in (self._delete_note(note_id) for note_id in note_ids) if note]
+        print(f'Удалено заметок: {len(deleted)}')
+        return deleted
+
+    def _delete_note(self, note_id):
+        note = self.get_note_by_id(note_id)
+        if note:
+            self.notes.remove(note.id)
+            self.timestamp_index.remove(note)
+            self.search_index.remove(note)
+            self.changes.add([('delete', note.id)])
+        return note
+
     def get_note_by_id(self, note_id):
-        for note in self.notes:
-            if note.id == note_id:
-                return note
-        return None
+        return self.notes.get(note_id)
 
-    def export_notes_to_csv(self):
+    def export_notes_to_csv(self, file_name='notes_export.csv', columns=None, start_date=None, end_date=None):
+        # Даты периода — 'ДД-ММ-ГГГГ'; файл .gz или .xz сжимается
         if not self.notes:
             print('Список заметок пуст.')
             return
-        file_name = 'notes_export.csv'
-        with open(file_name, mode='w', encoding='utf-8', newline='') as csv_file:
-            fieldnames = ['ID', 'Заголовок', 'Содержимое', 'Дата']
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-            writer.writeheader()
-            for note in self.notes:
-                writer.writerow({
-                    'ID': note.id,
-                    'Заголовок': note.title,
-                    'Содержимое': note.content,
-                    'Дата': note.timestamp
-                })
-        print(f'Заметки успешно экспортированы в файл {file_name}')
-
-    def import_notes_from_csv(self):
-        file_name = input('Введите имя CSV-файла для импорта: ')
+        notes = iter(self.notes)
+        if start_date or end_date:
+            # Заметки периода берутся из индекса дат, без просмотра всех заметок
+            try:
+                low, high = self.timestamp_bounds(start_date, end_date)
+            except ValueError as e:
+                print(e)
+                return
+            notes = (self.notes.get(note_id) for note_id in self.timestamp_index.range(low, high))
+        try:
+            count = export_csv(file_name, NOTE_EXPORT_COLUMNS, notes, columns)
+        except ValueError as e:
+            print(e)
+            return
+        print(f'Заметки успешно экспортированы в файл {file_name} ({count} шт.)')
+
+    def import_notes_from_csv(self, file_name=None):
+        if file_name is None:
+            file_name = input('Введите имя CSV-файла для импорта: ')
         if not os.path.exists(file_name):
             print('Файл не найден.')
             return
-        with open(file_name, mode='r', encoding='utf-8') as csv_file:
-            reader = csv.DictReader(csv_file)
-            for row in reader:
-                note_id = max([note.id for note in self.notes], default=0) + 1
-                title = row.get('Заголовок', '')
-                content = row.get('Содержимое', '')
-                timestamp = row.get('Дата', datetime.datetime.now().strftime('%d-%m-%Y %H:%M:%S'))
-                new_note = Note(note_id, title, content, timestamp)
-                self.notes.append(new_note)
-            self.save_notes()
-        print('Заметки успешно импортированы из CSV-файла.')
+        imported, errors = import_csv(file_name, note_from_csv_row, self._import_batch, self.notes)
+        print(f'Заметки успешно импортированы из CSV-файла: {imported}, строк с ошибками: {errors}.')
+        if errors:
+            print(f'Ошибки записаны в файл {errors_path(file_name)}')
+
+    def _import_batch(self, rows):
+        new_notes = []
+        with self.batch():
+            for title, content, timestamp in rows:
+                new_note = Note(self.notes.allocate_id(), title, None, timestamp)
+                self.place_content(new_note, content)
+                self.notes.add(new_note)
+                new_notes.append(new_note)
+                self.search_index.add(new_note)
+                self.changes.add([('put', new_note.to_dict())])
+        self.timestamp_index.add_many(new_notes)
 
-def notes_menu():
-    manager = NoteManager()
+def notes_menu(manager=None):
+    if manager is None:
+        manager = NoteManager()
     while True:
         print('\nУправление заметками:')
         print('1. Добавить новую заметку')
@@ -120,14 +334,17 @@ def notes_menu():
         print('5. Удалить заметку')
         print('6. Экспорт заметок в CSV')
         print('7. Импорт заметок из CSV')
-        print('8. Назад')
+        print('8. Поиск заметок')
+        print('9. Назад')
         choice = input('Выберите действие: ')
         if choice == '1':
             title = input('Введите заголовок заметки: ')
             content = input('Введите содержимое заметки: ')
             manager.add_note(title, content)
         elif choice == '2':
-            manager.list_notes()
+            newest_first = input('Сначала новые? (д/Enter — нет): ').strip().lower() == 'д'
+            sort_by = 'timestamp' if newest_first else 'id'
+            browse_pages(lambda number: manager.list_notes(number, sort_by=sort_by, reverse=newest_first))
         elif choice == '3':
             try:
                 note_id = int(input('Введите ID заметки: '))
@@ -149,10 +366,14 @@ def notes_menu():
             except ValueError:
                 print('Некорректный ID.')
         elif choice == '6':
-            manager.export_notes_to_csv()
+            manager.export_menu('notes_export.csv', manager.export_notes_to_csv)
         elif choice == '7':
             manager.import_notes_from_csv()
         elif choice == '8':
+            query = input('Введите слова для поиска: ')
+            manager.search_notes(query)
+        elif choice == '9':
+            manager.close()
             break
         else:
             print('Некорректный выбор. Попробуйте снова.')
\ No newline at end of file
@@ -0,0 +1,20 @@
+# Сколько записей показывать на одной странице списка
+PAGE_SIZE = 20
+
+def page_count(total, size):
+    return max(1, -(-total // size))
+
+def browse_pages(show_page):
+    # Постраничный просмотр в меню: show_page(номер) печатает страницу и возвращает число страниц
+    number = 0
+    while True:
+        pages = show_page(number)
+        if pages <= 1:
+            return
+        answer = input('Enter — следующая страница, номер — перейти к странице, "назад" — выход: ').strip()
+        if not answer and number + 1 < pages:
+            number += 1
+        elif answer.isdigit() and 1 <= int(answer) <= pages:
+            number = int(answer) - 1
+        else:
+            return
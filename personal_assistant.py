@@ -1,12 +1,45 @@
 import os
+import sys
 import json
 import datetime
 import csv
-from notes import notes_menu
-from tasks import tasks_menu
-from contacts import contacts_menu
-from finance import finance_menu
+from load_save_functon import data_signature
+from notes import notes_menu, NoteManager, NOTES_FILE
+from task import tasks_menu, TaskManager, TASKS_FILE
+from contact import contacts_menu, ContactManager, CONTACTS_FILE
+from finances import finance_menu, FinanceManager, FINANCE_FILE
 from calculator import calculator_menu
+from batch_commands import run_cli
+import metrics
+
+class ManagerRegistry:
+    # Менеджеры живут между заходами в меню. Данные перечитываются, только если
+    # файл изменился не через этот процесс: после каждого меню запоминаются
+    # размер и время изменения файлов, получившиеся после наших собственных записей.
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, manager_class, file_path):
+        entry = self.entries.get(manager_class)
+        if entry is None or entry['signature'] != data_signature(file_path):
+            if entry is not None:
+                print('Данные изменены другой программой, загружаем заново...')
+            entry = self.entries[manager_class] = {'manager': manager_class(), 'file_path': file_path}
+            entry['signature'] = data_signature(file_path)
+        return entry['manager']
+
+    def refresh(self):
+        # В режиме sqlite все данные в одной базе, поэтому обновляем все записи, а не только текущую
+        for entry in self.entries.values():
+            entry['signature'] = data_signature(entry['file_path'])
+
+registry = ManagerRegistry()
+
+def open_menu(menu, manager_class, file_path):
+    try:
+        menu(registry.get(manager_class, file_path))
+    finally:
+        registry.refresh()
 
 def main_menu():
     while True:
@@ -18,22 +51,29 @@ def main_menu():
         print('4. Управление финансовыми записями')
         print('5. Калькулятор')
         print('6. Выход')
+        if metrics.ENABLED:
+            print('7. Сохранить метрики')
         choice = input('Введите номер действия: ')
         if choice == '1':
-            notes_menu()
+            open_menu(notes_menu, NoteManager, NOTES_FILE)
         elif choice == '2':
-            tasks_menu()
+            open_menu(tasks_menu, TaskManager, TASKS_FILE)
         elif choice == '3':
-            contacts_menu()
+            open_menu(contacts_menu, ContactManager, CONTACTS_FILE)
         elif choice == '4':
-            finance_menu()
+            open_menu(finance_menu, FinanceManager, FINANCE_FILE)
         elif choice == '5':
-            calculator_menu()
+            calculator_menu(lambda: registry.get(FinanceManager, FINANCE_FILE))
         elif choice == '6':
             print('До свидания!')
             break
+        elif choice == '7' and metrics.ENABLED:
+            print(f'Метрики сохранены в файл {metrics.dump()}')
         else:
             print('Некорректный выбор. Попробуйте снова.')
 
 if __name__ == '__main__':
+    # С аргументами — неинтерактивный режим (см. batch_commands.py), без них — меню
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     main_menu()
\ No newline at end of file
@@ -0,0 +1,222 @@
+import os
+import sys
+import math
+import datetime
+from bisect import bisect_left, bisect_right, insort
+from functools import lru_cache
+from csv_export import export_changes, changes_text, CHECKPOINT_FILE
+import metrics
+
+# Сколько последних удалений помнить для выгрузки изменений (см. RecordCollection.changed_since)
+TOMBSTONE_LIMIT = int(os.environ.get('PA_TOMBSTONE_LIMIT', '1000'))
+
+def intern_value(value):
+    # Повторяющиеся строки (категории, приоритеты, даты) хранятся в одном экземпляре
+    return sys.intern(value) if isinstance(value, str) else value
+
+@lru_cache(maxsize=65536)
+def parse_date(value):
+    # Быстрый разбор 'ДД-ММ-ГГГГ' без strptime; None, если дата некорректна.
+    # Различных дат немного, и кэш заодно даёт один объект date на дату.
+    try:
+        if len(value) != 10 or value[2] != '-' or value[5] != '-':
+            return None
+        return datetime.date(int(value[6:]), int(value[3:5]), int(value[:2]))
+    except (TypeError, ValueError):
+        return None
+
+def page_slice(entries, start, end, size, after=None, offset=0, reverse=False):
+    # Одна страница из отсортированного entries[start:end] за O(log n + size):
+    # после курсора after (последний элемент предыдущей страницы) и/или со сдвигом offset.
+    # Возвращает (элементы страницы, курсор следующей страницы или None)
+    if reverse:
+        if after is not None:
+            end = min(end, bisect_left(entries, after))
+        end = max(start, end - offset)
+        page = entries[max(start, end - size):end][::-1]
+        more = end - size > start
+    else:
+        if after is not None:
+            start = max(start, bisect_right(entries, after))
+        start = min(end, start + offset)
+        page = entries[start:start + size] if start + size <= end else entries[start:end]
+        more = start + size < end
+    return page, (page[-1] if more and page else None)
+
+class RecordCollection:
+    # Записи в порядке добавления с индексом по id и отсортированным списком id для страниц.
+    # next_id никогда не уменьшается, поэтому id удалённых записей не переиспользуются.
+    # Каждое добавление, изменение и удаление получает следующий номер версии: у записи
+    # он хранится в поле version, у удалённых — в deleted (id -> версия, последние
+    # TOMBSTONE_LIMIT удалений); всё это лежит в meta() рядом с next_id.
+    def __init__(self, records=(), meta=None):
+        meta = meta or {}
+        self.by_id = {}
+        for record in records:
+            self.by_id[record.id] = record
+        self.ids = sorted(self.by_id)
+        self.next_id = max(meta.get('next_id', 1), max(self.by_id, default=0) + 1)
+        self.deleted = {record_id: version for record_id, version in meta.get('deleted', [])}
+        # Удаления с версией не больше этой уже забыты
+        self.deleted_before = meta.get('deleted_before', 0)
+        self.versions = SortedIndex(version_key, self.by_id.values())
+        self.version = max(meta.get('version', 0), self.versions.entries[-1][0] if self.versions.entries else 0,
+                           max(self.deleted.values(), default=0))
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, record_id):
+        return record_id in self.by_id
+
+    def get(self, record_id):
+        return self.by_id.get(record_id)
+
+    def allocate_id(self):
+        record_id = self.next_id
+        self.next_id += 1
+        return record_id
+
+    def meta(self):
+        return {'next_id': self.next_id, 'version': self.version, 'deleted_before': self.deleted_before,
+                'deleted': [[record_id, version] for record_id, version in self.deleted.items()]}
+
+    def touch(self, record):
+        # Вызывать после изменения записи и до to_dict(): запись получает новую версию
+        self.versions.remove(record)
+        self.version += 1
+        record.version = self.version
+        self.versions.add(record)
+
+    def add(self, record):
+        previous = self.by_id.get(record.id)
+        if previous is not None:
+            self.versions.remove(previous)
+        else:
+            # Новые id почти всегда больше всех прежних — тогда это просто append
+            if not self.ids or record.id > self.ids[-1]:
+                self.ids.append(record.id)
+            else:
+                insort(self.ids, record.id)
+        self.by_id[record.id] = record
+        if record.id >= self.next_id:
+            self.next_id = record.id + 1
+        self.deleted.pop(record.id, None)
+        self.touch(record)
+
+    def remove(self, record_id):
+        record = self.by_id.pop(record_id, None)
+        if record is not None:
+            del self.ids[bisect_left(self.ids, record_id)]
+            self.versions.remove(record)
+            self.version += 1
+            self.deleted[record_id] = self.version
+            if len(self.deleted) > TOMBSTONE_LIMIT:
+                # Версии удалений растут, поэтому первое в словаре — самое старое
+                self.deleted_before = self.deleted.pop(next(iter(self.deleted)))
+        return record
+
+    def changed_since(self, version):
+        # Записи, добавленные или изменённые после версии version, в порядке изменений,
+        # и id записей, удалённых после неё. None — удаления после version уже забыты.
+        if version < self.deleted_before or version > self.version:
+            return None
+        start, end = self.versions.bounds(version + 1)
+        records = [self.by_id[record_id] for _, record_id in self.versions.entries[start:end]]
+        deleted = [record_id for record_id, deleted_version in self.deleted.items() if deleted_version > version]
+        return records, deleted
+
+    def page(self, size, after=None, offset=0, reverse=False):
+        # Страница id по возрастанию; курсор — id последней записи страницы
+        ids, cursor = page_slice(self.ids, 0, len(self.ids), size, after, offset, reverse)
+        return ids, cursor, len(self.ids)
+
+def version_key(record):
+    # Записи без версии (сохранённые до учёта изменений) в индекс версий не попадают
+    return record.version or None
+
+class SortedIndex:
+    # Пары (ключ, id) в отсортированном списке: выборка диапазона — два bisect и срез.
+    # Записи с ключом None в индекс не попадают. remove() вызывать до изменения записи.
+    def __init__(self, key_func, records=()):
+        self.key_func = key_func
+        self.entries = sorted((key, record.id) for record in records
+                              if (key := key_func(record)) is not None)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, record):
+        key = self.key_func(record)
+        if key is not None:
+            insort(self.entries, (key, record.id))
+
+    def add_many(self, records):
+        # Для массовой вставки дешевле дописать и пересортировать (Timsort сливает готовые участки)
+        self.entries.extend((key, record.id) for record in records if (key := self.key_func(record)) is not None)
+        self.entries.sort()
+
+    def remove(self, record):
+        key = self.key_func(record)
+        if key is None:
+            return
+        position = bisect_left(self.entries, (key, record.id))
+        if position < len(self.entries) and self.entries[position] == (key, record.id):
+            del self.entries[position]
+
+    def bounds(self, low=None, high=None):
+        start = 0 if low is None else bisect_left(self.entries, (low,))
+        end = len(self.entries) if high is None else bisect_right(self.entries, (high, math.inf))
+        return start, end
+
+    def range(self, low, high):
+        start, end = self.bounds(low, high)
+        return [record_id for _, record_id in self.entries[start:end]]
+
+    def page(self, size, low=None, high=None, after=None, offset=0, reverse=False):
+        # Страница id с ключами в [low, high] (None — без границы) в порядке ключа, затем id.
+        # Курсор — пара (ключ, id); из JSON он приходит списком, поэтому приводится к кортежу.
+        # Возвращает (id, курсор следующей страницы или None, всего записей в границах)
+        start, end = self.bounds(low, high)
+        after = tuple(after) if after is not None else None
+        entries, cursor = page_slice(self.entries, start, end, size, after, offset, reverse)
+        return [record_id for _, record_id in entries], cursor, end - start
+
+    def first(self, limit):
+        # limit записей с наименьшими ключами
+        return [record_id for _, record_id in self.entries[:limit]]
+
+@metrics.instrument
+class ManagerMixin:
+    # Общее для менеджеров разделов. Менеджер задаёт DATA_FILE, COLLECTION (имя атрибута
+    # с RecordCollection), EXPORT_COLUMNS и CHANGES_FILE, а в __init__ — self.changes (ChangeBuffer).
+    def batch(self):
+        return self.changes.batch()
+
+    def flush(self):
+        self.changes.flush()
+
+    def set_write_behind(self, max_dirty=None, interval=None):
+        self.changes.set_write_behind(max_dirty, interval)
+
+    def export_changes_to_csv(self, file_name=None, checkpoint_file=CHECKPOINT_FILE, columns=None):
+        # Только записи, добавленные, изменённые или удалённые с прошлой такой выгрузки
+        file_name = file_name or self.CHANGES_FILE
+        try:
+            counts, full = export_changes(file_name, self.EXPORT_COLUMNS, getattr(self, self.COLLECTION),
+                                          checkpoint_file, self.DATA_FILE, columns)
+        except ValueError as e:
+            print(e)
+            return
+        print(f'Изменения выгружены в файл {file_name} ({changes_text(counts, full)})')
+        return counts, full
+
+    def export_menu(self, export_file, export_func):
+        # Пункт меню «Экспорт»: все записи через export_func(имя файла) или только изменения
+        if input('Только изменения с прошлой выгрузки? (да/нет, Enter — нет): ').strip().lower() == 'да':
+            export_file, export_func = self.CHANGES_FILE, self.export_changes_to_csv
+        file_name = input(f'Имя файла (Enter — {export_file}; .gz или .xz — со сжатием): ').strip()
+        export_func(file_name or export_file)
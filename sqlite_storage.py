@@ -0,0 +1,171 @@
+import os
+import json
+import sqlite3
+import argparse
+
+SQLITE_FILE = os.environ.get('PA_SQLITE_FILE', 'assistant.db')
+
+# Таблица для каждого файла данных. Менеджеры загружают таблицу целиком и ищут по своим
+# индексам в памяти, поэтому вторичных индексов SQLite нет: они только замедляли бы запись.
+SCHEMAS = {
+    'notes.json': {
+        'table': 'notes',
+        'columns': [('id', 'INTEGER PRIMARY KEY'), ('title', 'TEXT'), ('content', 'TEXT'), ('timestamp', 'TEXT'),
+                    ('version', 'INTEGER')],
+    },
+    'tasks.json': {
+        'table': 'tasks',
+        'columns': [('id', 'INTEGER PRIMARY KEY'), ('title', 'TEXT'), ('description', 'TEXT'), ('done', 'INTEGER'),
+                    ('priority', 'TEXT'), ('due_date', 'TEXT'), ('version', 'INTEGER')],
+    },
+    'contacts.json': {
+        'table': 'contacts',
+        'columns': [('id', 'INTEGER PRIMARY KEY'), ('name', 'TEXT'), ('phone', 'TEXT'), ('email', 'TEXT'),
+                    ('version', 'INTEGER')],
+    },
+    'finance.json': {
+        'table': 'finance',
+        'columns': [('id', 'INTEGER PRIMARY KEY'), ('amount', 'REAL'), ('category', 'TEXT'), ('date', 'TEXT'),
+                    ('description', 'TEXT'), ('version', 'INTEGER')],
+    },
+}
+
+BOOL_COLUMNS = {'done'}
+
+_connections = {}
+
+def get_schema(file_path):
+    schema = SCHEMAS.get(os.path.basename(file_path))
+    if schema is None:
+        raise ValueError(f'Нет таблицы SQLite для файла {file_path}')
+    return schema
+
+def get_connection(db_path=None):
+    db_path = db_path or SQLITE_FILE
+    conn = _connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        for schema in SCHEMAS.values():
+            create_table(conn, schema)
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (file TEXT PRIMARY KEY, data TEXT)')
+        _connections[db_path] = conn
+    return conn
+
+def close_connections():
+    # Нужно при смене рабочего каталога: относительный путь к базе указывает уже на другой файл
+    for conn in _connections.values():
+        conn.close()
+    _connections.clear()
+
+def create_table(conn, schema):
+    table = schema['table']
+    columns = [f'{name} {kind}' for name, kind in schema['columns']]
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({", ".join(columns)})')
+    # Столбцы, появившиеся после создания базы (например, version), добавляются пустыми
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for column in columns:
+        if column.split(' ', 1)[0] not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column}')
+    # Индексы из прежних версий базы (idx_<таблица>_<столбец>) больше не нужны
+    old_indexes = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND name LIKE ?",
+                               (table, f'idx_{table}_%')).fetchall()
+    for row in old_indexes:
+        conn.execute(f'DROP INDEX IF EXISTS {row[0]}')
+
+def record_to_row(schema, record):
+    return [record.get(name) for name, _ in schema['columns']]
+
+def row_to_record(schema, row):
+    record = {}
+    for name, _ in schema['columns']:
+        value = row[name]
+        record[name] = bool(value) if name in BOOL_COLUMNS else value
+    return record
+
+def upsert_sql(schema):
+    names = [name for name, _ in schema['columns']]
+    placeholders = ', '.join('?' for _ in names)
+    return f'INSERT OR REPLACE INTO {schema["table"]} ({", ".join(names)}) VALUES ({placeholders})'
+
+def sqlite_load(file_path):
+    schema = get_schema(file_path)
+    rows = get_connection().execute(f'SELECT * FROM {schema["table"]} ORDER BY id')
+    return [row_to_record(schema, row) for row in rows]
+
+def sqlite_save(file_path, data, db_path=None, meta=None):
+    # Записи и служебные данные файла — одной транзакцией
+    schema = get_schema(file_path)
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute(f'DELETE FROM {schema["table"]}')
+        conn.executemany(upsert_sql(schema), (record_to_row(schema, record) for record in data))
+        if meta is not None:
+            write_meta(conn, file_path, meta)
+
+def sqlite_apply(file_path, changes, meta=None):
+    schema = get_schema(file_path)
+    conn = get_connection()
+    sql = upsert_sql(schema)
+    with conn:
+        for op, value in changes:
+            if op == 'put':
+                conn.execute(sql, record_to_row(schema, value))
+            else:
+                conn.execute(f'DELETE FROM {schema["table"]} WHERE id = ?', (value,))
+        if meta is not None:
+            write_meta(conn, file_path, meta)
+
+def sqlite_load_meta(file_path):
+    row = get_connection().execute('SELECT data FROM meta WHERE file = ?', (os.path.basename(file_path),)).fetchone()
+    return json.loads(row['data']) if row else {}
+
+def sqlite_signature(file_path):
+    # Состояние одной таблицы: изменения других таблиц базы его не меняют
+    schema = get_schema(file_path)
+    conn = get_connection()
+    count, version = conn.execute(f'SELECT COUNT(*), MAX(version) FROM {schema["table"]}').fetchone()
+    return [count, version, sqlite_load_meta(file_path).get('version')]
+
+def write_meta(conn, file_path, meta):
+    conn.execute('INSERT OR REPLACE INTO meta (file, data) VALUES (?, ?)',
+                 (os.path.basename(file_path), json.dumps(meta, ensure_ascii=False)))
+
+def migrate_json_to_sqlite(file_paths=None, db_path=None, force=False):
+    # Разовый перенос существующих JSON-файлов (вместе с журналом) в базу
+    from load_save_functon import read_data
+    conn = get_connection(db_path)
+    for file_path in file_paths or list(SCHEMAS):
+        schema = get_schema(file_path)
+        if not os.path.exists(file_path):
+            continue
+        count = conn.execute(f'SELECT COUNT(*) FROM {schema["table"]}').fetchone()[0]
+        if count and not force:
+            print(f'Таблица {schema["table"]} уже заполнена, файл {file_path} пропущен.')
+            continue
+        data, meta = read_data(file_path, [])
+        if any('body' in record for record in data):
+            # Заметки в раздельной раскладке: тексты берём из файлов текстов
+            from note_bodies import NoteBodyStore
+            bodies = NoteBodyStore(file_path + '.bodies')
+            for record in data:
+                if 'body' in record:
+                    record['content'] = bodies.read(record.pop('body'))
+        sqlite_save(file_path, data, db_path, meta)
+        print(f'Перенесено записей из {file_path}: {len(data)}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Перенос файлов данных (JSON или двоичный снимок и журнал) в базу SQLite')
+    parser.add_argument('files', nargs='*', help=f'файлы данных (по умолчанию все: {", ".join(SCHEMAS)})')
+    parser.add_argument('--db', default=None, help=f'файл базы (по умолчанию {SQLITE_FILE})')
+    parser.add_argument('--force', action='store_true', help='перезаписать уже заполненные таблицы')
+    args = parser.parse_args()
+    try:
+        migrate_json_to_sqlite(args.files or None, args.db, args.force)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        parser.exit(1, f'Ошибка: {e}\n')
+
+if __name__ == '__main__':
+    main()
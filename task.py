@@ -1,138 +1,342 @@
-from load_save_functions import *
-import csv
+from load_save_functon import *
+import metrics
+from record_collection import RecordCollection, ManagerMixin, SortedIndex, intern_value, parse_date
+from csv_import import import_csv, errors_path
+from csv_export import export_csv
+from pager import PAGE_SIZE, page_count, browse_pages
+import datetime
 
 TASKS_FILE = 'tasks.json'
+# Порядок приоритетов для выборки самых важных задач; прочие значения идут последними
+PRIORITY_ORDER = {'Высокий': 0, 'Средний': 1, 'Низкий': 2}
+TASK_EXPORT_COLUMNS = {
+    'ID': lambda task: task.id,
+    'Название': lambda task: task.title,
+    'Описание': lambda task: task.description,
+    'Статус': lambda task: 'Выполнена' if task.done else 'Не выполнена',
+    'Приоритет': lambda task: task.priority,
+    'Срок выполнения': lambda task: task.due_date,
+}
+
+def task_from_csv_row(row):
+    status = row.get('Статус', 'Не выполнена')
+    if status not in ('Выполнена', 'Не выполнена'):
+        raise ValueError(f'неизвестный статус {status!r}')
+    due_date = row.get('Срок выполнения') or None
+    if due_date is not None:
+        try:
+            datetime.datetime.strptime(due_date, '%d-%m-%Y')
+        except ValueError:
+            raise ValueError(f'некорректный срок выполнения {due_date!r}')
+    return (row.get('Название', ''), row.get('Описание', ''), status == 'Выполнена',
+            row.get('Приоритет', 'Средний'), due_date)
+
+def due_key(task):
+    # Ключ индекса сроков: только невыполненные задачи с корректным сроком
+    return None if task.done else task.due_value
+
+def rank_key(task):
+    # Ключ индекса важности: приоритет, затем срок (задачи без срока — в конце)
+    if task.done:
+        return None
+    return PRIORITY_ORDER.get(task.priority, len(PRIORITY_ORDER)), task.due_value or datetime.date.max
+
+def priority_key(task):
+    # Ключ индекса для фильтра по приоритету (и, при необходимости, по статусу):
+    # внутри приоритета сначала невыполненные задачи, затем выполненные
+    return task.priority or '', task.done
+
+def format_task(task):
+    status = 'Выполнена' if task.done else 'Не выполнена'
+    return f'{task.id}. {task.title} [{status}] (Приоритет: {task.priority}, Срок: {task.due_date})'
 
 class Task:
+    # Приоритет и срок повторяются у многих задач, поэтому строки интернируются
+    # и все задачи ссылаются на один объект строки; due_value — разобранный срок
+    __slots__ = ('id', 'title', 'description', 'done', 'priority', 'due_date', 'due_value', 'version')
+
     def __init__(self, task_id, title, description, done=False, priority='Средний', due_date=None):
         self.id = task_id
         self.title = title
         self.description = description
         self.done = done
-        self.priority = priority
-        self.due_date = due_date
+        self.priority = intern_value(priority)
+        self.due_date = intern_value(due_date)
+        self.due_value = parse_date(due_date)
+        self.version = 0
+
+    def to_dict(self):
+        return {'id': self.id, 'title': self.title, 'description': self.description, 'done': self.done,
+                'priority': self.priority, 'due_date': self.due_date, 'version': self.version}
+
+    @classmethod
+    def from_dict(cls, data):
+        task = cls(data['id'], data['title'], data['description'], data.get('done', False),
+                   data.get('priority', 'Средний'), data.get('due_date'))
+        task.version = data.get('version') or 0
+        return task
+
+@metrics.instrument
+class TaskManager(ManagerMixin):
+    DATA_FILE = TASKS_FILE
+    COLLECTION = 'tasks'
+    EXPORT_COLUMNS = TASK_EXPORT_COLUMNS
+    CHANGES_FILE = 'tasks_changes.csv'
 
-class TaskManager:
     def __init__(self):
-        self.tasks = []
+        self.tasks = RecordCollection()
+        self.changes = ChangeBuffer(self.save_tasks)
         self.load_tasks()
 
     def load_tasks(self):
         data = load_data(TASKS_FILE, [])
-        self.tasks = [Task(**task) for task in data]
+        tasks = (Task.from_dict(task) for task in data)
+        self.tasks = RecordCollection(tasks, load_meta(TASKS_FILE))
+        # Невыполненные задачи по сроку и по (приоритет, срок): выборки без обхода всех задач
+        self.due_index = SortedIndex(due_key, self.tasks)
+        self.rank_index = SortedIndex(rank_key, self.tasks)
+        # Вторичные индексы для фильтров при постраничном просмотре
+        self.status_index = SortedIndex(lambda task: task.done, self.tasks)
+        self.priority_index = SortedIndex(priority_key, self.tasks)
 
-    def save_tasks(self):
-        data = [task.__dict__ for task in self.tasks]
-        save_data(TASKS_FILE, data)
+    def save_tasks(self, changes=None):
+        meta = self.tasks.meta()
+        if not (changes and append_changes(TASKS_FILE, changes, meta)):
+            data = [task.to_dict() for task in self.tasks]
+            save_data(TASKS_FILE, data, meta)
 
     def add_task(self, title, description, priority, due_date):
-        task_id = max([task.id for task in self.tasks], default=0) + 1
-        new_task = Task(task_id, title, description, False, priority, due_date)
-        self.tasks.append(new_task)
-        self.save_tasks()
+        with self.batch():
+            self._add_task(title, description, priority, due_date)
         print('Задача успешно добавлена!')
 
-    def list_tasks(self, filter_by=None):
+    def add_many(self, tasks):
+        with self.batch():
+            added = [self._add_task(*task) for task in tasks]
+        print(f'Добавлено задач: {len(added)}')
+        return added
+
+    def _add_task(self, title, description, priority, due_date):
+        task_id = self.tasks.allocate_id()
+        new_task = Task(task_id, title, description, False, priority, due_date)
+        self.tasks.add(new_task)
+        self._index_task(new_task)
+        self.changes.add([('put', new_task.to_dict())])
+        return new_task
+
+    def _index_task(self, task):
+        for index in self._indexes():
+            index.add(task)
+
+    def _unindex_task(self, task):
+        # Вызывать до изменения задачи: индекс ищет запись по старому ключу
+        for index in self._indexes():
+            index.remove(task)
+
+    def _indexes(self):
+        return self.due_index, self.rank_index, self.status_index, self.priority_index
+
+    def list_tasks(self, filter_by=None, page=0, page_size=PAGE_SIZE, priority=None, sort_by='id'):
+        # Печатает одну страницу и возвращает число страниц
         if not self.tasks:
             print('Список задач пуст.')
-            return
-        filtered_tasks = self.tasks
-        if filter_by == 'done':
-            filtered_tasks = [task for task in self.tasks if task.done]
-        elif filter_by == 'not_done':
-            filtered_tasks = [task for task in self.tasks if not task.done]
-        for task in filtered_tasks:
-            status = 'Выполнена' if task.done else 'Не выполнена'
-            print(f'{task.id}. {task.title} [{status}] (Приоритет: {task.priority}, Срок: {task.due_date})')
+            return 0
+        try:
+            tasks, _, total = self.page_tasks(page_size, filter_by, priority, sort_by, page)
+        except ValueError as e:
+            print(e)
+            return 0
+        if not total:
+            print('Задачи не найдены.')
+            return 0
+        for task in tasks:
+            print(format_task(task))
+        pages = page_count(total, page_size)
+        print(f'Страница {page + 1} из {pages} (всего задач: {total})')
+        return pages
+
+    def page_tasks(self, size=PAGE_SIZE, filter_by=None, priority=None, sort_by='id', number=0, after=None,
+                   reverse=False):
+        # Страница задач из подходящего индекса за время, пропорциональное размеру страницы.
+        # filter_by — 'done' или 'not_done', priority — значение приоритета,
+        # sort_by — 'id', 'due' или 'priority' (по сроку и по важности — только невыполненные).
+        # Страница задаётся номером number или курсором after из предыдущего вызова.
+        # Возвращает (задачи, курсор следующей страницы или None, всего задач под фильтром)
+        if filter_by not in (None, 'done', 'not_done'):
+            raise ValueError(f'Неизвестный фильтр: {filter_by}')
+        offset = number * size
+        if sort_by in ('due', 'priority'):
+            if filter_by == 'done' or priority is not None:
+                raise ValueError('Сортировка по сроку и важности доступна только для всех невыполненных задач.')
+            index = self.due_index if sort_by == 'due' else self.rank_index
+            ids, cursor, total = index.page(size, after=after, offset=offset, reverse=reverse)
+        elif sort_by != 'id':
+            raise ValueError(f'Неизвестная сортировка: {sort_by}')
+        elif priority is not None:
+            low, high = (priority, False), (priority, True)
+            if filter_by is not None:
+                low = high = (priority, filter_by == 'done')
+            ids, cursor, total = self.priority_index.page(size, low, high, after, offset, reverse)
+        elif filter_by is not None:
+            done = filter_by == 'done'
+            ids, cursor, total = self.status_index.page(size, done, done, after, offset, reverse)
+        else:
+            ids, cursor, total = self.tasks.page(size, after, offset, reverse)
+        return [self.tasks.get(task_id) for task_id in ids], cursor, total
+
+    def print_tasks(self, tasks, empty_message):
+        if not tasks:
+            print(empty_message)
+        for task in tasks:
+            print(format_task(task))
+        return tasks
+
+    def overdue_tasks(self, today=None):
+        today = today or datetime.date.today()
+        record_ids = self.due_index.range(datetime.date.min, today - datetime.timedelta(days=1))
+        return self.print_tasks([self.tasks.get(task_id) for task_id in record_ids], 'Просроченных задач нет.')
+
+    def tasks_due_within(self, days, today=None):
+        # Невыполненные задачи со сроком от сегодня до сегодня + days включительно
+        today = today or datetime.date.today()
+        record_ids = self.due_index.range(today, today + datetime.timedelta(days=days))
+        return self.print_tasks([self.tasks.get(task_id) for task_id in record_ids],
+                                f'Задач со сроком в ближайшие {days} дн. нет.')
+
+    def top_tasks(self, limit=10):
+        # Самые важные невыполненные задачи: по приоритету, затем по сроку
+        record_ids = self.rank_index.first(limit)
+        return self.print_tasks([self.tasks.get(task_id) for task_id in record_ids], 'Невыполненных задач нет.')
 
     def mark_task_done(self, task_id):
-        task = self.get_task_by_id(task_id)
+        with self.batch():
+            task = self._mark_task_done(task_id)
         if task:
-            task.done = True
-            self.save_tasks()
             print('Задача отмечена как выполненная!')
         else:
             print('Задача не найдена.')
 
-    def edit_task(self, task_id, title, description, priority, due_date):
+    def mark_many(self, task_ids):
+        with self.batch():
+            marked = [task for task in (self._mark_task_done(task_id) for task_id in task_ids) if task]
+        print(f'Отмечено выполненными задач: {len(marked)}')
+        return marked
+
+    def _mark_task_done(self, task_id):
         task = self.get_task_by_id(task_id)
         if task:
-            task.title = title
-            task.description = description
-            task.priority = priority
-            task.due_date = due_date
-            self.save_tasks()
+            self._unindex_task(task)
+            task.done = True
+            self._index_task(task)
+            self.tasks.touch(task)
+            self.changes.add([('put', task.to_dict())])
+        return task
+
+    def edit_task(self, task_id, title, description, priority, due_date):
+        with self.batch():
+            task = self._edit_task(task_id, title, description, priority, due_date)
+        if task:
             print('Задача успешно обновлена!')
         else:
             print('Задача не найдена.')
 
-    def delete_task(self, task_id):
+    def edit_many(self, edits):
+        with self.batch():
+            edited = [task for task in (self._edit_task(*edit) for edit in edits) if task]
+        print(f'Обновлено задач: {len(edited)}')
+        return edited
+
+    def _edit_task(self, task_id, title, description, priority, due_date):
         task = self.get_task_by_id(task_id)
         if task:
-            self.tasks.remove(task)
-            self.save_tasks()
+            self._unindex_task(task)
+            task.title = title
+            task.description = description
+            task.priority = intern_value(priority)
+            task.due_date = intern_value(due_date)
+            task.due_value = parse_date(due_date)
+            self._index_task(task)
+            self.tasks.touch(task)
+            self.changes.add([('put', task.to_dict())])
+        return task
+
+    def delete_task(self, task_id):
+        with self.batch():
+            task = self._delete_task(task_id)
+        if task:
             print('Задача успешно удалена!')
         else:
             print('Задача не найдена.')
 
+    def delete_many(self, task_ids):
+        with self.batch():
+            deleted = [task for task in (self._delete_task(task_id) for task_id in task_ids) if task]
+        print(f'Удалено задач: {len(deleted)}')
+        return deleted
+
+    def _delete_task(self, task_id):
+        task = self.get_task_by_id(task_id)
+        if task:
+            self.tasks.remove(task.id)
+            self._unindex_task(task)
+            self.changes.add([('delete', task.id)])
+        return task
+
     def get_task_by_id(self, task_id):
-        for task in self.tasks:
-            if task.id == task_id:
-                return task
-        return None
+        return self.tasks.get(task_id)
 
-    def export_tasks_to_csv(self):
+    def export_tasks_to_csv(self, file_name='tasks_export.csv', columns=None, done=None, priority=None):
+        # done — True/False для выполненных/невыполненных, None — все задачи
         if not self.tasks:
             print('Список задач пуст.')
             return
-        file_name = 'tasks_export.csv'
-        with open(file_name, mode='w', encoding='utf-8', newline='') as csv_file:
-            fieldnames = ['ID', 'Название', 'Описание', 'Статус', 'Приоритет', 'Срок выполнения']
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-            writer.writeheader()
-            for task in self.tasks:
-                writer.writerow({
-                    'ID': task.id,
-                    'Название': task.title,
-                    'Описание': task.description,
-                    'Статус': 'Выполнена' if task.done else 'Не выполнена',
-                    'Приоритет': task.priority,
-                    'Срок выполнения': task.due_date
-                })
-        print(f'Задачи успешно экспортированы в файл {file_name}')
-
-    def import_tasks_from_csv(self):
-        file_name = input('Введите имя CSV-файла для импорта: ')
+        tasks = (task for task in self.tasks
+                 if (done is None or task.done == done) and (priority is None or task.priority == priority))
+        try:
+            count = export_csv(file_name, TASK_EXPORT_COLUMNS, tasks, columns)
+        except ValueError as e:
+            print(e)
+            return
+        print(f'Задачи успешно экспортированы в файл {file_name} ({count} шт.)')
+
+    def import_tasks_from_csv(self, file_name=None):
+        if file_name is None:
+            file_name = input('Введите имя CSV-файла для импорта: ')
         if not os.path.exists(file_name):
             print('Файл не найден.')
             return
-        with open(file_name, mode='r', encoding='utf-8') as csv_file:
-            reader = csv.DictReader(csv_file)
-            for row in reader:
-                task_id = max([task.id for task in self.tasks], default=0) + 1
-                title = row.get('Название', '')
-                description = row.get('Описание', '')
-                status = row.get('Статус', 'Не выполнена')
-                done = True if status == 'Выполнена' else False
-                priority = row.get('Приоритет', 'Средний')
-                due_date = row.get('Срок выполнения', None)
-                new_task = Task(task_id, title, description, done, priority, due_date)
-                self.tasks.append(new_task)
-            self.save_tasks()
-        print('Задачи успешно импортированы из CSV-файла.')
-
-def tasks_menu():
-    manager = TaskManager()
+        imported, errors = import_csv(file_name, task_from_csv_row, self._import_batch, self.tasks)
+        print(f'Задачи успешно импортированы из CSV-файла: {imported}, строк с ошибками: {errors}.')
+        if errors:
+            print(f'Ошибки записаны в файл {errors_path(file_name)}')
+
+    def _import_batch(self, rows):
+        new_tasks = []
+        with self.batch():
+            for title, description, done, priority, due_date in rows:
+                new_task = Task(self.tasks.allocate_id(), title, description, done, priority, due_date)
+                self.tasks.add(new_task)
+                new_tasks.append(new_task)
+                self.changes.add([('put', new_task.to_dict())])
+        for index in self._indexes():
+            index.add_many(new_tasks)
+
+def tasks_menu(manager=None):
+    if manager is None:
+        manager = TaskManager()
     while True:
         print('\nУправление задачами:')
         print('1. Добавить новую задачу')
-        print('2. Просмотреть все задачи')
+        print('2. Просмотреть задачи')
         print('3. Отметить задачу как выполненную')
         print('4. Редактировать задачу')
         print('5. Удалить задачу')
         print('6. Экспорт задач в CSV')
         print('7. Импорт задач из CSV')
-        print('8. Назад')
+        print('8. Просроченные задачи')
+        print('9. Задачи на ближайшие дни')
+        print('10. Самые важные задачи')
+        print('11. Назад')
         choice = input('Выберите действие: ')
         if choice == '1':
             title = input('Введите название задачи: ')
@@ -141,7 +345,12 @@ def tasks_menu():
             due_date = input('Введите срок выполнения (в формате ДД-ММ-ГГГГ): ')
             manager.add_task(title, description, priority, due_date)
         elif choice == '2':
-            manager.list_tasks()
+            view = input('Показать: Enter — все, 1 — невыполненные, 2 — выполненные, 3 — по приоритету, '
+                         '4 — невыполненные по сроку: ').strip()
+            filter_by = {'1': 'not_done', '2': 'done'}.get(view)
+            priority = input('Введите приоритет: ') if view == '3' else None
+            sort_by = 'due' if view == '4' else 'id'
+            browse_pages(lambda number: manager.list_tasks(filter_by, number, priority=priority, sort_by=sort_by))
         elif choice == '3':
             try:
                 task_id = int(input('Введите ID задачи: '))
@@ -165,10 +374,25 @@ def tasks_menu():
             except ValueError:
                 print('Некорректный ID.')
         elif choice == '6':
-            manager.export_tasks_to_csv()
+            manager.export_menu('tasks_export.csv', manager.export_tasks_to_csv)
         elif choice == '7':
             manager.import_tasks_from_csv()
         elif choice == '8':
+            manager.overdue_tasks()
+        elif choice == '9':
+            try:
+                days = int(input('На сколько дней вперёд (Enter — 7): ') or 7)
+                manager.tasks_due_within(days)
+            except ValueError:
+                print('Некорректное число дней.')
+        elif choice == '10':
+            try:
+                limit = int(input('Сколько задач показать (Enter — 10): ') or 10)
+                manager.top_tasks(limit)
+            except ValueError:
+                print('Некорректное число задач.')
+        elif choice == '11':
+            manager.flush()
             break
         else:
             print('Некорректный выбор. Попробуйте снова.')
\ No newline at end of file
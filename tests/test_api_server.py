@@ -0,0 +1,94 @@
+import time
+import asyncio
+import threading
+import pytest
+import atomic_files
+import api_server
+import batch_commands
+from task import TaskManager
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(atomic_files, 'FSYNC', False)
+    return tmp_path
+
+def run_server(scenario):
+    async def main():
+        server = api_server.AssistantServer()
+        await server.start()
+        try:
+            return await scenario(server)
+        finally:
+            await server.stop()
+    return asyncio.run(main())
+
+def test_writes_are_saved_in_order(work_dir):
+    async def scenario(server):
+        return await server.execute_many([
+            {'command': 'tasks.add', 'title': 'первая', 'ref': 1},
+            {'command': 'tasks.add', 'title': 'вторая', 'ref': 2},
+            {'command': 'tasks.list', 'ref': 3},
+            {'command': 'tasks.done', 'id': 1, 'ref': 4},
+            {'command': 'tasks.delete', 'id': 99, 'ref': 5},
+        ])
+    results = run_server(scenario)
+    assert [result['ref'] for result in results] == [1, 2, 3, 4, 5]
+    assert [result['ok'] for result in results] == [True, True, True, True, False]
+    # Чтение после изменений в том же запросе видит их
+    assert [item['title'] for item in results[2]['result']['items']] == ['первая', 'вторая']
+    tasks = TaskManager().tasks
+    assert [(task.id, task.title, task.done) for task in tasks] == [(1, 'первая', True), (2, 'вторая', False)]
+
+def test_slow_read_does_not_block_other_requests(work_dir, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    list_tasks = batch_commands.COMMANDS['tasks.list']
+
+    def slow_list(manager, args):
+        started.set()
+        release.wait(5)
+        return list_tasks(manager, args)
+    monkeypatch.setitem(batch_commands.COMMANDS, 'tasks.list', slow_list)
+
+    async def scenario(server):
+        began = time.perf_counter()
+        slow = asyncio.ensure_future(server.execute({'command': 'tasks.list'}))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        health = await server.route('GET', '/health', b'')
+        top = await server.execute({'command': 'tasks.top'})
+        elapsed = time.perf_counter() - began
+        release.set()
+        return health, top, await slow, elapsed
+    health, top, slow, elapsed = run_server(scenario)
+    assert health[0] == 200 and top[0] == 200 and slow[0] == 200
+    assert elapsed < 1
+
+def test_write_waits_for_reads_and_blocks_new_ones():
+    lock = api_server.ReadWriteLock()
+    events = []
+    reading = threading.Event()
+
+    def reader():
+        with lock.reading():
+            reading.set()
+            time.sleep(0.2)
+            events.append('read')
+
+    def writer():
+        with lock.writing():
+            events.append('write')
+
+    first = threading.Thread(target=reader)
+    first.start()
+    reading.wait()
+    second = threading.Thread(target=writer)
+    second.start()
+    while not lock.waiting_writers:
+        time.sleep(0.01)
+    # Новое чтение не обгоняет ждущего писателя
+    reading.clear()
+    third = threading.Thread(target=reader)
+    third.start()
+    for thread in (first, second, third):
+        thread.join()
+    assert events == ['read', 'write', 'read']
@@ -0,0 +1,113 @@
+import os
+import stat
+import time
+import threading
+import multiprocessing
+import pytest
+import atomic_files
+from atomic_files import atomic_open, file_lock, GroupCommit
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(atomic_files, 'FSYNC', False)
+    return tmp_path
+
+def mode_of(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+def test_new_file_gets_default_permissions(work_dir):
+    with atomic_open('new.json') as f:
+        f.write('{}')
+    with open('plain.json', 'w') as f:
+        f.write('{}')
+    assert mode_of('new.json') == mode_of('plain.json') == atomic_files.NEW_FILE_MODE
+
+def test_existing_file_keeps_permissions(work_dir):
+    with open('data.json', 'w') as f:
+        f.write('old')
+    os.chmod('data.json', 0o640)
+    with atomic_open('data.json') as f:
+        f.write('new')
+    assert mode_of('data.json') == 0o640
+    with open('data.json') as f:
+        assert f.read() == 'new'
+
+def test_failed_write_keeps_old_file(work_dir):
+    with open('data.json', 'w') as f:
+        f.write('old')
+    with pytest.raises(ValueError):
+        with atomic_open('data.json') as f:
+            f.write('new')
+            raise ValueError
+    with open('data.json') as f:
+        assert f.read() == 'old'
+    assert os.listdir('.') == ['data.json']
+
+def test_group_commit_writes_waiting_items_together(work_dir):
+    writes = []
+    first_started, release = threading.Event(), threading.Event()
+
+    def write(items):
+        writes.append(list(items))
+        first_started.set()
+        release.wait(5)
+
+    group_commit = GroupCommit(write)
+    first = threading.Thread(target=group_commit.submit, args=(0,))
+    first.start()
+    first_started.wait()
+    # Пока идёт первая запись, остальные запросы копятся в одну группу
+    others = [threading.Thread(target=group_commit.submit, args=(item,)) for item in (1, 2, 3)]
+    for thread in others:
+        thread.start()
+    while len(group_commit.group.items) < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [first] + others:
+        thread.join()
+    assert writes[0] == [0]
+    assert len(writes) == 2 and sorted(writes[1]) == [1, 2, 3]
+
+def test_group_commit_raises_write_error(work_dir):
+    def write(items):
+        raise OSError('диск заполнен')
+
+    with pytest.raises(OSError):
+        GroupCommit(write).submit(1)
+
+def test_file_lock_is_reentrant_and_shared_by_path(work_dir):
+    lock = file_lock('data.json')
+    assert file_lock(os.path.abspath('data.json')) is lock
+    with lock:
+        with lock:
+            assert lock.depth == 2
+    assert lock.depth == 0 and lock.fd is None
+
+def hold_lock(path, locked, release):
+    with atomic_files.FileLock(path):
+        locked.set()
+        release.wait(5)
+
+@pytest.mark.skipif(atomic_files.fcntl is None, reason='блокировка между процессами через fcntl')
+def test_file_lock_excludes_other_process(work_dir):
+    context = multiprocessing.get_context('fork')
+    locked, release = context.Event(), context.Event()
+    holder = context.Process(target=hold_lock, args=(str(work_dir / 'data.json'), locked, release))
+    holder.start()
+    try:
+        assert locked.wait(5)
+        acquired = threading.Event()
+
+        def take():
+            with file_lock('data.json'):
+                acquired.set()
+        taker = threading.Thread(target=take)
+        taker.start()
+        assert not acquired.wait(0.3)
+        release.set()
+        assert acquired.wait(5)
+        taker.join()
+    finally:
+        release.set()
+        holder.join()
@@ -0,0 +1,74 @@
+import io
+import json
+import threading
+import pytest
+import atomic_files
+import batch_commands
+from batch_commands import run_commands, read_commands, run_cli, quiet
+from task import TaskManager
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(atomic_files, 'FSYNC', False)
+    return tmp_path
+
+def run_lines(lines):
+    output = io.StringIO()
+    failed = run_commands(read_commands(lines), output)
+    return failed, [json.loads(line) for line in output.getvalue().splitlines()]
+
+def test_failed_commands_do_not_stop_the_run(work_dir, capsys):
+    failed, results = run_lines([
+        '{"command": "calc.evaluate", "expression": "1/0", "ref": "a"}',
+        '{"command": "tasks.add", "title": "Купить хлеб", "due_date": "01-02-2024", "ref": "b"}',
+        'не JSON',
+        '{"command": "tasks.add", "title": "Срок", "due_date": "2024-02-01"}',
+        '{"command": "tasks.nothing"}',
+        '["не объект"]',
+        '',
+        '{"command": "tasks.done", "id": 1}',
+        '{"command": "tasks.get", "id": "один"}',
+        '{"command": "calc.evaluate", "expression": "x * 2", "variables": {"x": 21}}',
+        '{"command": "tasks.list"}',
+    ])
+    assert failed == 6
+    assert [result['ok'] for result in results] == [False, True, False, False, False, False, True, False, True, True]
+    assert results[0]['ref'] == 'a' and results[1]['ref'] == 'b'
+    assert 'Строка 3' in results[2]['error']
+    assert 'due_date' in results[3]['error']
+    assert results[8]['result'] == 42
+    assert [(task['title'], task['done']) for task in results[9]['result']['items']] == [('Купить хлеб', True)]
+    # Сообщения менеджеров для человека не попадают в вывод
+    assert capsys.readouterr().out == ''
+    assert [(task.title, task.done) for task in TaskManager().tasks] == [('Купить хлеб', True)]
+
+def test_single_command_from_arguments(work_dir, capsys):
+    assert run_cli(['tasks.add', 'title=Позвонить', 'priority=Высокий']) == 0
+    assert run_cli(['tasks.top', 'limit=1']) == 0
+    assert run_cli(['tasks.get', 'id']) == 2
+    lines = capsys.readouterr().out.splitlines()
+    assert json.loads(lines[1])['result'][0]['title'] == 'Позвонить'
+
+def test_every_command_has_a_known_section():
+    for name in batch_commands.COMMANDS:
+        section = name.split('.', 1)[0]
+        assert section in batch_commands.MANAGERS or section == 'calc', name
+
+def test_quiet_only_silences_its_own_thread(capsys):
+    inside, printed = threading.Event(), threading.Event()
+
+    def other():
+        inside.wait(5)
+        print('из другого потока')
+        printed.set()
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    with quiet():
+        print('скрыто')
+        inside.set()
+        printed.wait(5)
+    thread.join()
+    print('снова видно')
+    assert capsys.readouterr().out == 'из другого потока\nснова видно\n'
@@ -0,0 +1,54 @@
+import json
+import binary_snapshot
+from binary_snapshot import encode, decode, decode_snapshot, read_snapshot, write_file, file_format
+
+RECORDS = [
+    {'id': 1, 'amount': 10.5, 'done': True, 'title': 'Первая', 'category': 'Еда', 'tags': ['a'], 'note': None},
+    {'id': 2, 'amount': -3.25, 'done': False, 'title': 'Вторая', 'category': 'Еда', 'tags': [], 'note': 'x'},
+    {'id': 3, 'amount': 0.0, 'done': False, 'title': '', 'category': 'Еда', 'tags': None, 'note': None},
+    {'id': 4, 'amount': 7.0, 'done': True, 'title': 'с\nпереводом', 'category': 'Еда', 'tags': [1], 'note': 'y'},
+]
+
+def test_round_trip_columns():
+    assert decode(encode(RECORDS)) == RECORDS
+
+def test_round_trip_nulls_and_mixed_types():
+    data = [{'a': 1, 'b': None, 'c': 'x\0y'}, {'a': None, 'b': 2.5, 'c': 3}, {'a': 2 ** 70, 'b': None, 'c': None}]
+    assert decode(encode(data)) == data
+
+def test_round_trip_not_columnar():
+    data = [{'id': 1, 'title': 'a'}, {'id': 2}]
+    assert decode(encode(data)) == data
+
+def test_round_trip_empty():
+    assert decode(encode([])) == []
+
+def test_categories_keep_values():
+    data = [{'id': i, 'category': ['Еда', 'Дом', 'Транспорт'][i % 3]} for i in range(100)]
+    assert decode(encode(data)) == data
+
+def test_meta_in_header():
+    meta = {'next_id': 5, 'version': 9, 'deleted_before': 0, 'deleted': [[3, 8]]}
+    assert decode_snapshot(encode(RECORDS, meta)) == (RECORDS, meta)
+    assert decode_snapshot(encode(RECORDS)) == (RECORDS, None)
+
+def test_files_in_both_formats(tmp_path):
+    meta = {'next_id': 5, 'version': 4}
+    for snapshot_format in ('binary', 'json'):
+        path = str(tmp_path / f'data.{snapshot_format}')
+        write_file(path, RECORDS, snapshot_format, meta)
+        assert file_format(path) == snapshot_format
+        assert read_snapshot(path) == (RECORDS, meta)
+
+def test_old_json_list(tmp_path):
+    path = tmp_path / 'old.json'
+    path.write_text(json.dumps(RECORDS, ensure_ascii=False), encoding='utf-8')
+    assert read_snapshot(str(path)) == (RECORDS, None)
+
+def test_convert_keeps_meta(tmp_path, capsys):
+    path = str(tmp_path / 'data.json')
+    meta = {'next_id': 7}
+    write_file(path, RECORDS, 'json', meta)
+    binary_snapshot.convert_files([path], 'binary')
+    assert file_format(path) == 'binary'
+    assert read_snapshot(path) == (RECORDS, meta)
@@ -0,0 +1,90 @@
+import csv
+import time
+import pytest
+import calculator
+from calculator import ExpressionError, evaluate, evaluate_rows, evaluate_csv, calculator_menu
+
+@pytest.mark.parametrize('expression, expected', [
+    ('2 + 3 * 4', 14),
+    ('-(7 // 2) % 5', 2),
+    ('2 ** 10', 1024),
+    ('round(sqrt(16) + pi, 2)', 7.14),
+    ('max(1, x, 3) - min(x, 0)', 5),
+    ('1 < x <= 5', True),
+    ('category == "Еда"', False),
+])
+def test_allowed_expressions(expression, expected):
+    assert evaluate(expression, {'x': 5, 'category': 'Дом'}) == expected
+
+@pytest.mark.parametrize('expression', [
+    '__import__("os").system("true")',
+    'x.__class__',
+    '(lambda: 1)()',
+    '[1, 2]',
+    'open("f")',
+    'round(1.5, ndigits=1)',
+    '"a" + "b"',
+    'x if x else 1',
+    'y + 1',
+    '1 +',
+])
+def test_rejected_expressions(expression):
+    with pytest.raises(ExpressionError):
+        evaluate(expression, {'x': 1})
+
+@pytest.mark.parametrize('expression', [
+    '(9 ** 10000) ** 10000',
+    '9 ** 9 ** 9',
+    '(2 ** 13000) * (2 ** 13000)',
+    '2.0 ** 10 ** 9',
+    '1 / 0',
+])
+def test_size_caps_fail_fast(expression):
+    started = time.perf_counter()
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+    assert time.perf_counter() - started < 1
+
+def test_powers_of_one_are_not_capped():
+    assert evaluate('1 ** (10 ** 100)') == 1
+    assert evaluate('(-1) ** (10 ** 100)') == 1
+
+def test_deep_expression_is_an_expression_error():
+    expression = '-' * 1500 + '1'
+    assert len(expression) < calculator.MAX_EXPRESSION_LENGTH
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+
+def test_row_errors_do_not_stop_evaluation():
+    rows = [{'x': 2}, {'x': 0}, {'x': 'текст'}, {'x': 4}]
+    results = [(result, error is not None) for _, result, error in evaluate_rows('8 / x', rows)]
+    assert results == [(4.0, False), (None, True), (None, True), (2.0, False)]
+
+def test_csv_rows_with_wrong_field_count(tmp_path):
+    source = tmp_path / 'data.csv'
+    source.write_text('a,b\n1,2\n3\n4,5,6\n7,8\n', encoding='utf-8')
+    target = tmp_path / 'results.csv'
+    assert evaluate_csv('a + b', str(source), str(target)) == (4, 2)
+    with open(target, encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['a', 'b', 'Результат']
+    assert rows[1] == ['1', '2', '3']
+    assert rows[2][:2] == ['3', ''] and rows[2][2].startswith('Ошибка')
+    assert rows[3][:2] == ['4', '5'] and rows[3][2].startswith('Ошибка')
+    assert rows[4] == ['7', '8', '15']
+
+def run_menu(monkeypatch, answers):
+    answers = iter(answers)
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    calculator_menu()
+
+def test_menu_survives_bad_input(tmp_path, monkeypatch, capsys):
+    source = tmp_path / 'data.csv'
+    source.write_text('a,b\n1,2\n3\n', encoding='utf-8')
+    target = tmp_path / 'results.csv'
+    run_menu(monkeypatch, ['-' * 1500 + '1', '(9 ** 10000) ** 10000', 'x = 2 ** 3', 'x + 1',
+                           'пакет', 'a * b', '1', str(source), str(target), 'назад'])
+    output = capsys.readouterr().out
+    assert 'Результат: 9' in output
+    assert 'Вычислено строк: 2, с ошибками: 1' in output
+    assert output.count('Ошибка:') == 2
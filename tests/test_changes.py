@@ -0,0 +1,71 @@
+import csv
+import pytest
+import atomic_files
+import record_collection
+from record_collection import RecordCollection
+from task import TaskManager
+
+class Item:
+    __slots__ = ('id', 'value', 'version')
+
+    def __init__(self, item_id, value, version=0):
+        self.id = item_id
+        self.value = value
+        self.version = version
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(atomic_files, 'FSYNC', False)
+    return tmp_path
+
+def changed_ids(collection, version):
+    records, deleted = collection.changed_since(version)
+    return [record.id for record in records], deleted
+
+def test_changed_since_in_change_order():
+    collection = RecordCollection()
+    for value in 'abc':
+        collection.add(Item(collection.allocate_id(), value))
+    mark = collection.version
+    collection.touch(collection.get(1))
+    collection.add(Item(collection.allocate_id(), 'd'))
+    collection.remove(2)
+    assert changed_ids(collection, mark) == ([1, 4], [2])
+    assert changed_ids(collection, 0) == ([3, 1, 4], [2])
+    assert changed_ids(collection, collection.version) == ([], [])
+    # Отметка из будущего — например, от другого файла данных
+    assert collection.changed_since(collection.version + 1) is None
+
+def test_forgotten_deletes_force_full_export(monkeypatch):
+    monkeypatch.setattr(record_collection, 'TOMBSTONE_LIMIT', 3)
+    collection = RecordCollection(Item(item_id, item_id) for item_id in range(1, 11))
+    mark = collection.version
+    for item_id in range(1, 4):
+        collection.remove(item_id)
+    assert changed_ids(collection, mark) == ([], [1, 2, 3])
+    collection.remove(4)
+    assert collection.deleted_before == mark + 1
+    assert collection.changed_since(mark) is None
+    assert changed_ids(collection, mark + 1) == ([], [2, 3, 4])
+    # Удаления и граница забытых переживают сохранение через meta()
+    reloaded = RecordCollection(list(collection), collection.meta())
+    assert reloaded.changed_since(mark) is None
+    assert changed_ids(reloaded, mark + 1) == ([], [2, 3, 4])
+
+def read_rows(file_name):
+    with open(file_name, encoding='utf-8', newline='') as f:
+        return [(row[0], row[1]) for row in list(csv.reader(f))[1:]]
+
+def test_export_changes_since_checkpoint(work_dir):
+    manager = TaskManager()
+    manager.add_many([('Первая', '', 'Средний', None), ('Вторая', '', 'Низкий', None)])
+    assert manager.export_changes_to_csv('changes.csv') == ({'все': 2}, True)
+    manager.add_many([('Третья', '', 'Высокий', None)])
+    manager.mark_many([1])
+    manager.delete_many([2])
+    # Отметка хранится в файле, поэтому новый процесс продолжает с неё
+    counts, full = TaskManager().export_changes_to_csv('changes.csv')
+    assert not full and counts == {'добавлена': 1, 'изменена': 1, 'удалена': 1}
+    assert read_rows('changes.csv') == [('добавлена', '3'), ('изменена', '1'), ('удалена', '2')]
+    assert TaskManager().export_changes_to_csv('changes.csv') == ({}, False)
@@ -0,0 +1,62 @@
+import random
+import pytest
+import atomic_files
+from contact import ContactManager
+from contact_search import ContactSearchIndex, normalize_text, phone_digits
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(atomic_files, 'FSYNC', False)
+    return tmp_path
+
+def names(contacts):
+    return [contact.name for contact in contacts]
+
+def test_search_by_name_email_and_phone(work_dir):
+    manager = ContactManager()
+    manager.add_many([('Пётр Иванов', '+7 (912) 345-67-89', 'petr@mail.ru'),
+                      ('Анна Петрова', '8 912 000 11 22', 'anna@yandex.ru'),
+                      ('Иван Сидоров', '+7 999 765 43 21', 'ivan@petrov.com')])
+    # Подстрока в любом месте имени или e-mail, без учёта регистра и ё
+    assert names(manager.search_contacts('петр')) == ['Анна Петрова', 'Пётр Иванов']
+    assert names(manager.search_contacts('PETR')) == ['Иван Сидоров', 'Пётр Иванов']
+    assert names(manager.search_contacts('ив')) == ['Иван Сидоров', 'Пётр Иванов']
+    # Номер ищется по цифрам, как бы он ни был записан
+    assert names(manager.search_contacts('912-345')) == ['Пётр Иванов']
+    assert names(manager.search_contacts('(912)')) == ['Анна Петрова', 'Пётр Иванов']
+    assert manager.search_contacts('нет такого') == []
+
+def test_index_follows_edits_and_deletes(work_dir):
+    manager = ContactManager()
+    manager.add_many([('Ольга', '111-222', 'olga@example.com'), ('Олег', '333-444', 'oleg@example.com')])
+    assert names(manager.search_contacts('ол')) == ['Олег', 'Ольга']
+    manager.edit_many([(1, 'Мария', '555-666', 'maria@example.com')])
+    manager.delete_many([2])
+    manager.add_many([('Ольгерд', '777', '')])
+    assert names(manager.search_contacts('ол')) == ['Ольгерд']
+    assert names(manager.search_contacts('111')) == []
+    assert names(manager.search_contacts('5566')) == ['Мария']
+
+def test_matches_plain_substring_search():
+    class Contact:
+        def __init__(self, contact_id, name, phone, email):
+            self.id, self.name, self.phone, self.email = contact_id, name, phone, email
+
+    rng = random.Random(5)
+    letters = 'абвгдеёжзabcde'
+    contacts = [Contact(i, ''.join(rng.choice(letters) for _ in range(rng.randint(1, 8))),
+                        ''.join(rng.choice('0123 -') for _ in range(rng.randint(0, 10))),
+                        ''.join(rng.choice(letters) for _ in range(rng.randint(0, 6))))
+                for i in range(1, 300)]
+    index = ContactSearchIndex.build(contacts)
+    for contact in contacts[::3]:
+        index.remove(contact.id)
+    live = [contact for contact in contacts if contact.id in index.keys]
+    for query in ['а', 'аб', 'abc', 'ее', '0', '12', '1 2', '301', 'e']:
+        text, digits = normalize_text(query), phone_digits(query)
+        expected = {contact.id for contact in live
+                    if text in normalize_text(contact.name) + '\n' + normalize_text(contact.email)
+                    or (digits and not query.strip(' 0123456789') and digits in phone_digits(contact.phone))}
+        found, total = index.search(query, limit=1000)
+        assert set(found) == expected and total == len(expected), query
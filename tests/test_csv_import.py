@@ -0,0 +1,62 @@
+import csv
+import pytest
+import csv_import
+from csv_import import import_csv, state_path, errors_path
+from record_collection import RecordCollection
+
+class Item:
+    def __init__(self, item_id, name, amount):
+        self.id = item_id
+        self.name = name
+        self.amount = amount
+        self.version = 0
+
+def convert_row(row):
+    # На уровне модуля: рабочие процессы получают функцию по имени
+    return row['Имя'], float(row['Сумма'])
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Имя', 'Сумма'])
+        writer.writerows(rows)
+
+def run_import(path, workers, batch_size=50):
+    collection = RecordCollection()
+
+    def import_batch(rows):
+        for name, amount in rows:
+            collection.add(Item(collection.allocate_id(), name, amount))
+
+    imported, errors = import_csv(str(path), convert_row, import_batch, collection, batch_size, workers)
+    return [(item.id, item.name, item.amount) for item in collection], imported, errors
+
+def test_parallel_matches_serial(tmp_path, monkeypatch, capsys):
+    # Маленькие куски, чтобы строки (в том числе с переводом строки в кавычках) делились между процессами
+    monkeypatch.setattr(csv_import, 'PARALLEL_CHUNK_SIZE', 256)
+    rows = []
+    for i in range(1000):
+        if i % 97 == 0:
+            rows.append([f'плохая {i}', 'не число'])
+        elif i % 13 == 0:
+            rows.append([f'строка\n"{i}", с запятой', str(i / 4)])
+        else:
+            rows.append([f'Имя {i}', str(i)])
+    path = tmp_path / 'data.csv'
+    write_csv(path, rows)
+    serial = run_import(path, workers=1)
+    errors_log = (tmp_path / 'data.csv.errors.log').read_text(encoding='utf-8')
+    parallel = run_import(path, workers=3)
+    assert parallel == serial
+    assert serial[1:] == (989, 11)
+    assert (tmp_path / 'data.csv.errors.log').read_text(encoding='utf-8') == errors_log
+    assert not (tmp_path / 'data.csv.import_state').exists()
+
+@pytest.mark.parametrize('rows', [[], [['плохая', 'x'], ['ещё', '']]])
+def test_nothing_imported(tmp_path, capsys, rows):
+    # Ни одна порция не сохранена — файла состояния нет, и импорт не должен на этом падать
+    path = tmp_path / 'data.csv'
+    write_csv(path, rows)
+    assert run_import(path, workers=1) == ([], 0, len(rows))
+    assert not (tmp_path / state_path('data.csv')).exists()
+    assert (tmp_path / errors_path('data.csv')).exists() == bool(rows)
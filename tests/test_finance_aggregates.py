@@ -0,0 +1,73 @@
+import random
+import datetime
+from finance_aggregates import FinanceAggregates, FenwickTree
+
+class Record:
+    def __init__(self, amount, category, date_value):
+        self.amount = amount
+        self.category = category
+        self.date_value = date_value
+
+def naive_totals(records, start, end):
+    income = expenses = 0.0
+    for record in records:
+        if record.date_value is not None and start <= record.date_value <= end:
+            if record.amount > 0:
+                income += record.amount
+            else:
+                expenses += record.amount
+    return round(income, 2), round(expenses, 2)
+
+def naive_category_totals(records, start, end):
+    totals = {}
+    for category in {record.category for record in records}:
+        income, expenses = naive_totals([record for record in records if record.category == category], start, end)
+        if income or expenses:
+            totals[category] = (income, expenses)
+    return totals
+
+def random_date(rng, first, days):
+    return first + datetime.timedelta(days=rng.randint(0, days))
+
+def check_ranges(aggregates, records, rng, first, days):
+    for _ in range(300):
+        start, end = sorted(random_date(rng, first, days) for _ in range(2))
+        assert aggregates.totals(start, end) == naive_totals(records, start, end)
+        assert aggregates.category_totals(start, end) == naive_category_totals(records, start, end)
+
+def test_fenwick_range_sum():
+    rng = random.Random(1)
+    values = [rng.randint(-100, 100) for _ in range(200)]
+    tree = FenwickTree(values)
+    tree.add(17, 5)
+    values[17] += 5
+    for _ in range(200):
+        start, end = sorted(rng.randrange(len(values)) for _ in range(2))
+        assert tree.range_sum(start, end) == sum(values[start:end + 1])
+
+def test_matches_naive_sums_after_changes():
+    rng = random.Random(2)
+    first = datetime.date(2023, 1, 1)
+    records = [Record(rng.randint(-500, 500) or 1, rng.choice('абв'), random_date(rng, first, 900))
+               for _ in range(1500)]
+    aggregates = FinanceAggregates(records[:1000])
+    for record in records[1000:]:
+        aggregates.add(record)
+    for record in records[:200]:
+        aggregates.remove(record)
+    live = records[200:]
+    # Новая категория, запись без даты и даты далеко за пределами прежних
+    extra = [Record(42, 'г', datetime.date(2023, 6, 1)), Record(-7, 'а', None),
+             Record(3, 'б', datetime.date(1990, 1, 1)), Record(-9, 'в', datetime.date(2200, 12, 31))]
+    for record in extra:
+        aggregates.add(record)
+    live += extra
+    check_ranges(aggregates, live, rng, datetime.date(1985, 1, 1), 80000)
+    check_ranges(aggregates, live, rng, first, 900)
+
+def test_far_apart_dates_stay_small():
+    records = [Record(1, 'а', datetime.date(24, 1, 1)), Record(-1, 'б', datetime.date(9999, 12, 31))]
+    aggregates = FinanceAggregates(records)
+    assert len(aggregates.days) < 2000
+    assert aggregates.totals(datetime.date(1, 1, 1), datetime.date(9999, 12, 31)) == (1.0, -1.0)
+    assert aggregates.totals(datetime.date(25, 1, 1), datetime.date(9999, 12, 30)) == (0.0, 0.0)
@@ -0,0 +1,52 @@
+import json
+import pytest
+import atomic_files
+import note_search
+from notes import NoteManager, NOTES_INDEX_FILE
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(atomic_files, 'FSYNC', False)
+    return tmp_path
+
+def found(manager, query):
+    return [note.id for note in manager.search_notes(query)]
+
+def test_search_by_words_prefixes_and_forms(work_dir):
+    manager = NoteManager()
+    manager.add_many([('Список покупок', 'Купить молоко и хлеб'),
+                      ('Встреча', 'Обсудить покупку машины'),
+                      ('Книги', 'Прочитать про молоко')])
+    # Все слова запроса, окончания отбрасываются, заголовок весит больше текста
+    assert found(manager, 'молоко') == [1, 3]
+    assert found(manager, 'молока хлеб') == [1]
+    assert found(manager, 'покуп') == [1, 2]
+    assert found(manager, 'Ёлка') == []
+
+def test_index_follows_edits_and_deletes(work_dir):
+    manager = NoteManager()
+    manager.add_many([('Отпуск', 'Билеты на море'), ('Работа', 'Отчёт к пятнице')])
+    manager.edit_many([(1, 'Отпуск', 'Билеты в горы')])
+    manager.delete_many([2])
+    assert found(manager, 'море') == []
+    assert found(manager, 'горы') == [1]
+    assert found(manager, 'отчет') == []
+
+def test_saved_index_is_reused_only_for_unchanged_notes(work_dir, monkeypatch):
+    manager = NoteManager()
+    manager.add_many([('Рецепт', 'Борщ со сметаной')])
+    manager.close()
+    with open(NOTES_INDEX_FILE, encoding='utf-8') as f:
+        assert 'борщ' in json.load(f)['postings']
+    builds = []
+    build = note_search.NoteSearchIndex.build
+    monkeypatch.setattr(note_search.NoteSearchIndex, 'build',
+                        classmethod(lambda cls, notes: builds.append(1) or build.__func__(cls, notes)))
+    assert found(NoteManager(), 'борщ') == [1]
+    assert builds == []
+    # Заметки изменены без сохранения индекса — он перестраивается
+    other = NoteManager()
+    other.add_many([('Суп', 'Борщ без мяса')])
+    assert found(NoteManager(), 'борщ') == [1, 2]
+    assert builds == [1]
@@ -0,0 +1,56 @@
+import random
+import pytest
+from record_collection import RecordCollection, SortedIndex, page_slice
+
+class Item:
+    def __init__(self, item_id, key):
+        self.id = item_id
+        self.key = key
+        self.version = 0
+
+def walk(page_func, size, reverse=False):
+    # Все страницы подряд по курсору
+    result, cursor = [], None
+    while True:
+        ids, cursor, total = page_func(size, after=cursor, reverse=reverse)
+        result.extend(ids)
+        if cursor is None:
+            return result, total
+
+@pytest.mark.parametrize('size', [1, 3, 7, 50, 1000])
+def test_page_slice_matches_slicing(size):
+    entries = sorted(random.Random(1).sample(range(10000), 500))
+    for reverse in (False, True):
+        ordered = entries[::-1] if reverse else entries
+        for offset in (0, 1, size, 499, 500, 600):
+            page, _ = page_slice(entries, 0, len(entries), size, offset=offset, reverse=reverse)
+            assert page == ordered[offset:offset + size]
+        start, end = 100, 400
+        ordered = entries[start:end][::-1] if reverse else entries[start:end]
+        page, _ = page_slice(entries, start, end, size, offset=5, reverse=reverse)
+        assert page == ordered[5:5 + size]
+
+@pytest.mark.parametrize('size', [1, 4, 25, 1000])
+def test_collection_pages_by_cursor(size):
+    rng = random.Random(2)
+    collection = RecordCollection(Item(item_id, 0) for item_id in rng.sample(range(1, 5000), 300))
+    for item_id in rng.sample(collection.ids, 40):
+        collection.remove(item_id)
+    ids = sorted(item.id for item in collection)
+    assert walk(collection.page, size) == (ids, len(ids))
+    assert walk(collection.page, size, reverse=True) == (ids[::-1], len(ids))
+
+@pytest.mark.parametrize('size', [1, 6, 1000])
+def test_index_pages_with_bounds(size):
+    rng = random.Random(3)
+    items = [Item(item_id, rng.randint(0, 20)) for item_id in range(1, 400)]
+    index = SortedIndex(lambda item: item.key, items)
+    expected = [item.id for item in sorted(items, key=lambda item: (item.key, item.id)) if 5 <= item.key <= 12]
+
+    def page(size, after=None, reverse=False):
+        return index.page(size, 5, 12, after=after, reverse=reverse)
+
+    assert walk(page, size) == (expected, len(expected))
+    assert walk(page, size, reverse=True) == (expected[::-1], len(expected))
+    for offset in (0, 3, len(expected) - 1):
+        assert index.page(size, 5, 12, offset=offset)[0] == expected[offset:offset + size]
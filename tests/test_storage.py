@@ -0,0 +1,117 @@
+import os
+import random
+import pytest
+import atomic_files
+import load_save_functon as storage
+from record_collection import RecordCollection
+
+class Item:
+    __slots__ = ('id', 'value', 'version')
+
+    def __init__(self, item_id, value, version=0):
+        self.id = item_id
+        self.value = value
+        self.version = version
+
+    def to_dict(self):
+        return {'id': self.id, 'value': self.value, 'version': self.version}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['value'], data.get('version') or 0)
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Проверяется содержимое файлов, а не сохранность при сбое питания
+    monkeypatch.setattr(atomic_files, 'FSYNC', False)
+    return tmp_path
+
+def run_changes(file_path, steps, seed):
+    # Случайные добавления, изменения и удаления порциями, как их сохраняют менеджеры
+    rng = random.Random(seed)
+    collection = RecordCollection()
+    compacted = False
+    storage.load_data(file_path, [])
+    for _ in range(steps):
+        changes = []
+        for _ in range(rng.randint(1, 5)):
+            action = rng.random()
+            if action < 0.5 or not len(collection):
+                item = Item(collection.allocate_id(), rng.random())
+                collection.add(item)
+                changes.append(('put', item.to_dict()))
+            elif action < 0.8:
+                item = collection.get(rng.choice(collection.ids))
+                item.value = rng.random()
+                collection.touch(item)
+                changes.append(('put', item.to_dict()))
+            else:
+                item_id = rng.choice(collection.ids)
+                collection.remove(item_id)
+                changes.append(('delete', item_id))
+        meta = collection.meta()
+        if not storage.append_changes(file_path, changes, meta):
+            storage.save_data(file_path, [item.to_dict() for item in collection], meta)
+            compacted = True
+    return collection, compacted
+
+def reload(file_path):
+    data = storage.load_data(file_path, [])
+    return RecordCollection((Item.from_dict(record) for record in data), storage.load_meta(file_path))
+
+def state(collection):
+    return sorted(item.to_dict().items() for item in collection), collection.meta()
+
+@pytest.mark.parametrize('snapshot_format', ['json', 'binary'])
+def test_journal_replay_matches_full_save(work_dir, monkeypatch, snapshot_format):
+    monkeypatch.setattr(storage, 'SNAPSHOT_FORMATS', {'*': snapshot_format})
+    monkeypatch.setattr(storage, 'STORAGE_MODE', 'json')
+    expected, _ = run_changes('full.json', 300, seed=1)
+    monkeypatch.setattr(storage, 'STORAGE_MODE', 'journal')
+    # Порог маленький, чтобы журнал несколько раз свернулся в снимок
+    monkeypatch.setattr(storage, 'JOURNAL_MIN_COMPACT_SIZE', 4096)
+    journaled, compacted = run_changes('journal.json', 300, seed=1)
+    assert compacted
+    assert state(journaled) == state(expected)
+    assert state(reload('journal.json')) == state(expected)
+    monkeypatch.setattr(storage, 'STORAGE_MODE', 'json')
+    assert state(reload('full.json')) == state(expected)
+
+def test_journal_without_compaction(work_dir, monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_MODE', 'journal')
+    collection, compacted = run_changes('tasks.json', 50, seed=2)
+    assert not compacted
+    assert os.path.exists(storage.journal_path('tasks.json'))
+    assert state(reload('tasks.json')) == state(collection)
+
+def test_torn_journal_line_is_ignored(work_dir, monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_MODE', 'journal')
+    collection, _ = run_changes('tasks.json', 20, seed=3)
+    with open(storage.journal_path('tasks.json'), 'a', encoding='utf-8') as f:
+        f.write('{"op": "put", "record": {"id": 99')
+    assert state(reload('tasks.json')) == state(collection)
+
+def test_old_meta_file_is_read(work_dir, monkeypatch):
+    # Снимок списком и <файл>.meta — как их писали прежние версии
+    monkeypatch.setattr(storage, 'STORAGE_MODE', 'journal')
+    storage.write_file('tasks.json', [{'id': 1, 'value': 0.5, 'version': 1}], 'json')
+    with open(storage.meta_path('tasks.json'), 'w', encoding='utf-8') as f:
+        f.write('{"next_id": 10, "version": 4, "deleted_before": 0, "deleted": [[3, 4]]}')
+    collection = reload('tasks.json')
+    assert collection.next_id == 10
+    assert collection.deleted == {3: 4}
+
+@pytest.mark.parametrize('mode', ['json', 'journal'])
+def test_write_over_other_process_changes_is_refused(work_dir, monkeypatch, mode):
+    monkeypatch.setattr(storage, 'STORAGE_MODE', mode)
+    collection, _ = run_changes('tasks.json', 5, seed=4)
+    # Другой процесс дописал свою запись после нашей загрузки
+    with open(storage.journal_path('tasks.json'), 'a', encoding='utf-8') as f:
+        f.write('{"op": "put", "record": {"id": 1000, "value": 0.5, "version": 1000}}\n')
+    item = Item(collection.allocate_id(), 0.25)
+    collection.add(item)
+    with pytest.raises(storage.DataChangedError):
+        if not storage.append_changes('tasks.json', [('put', item.to_dict())], collection.meta()):
+            storage.save_data('tasks.json', [record.to_dict() for record in collection], collection.meta())
+    assert 1000 in reload('tasks.json').ids
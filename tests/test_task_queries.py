@@ -0,0 +1,66 @@
+import random
+import datetime
+import pytest
+import atomic_files
+from task import TaskManager, PRIORITY_ORDER
+
+TODAY = datetime.date(2024, 3, 15)
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(atomic_files, 'FSYNC', False)
+    return tmp_path
+
+def ids(tasks):
+    return [task.id for task in tasks]
+
+def open_tasks(manager):
+    return [task for task in manager.tasks if not task.done]
+
+def expected_overdue(manager):
+    tasks = [task for task in open_tasks(manager) if task.due_value and task.due_value < TODAY]
+    return ids(sorted(tasks, key=lambda task: (task.due_value, task.id)))
+
+def expected_due_within(manager, days):
+    last = TODAY + datetime.timedelta(days=days)
+    tasks = [task for task in open_tasks(manager) if task.due_value and TODAY <= task.due_value <= last]
+    return ids(sorted(tasks, key=lambda task: (task.due_value, task.id)))
+
+def expected_top(manager, limit):
+    key = lambda task: (PRIORITY_ORDER.get(task.priority, len(PRIORITY_ORDER)),
+                        task.due_value or datetime.date.max, task.id)
+    return ids(sorted(open_tasks(manager), key=key))[:limit]
+
+def check(manager):
+    assert ids(manager.overdue_tasks(TODAY)) == expected_overdue(manager)
+    for days in (0, 7, 30):
+        assert ids(manager.tasks_due_within(days, TODAY)) == expected_due_within(manager, days)
+    for limit in (1, 5, 100):
+        assert ids(manager.top_tasks(limit)) == expected_top(manager, limit)
+
+def random_task(rng):
+    due = TODAY + datetime.timedelta(days=rng.randint(-40, 40))
+    return ('Задача', '', rng.choice(list(PRIORITY_ORDER) + ['Срочный']),
+            rng.choice([None, due.strftime('%d-%m-%Y')]))
+
+def test_queries_match_full_scan(work_dir):
+    rng = random.Random(7)
+    manager = TaskManager()
+    manager.add_many([random_task(rng) for _ in range(200)])
+    check(manager)
+    # Выполненные, изменённые и удалённые задачи уходят из выборок или меняют место
+    manager.mark_many(rng.sample(manager.tasks.ids, 40))
+    manager.edit_many([(task_id, *random_task(rng)) for task_id in rng.sample(manager.tasks.ids, 40)])
+    manager.delete_many(rng.sample(manager.tasks.ids, 40))
+    check(manager)
+    check(TaskManager())
+
+def test_done_task_leaves_top(work_dir):
+    manager = TaskManager()
+    manager.add_many([('Позже', '', 'Низкий', '01-03-2024'), ('Важная', '', 'Высокий', None),
+                      ('Срочная', '', 'Высокий', '20-03-2024')])
+    assert ids(manager.top_tasks(2)) == [3, 2]
+    manager.mark_many([3])
+    assert ids(manager.top_tasks(2)) == [2, 1]
+    assert ids(manager.overdue_tasks(TODAY)) == [1]